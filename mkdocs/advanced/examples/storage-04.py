@@ -24,7 +24,7 @@ print("\n--")
 
 # Identify compression, if any
 print("Compression codec magic prefix:")
-pprint(serialized[:2], width=70)
+pprint(serialized[:3], width=70)
 print("\n--")
 
 decompressed = zlib.decompress(serialized[3:])
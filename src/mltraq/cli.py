@@ -8,6 +8,7 @@ from tabulate import tabulate
 import mltraq
 from mltraq.experiment import Experiment
 from mltraq.opts import options
+from mltraq.storage.database import Database
 from mltraq.storage.datastream import datastream_server
 from mltraq.utils.base_options import add_option_argument
 from mltraq.utils.exceptions import InvalidInput
@@ -64,6 +65,17 @@ def parse_args(args: Optional[List[str]] = None) -> argparse.Namespace:
     group.add_argument("--uuid", dest="experiment_uuid")
     group.add_argument("--name", dest="experiment_name")
 
+    # Command "gc"
+    parser_cmd = subparsers.add_parser(
+        "gc", help="Delete orphaned and unreferenced DataStore/ArchiveStore objects", parents=[main_parser]
+    )
+    parser_cmd.add_argument(
+        "--db", dest="db", required=True, help="URL of the database of the experiments persisted in the stores"
+    )
+    parser_cmd.add_argument("--dry-run", dest="dry_run", action="store_true", help="Report only, delete nothing")
+    parser_cmd.add_argument("--n-jobs", dest="n_jobs", type=int, default=None)
+    parser_cmd.add_argument("--min-age-seconds", dest="min_age_seconds", type=float, default=None)
+
     # Command "options"
     parser_cmd = subparsers.add_parser("options", help="Show options", parents=[main_parser])
     parser_cmd.add_argument("--option-name", dest="option_name")
@@ -112,6 +124,16 @@ def main(argv1: Optional[List[str]] = None):  # noqa: C901
         if args.option_name:
             df = df[df.index == args.option_name]
         print_df(df)
+    elif args.cmd == "gc":
+        # Tables are not created: a mistyped URL must not result in an empty database, which would
+        # make all experiment directories orphaned.
+        session = mltraq.create_session(db=Database(args.db))
+        result = session.gc(dry_run=args.dry_run, n_jobs=args.n_jobs, min_age_seconds=args.min_age_seconds)
+        for path in result.paths:
+            print(path)
+        df = pd.Series(result.stats).rename("Value").to_frame()
+        df.index.name = "Name"
+        print_df(df, showindex=True)
     elif args.cmd == "stats":
         session = mltraq.create_session()
         experiment = session.load_experiment(name=args.experiment_name, id_experiment=args.experiment_uuid)
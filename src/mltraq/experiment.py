@@ -1,14 +1,18 @@
 from __future__ import annotations
 
 import copy
+import hashlib
 import logging
 import random
 import sys
 import uuid
+from concurrent.futures import Future
 from contextlib import contextmanager
-from typing import Callable, Optional, Union
+from functools import partial
+from typing import Callable, Iterator, Optional, Union
 
 import pandas as pd
+import pyarrow.dataset
 from sqlalchemy.orm import load_only
 
 from mltraq.opts import options
@@ -17,7 +21,8 @@ from mltraq.runs import Runs
 from mltraq.storage import models, serialization
 from mltraq.storage.archivestore import ArchiveStoreIO
 from mltraq.storage.database import Database, hash_uuid, next_uuid, pandas_query, sanitize_table_name
-from mltraq.storage.datastore import DataStoreIO
+from mltraq.storage.datastore import DataStoreIO, DataStoreWriter
+from mltraq.storage.parquetstore import ParquetStore
 from mltraq.utils.bunch import Bunch
 from mltraq.utils.enums import IfExists, enforce_enum
 from mltraq.utils.exceptions import ExceptionWithMessage, InvalidInput
@@ -63,7 +68,7 @@ class Experiment:
     # model_cls is the SQLAlchemy model mapped to this class.
     model_cls = models.Experiment
 
-    __slots__ = ("id_experiment", "name", "fields", "runs", "db")
+    __slots__ = ("id_experiment", "name", "fields", "runs", "db", "writes")
     __state__ = ("id_experiment", "name", "fields", "runs")
 
     def __init__(
@@ -83,6 +88,7 @@ class Experiment:
         self.name = hash_uuid(self.id_experiment) if name is None else name
         self.fields = Bunch(fields)
         self.runs = Runs(runs)
+        self.writes = None
 
     def __getstate__(self):
         """
@@ -98,6 +104,7 @@ class Experiment:
         for k, v in state.items():
             self.__setattr__(k, v)
         self.db = None
+        self.writes = None
 
     @contextmanager
     def run(self):
@@ -165,27 +172,85 @@ class Experiment:
 
         return sanitize_table_name(f"{options().get('database.experiment_tableprefix')}{self.name}")
 
-    def load_runs(self, meta: dict) -> Experiment:
+    def get_sequence_tablename(self, field_name: str) -> str:
+        """
+        Return the table name of the Sequence values of field `field_name`, if stored as a separate table.
+        Table names of experiments never contain "__", separating them from the field name.
+
+        Field names that are altered by the sanitization (e.g., "Loss" and "a-b") are suffixed by "__" and
+        a hash of the original name, s.t. they do not collide with each other (e.g., "loss" and "a_b").
+        Sanitized names never contain "__", and are used as they are if not altered.
+        """
+
+        table_field_name = sanitize_table_name(field_name)
+        if table_field_name != field_name:
+            table_field_name += f"__{hashlib.blake2b(field_name.encode(), digest_size=8).hexdigest()}"
+        return f"{self.get_tablename()}__{table_field_name}"
+
+    def load_runs(
+        self,
+        meta: dict,
+        columns: list[str] | None = None,
+        filter: pyarrow.dataset.Expression | None = None,  # noqa: A002
+    ) -> Experiment:
         """
         Load self.runs from database, using the serialization config as found in `meta`.
+        If `columns` is provided, only these fields are loaded. The `filter` expression selects the runs
+        to load, and it is supported only by the Parquet runs backend.
         """
 
-        # Retrieve the table of the experiment.
-        df = self.db.query(self.db.query_table(self.get_tablename()))
-        # Columns have type `sqlalchemy.sql.elements.quoted_name`, convert to str
-        # (this avoids explicit handling of this type in serialization.)
-        df.columns = [str(s) for s in df.columns]
+        if columns is not None:
+            # Restrict metadata to the columns to load.
+            meta, columns = serialization.meta_select_columns(meta, columns)
+
+        if meta.runs.get("backend", "sql") == "parquet":
+            # Retrieve the dataset of the experiment, pushing down column selection and filtering.
+            df = ParquetStore.read(str(self.id_experiment), meta, columns=columns, filter=filter)
+        elif filter is not None:
+            raise InvalidInput("Filtering runs while loading is supported only by the Parquet runs backend")
+        else:
+            # Retrieve the table of the experiment.
+            # Nullable integer columns are read as text, and restored to int by `nullable_from_sql`.
+            df = self.db.query(
+                self.db.query_table(
+                    self.get_tablename(), columns=columns, text_columns=serialization.nullable_int_columns(meta)
+                )
+            )
+            # Columns have type `sqlalchemy.sql.elements.quoted_name`, convert to str
+            # (this avoids explicit handling of this type in serialization.)
+            df.columns = [str(s) for s in df.columns]
+
+        # Replace references to deduplicated values with their contents, if any.
+        serialization.resolve_blobs(df, meta.runs.columns.serialized, self.db.fetch_blobs)
 
-        # Take care of deserialization
+        # Take care of deserialization, values offloaded to the DataStore are deserialized on first access.
         for col_name in meta.runs.columns.serialized:
-            df[col_name] = df[col_name].map(serialization.deserialize)
+            type_name = meta.runs.columns.types[col_name]
+            df[col_name] = df[col_name].map(partial(serialization.deserialize_lazy, type_name=type_name))
+
+        # Restore missing values of native columns as None.
+        serialization.nullable_from_sql(df, meta)
+
+        # Load Sequence values stored in separate tables.
+        sequences = meta.runs.columns.get("sequences", [])
+        for col_name in sequences:
+            df_sequence = self.db.query(self.db.query_table(self.get_sequence_tablename(col_name)))
+            df[col_name] = serialization.sequence_from_sql(df_sequence, df["id_run"].tolist())
+
+        casts = serialization.encoding_casts(meta)
 
         def series_to_run(row: pd.Series) -> Run:
             """
             Given a `row` fetched from the database, reconstruct the `run` represented by it.
             """
-            fields = row[meta.runs.columns.serialized + meta.runs.columns.non_serialized].to_dict()
+            fields = row[meta.runs.columns.serialized + meta.runs.columns.non_serialized + sequences].to_dict()
+            for col_name, cast in casts.items():
+                # Restore values cast to native database types.
+                if col_name in fields and fields[col_name] is not None:
+                    fields[col_name] = cast(fields[col_name])
             run = Run(id_run=row["id_run"], fields=fields)
+            if any(isinstance(value, serialization.SerializedValue) for value in fields.values()):
+                run.fields = serialization.SerializedFields(fields)
             return run
 
         # Reconstruct runs with their fields
@@ -262,10 +327,13 @@ class Experiment:
         name: Optional[str] = None,
         id_experiment: Optional[uuid.UUID] = None,
         unsafe_pickle: bool = False,
+        columns: list[str] | None = None,
+        filter: pyarrow.dataset.Expression | None = None,  # noqa: A002
     ):
         """
         Load experiment `name` (or `id_experiment`) from `db`. If `pickle` is True, load
-        it from its pickled Experiment object (unsafe).
+        it from its pickled Experiment object (unsafe). Parameters `columns` and `filter`
+        limit the fields and runs to load, see `Experiment.load_runs`.
         """
 
         log.debug(f"Loading experiment id_experiment='{id_experiment}' name='{name}'")
@@ -276,7 +344,7 @@ class Experiment:
         with db.session() as session:
 
             # Load all columns but "pickle", which might be heavy.
-            columns = [
+            record_columns = [
                 Experiment.model_cls.id_experiment,
                 Experiment.model_cls.name,
                 Experiment.model_cls.meta,
@@ -286,12 +354,12 @@ class Experiment:
             if id_experiment:
                 record = (
                     session.query(cls.model_cls)
-                    .options(load_only(*columns))
+                    .options(load_only(*record_columns))
                     .filter_by(id_experiment=id_experiment)
                     .first()
                 )
             elif name:
-                record = session.query(cls.model_cls).options(load_only(*columns)).filter_by(name=name).first()
+                record = session.query(cls.model_cls).options(load_only(*record_columns)).filter_by(name=name).first()
             else:
                 raise InvalidInput("You must provide either `name` or `id_experiment`")
 
@@ -313,7 +381,7 @@ class Experiment:
                 # Deserialize "meta" column, required to load runs.
                 meta = serialization.deserialize(record.meta)
                 if meta.runs.count > 0:
-                    experiment.load_runs(meta=meta)
+                    experiment.load_runs(meta=meta, columns=columns, filter=filter)
 
                 return experiment
 
@@ -381,6 +449,10 @@ class Experiment:
         """
         meta = Bunch()
         meta.runs = serialization.meta_runs(self.runs, table_name=self.get_tablename())
+        meta.runs.backend = options().get("database.runs_backend")
+        if options().get("database.sequence_tables") and meta.runs.backend == "sql":
+            serialization.meta_sequences(meta)
+        serialization.meta_encodings(meta, self.runs)
         meta.serialization = serialization.meta()
         meta.version = Bunch()
         meta.version.python = sys.version
@@ -391,18 +463,30 @@ class Experiment:
         self,
         if_exists: IfExists = IfExists["fail"],
         store_unsafe_pickle: Optional[bool] = None,
-    ):
+        wait: bool = True,
+    ) -> Union[Experiment, Future]:
         """
         Persist an experiment to the bound database, honoring `if_exists` the `store_unsafe_pickle`.
         If `if_exists` is set to "fail" and the experiment exists, an exception will be triggered.
         To overwrite existing experiments, set `if_exists` to "replace".
+
+        DataStore files are written in the background while the database is being written. If `wait` is
+        False, pending DataStore writes are not awaited, and a future resolved with the experiment once they
+        complete is returned. Until then, the DataStore objects of the experiment might not be readable.
         """
 
         log.debug(f"Persisting experiment (table name: {self.get_tablename()})")
 
+        # DataStore files of a previous persist must be written before we replace them.
+        self.wait_writes()
+
         # Ensure a valid value for if_exists.
         if_exists = enforce_enum(if_exists, IfExists)
 
+        # Values offloaded to the DataStore and not accessed yet must be loaded,
+        # as the DataStore files of the experiment are about to be deleted.
+        serialization.load_offloaded_fields(self.runs)
+
         # Delete experiment from database/datastore.
         self.delete(if_exists)
 
@@ -420,23 +504,72 @@ class Experiment:
                 "datastore.relative_path_prefix": str(self.id_experiment),
                 "archivestore.relative_path_prefix": str(self.id_experiment),
             }
-        ):
+        ), DataStoreWriter(wait=wait) as writer:
             # We set "relative_path_prefix" s.t. DataStore and ArchiveStore files
             # are associated to the experiment ID, and can be deleted accordingly.
+            # DataStore files are written in parallel by DataStoreWriter, awaited on exit if `wait` is True.
             #
             # self.record(...) serializes experiment.fields
-            # serialization.runs_to_sql(...) serializes run.fields
+            # serialization.runs_to_sql_chunks(...) serializes run.fields
 
             # Insert row in "experiments" table.
             with self.db.session() as session:
                 session.add(self.record(meta=meta, store_unsafe_pickle=store_unsafe_pickle))
                 session.commit()
 
-            # Create and insert rows in "experiment_..." table.
-            df_runs, dtype = serialization.runs_to_sql(self.id_experiment, meta, self.runs)
-            self.db.pandas_to_sql(df_runs, meta.runs.table_name, if_exists.name, dtype=dtype)
+            # Create and insert rows in "experiment_..." table. Chunks of runs are serialized
+            # while the previous chunk is being written.
+            chunks = serialization.runs_to_sql_chunks(self.id_experiment, meta, self.runs)
+            chunks = self.dedup_chunks(chunks, meta.runs.columns.serialized)
+            if meta.runs.backend == "parquet":
+                ParquetStore.write(str(self.id_experiment), chunks, meta, if_exists)
+            else:
+                self.db.chunks_to_sql(
+                    chunks,
+                    meta.runs.table_name,
+                    if_exists.name,
+                    dtype=serialization.runs_dtype(meta),
+                    total=len(self.runs),
+                )
 
-        return self
+            # Create and insert rows in "experiment_...__field" tables, one for each field with Sequence values.
+            for col_name in meta.runs.columns.get("sequences", []):
+                table_name = self.get_sequence_tablename(col_name)
+                df_sequence = serialization.sequence_to_sql(self.runs, col_name)
+                self.db.pandas_to_sql(df_sequence, table_name, if_exists.name, dtype={"id_run": models.Uuid})
+                self.db.create_index(table_name, "id_run")
+
+        if wait:
+            return self
+
+        future = Future()
+
+        def resolve(writes: Future):
+            if writes.exception() is not None:
+                future.set_exception(writes.exception())
+            else:
+                future.set_result(self)
+
+        self.writes = writer.future
+        writer.future.add_done_callback(resolve)
+        return future
+
+    def wait_writes(self):
+        """
+        Wait for the DataStore writes of a previous persist with `wait=False`, if any, raising their errors.
+        """
+        if self.writes is not None:
+            writes, self.writes = self.writes, None
+            writes.result()
+
+    def dedup_chunks(self, chunks: Iterator[pd.DataFrame], columns: list[str]) -> Iterator[pd.DataFrame]:
+        """
+        Store large serialized values in `columns` as content-addressed blobs, shared across
+        runs and experiments, before yielding each chunk of runs to be inserted.
+        """
+        for df_chunk in chunks:
+            self.db.insert_blobs(serialization.dedup_blobs(df_chunk, columns))
+            yield df_chunk
 
     def delete(self, if_exists: IfExists = IfExists["delete"]):
         """
@@ -446,6 +579,9 @@ class Experiment:
         # Ensure a valid value for if_exists
         if_exists = enforce_enum(if_exists, IfExists)
 
+        # DataStore files of a previous persist must be written before we delete them.
+        self.wait_writes()
+
         with self.db.session() as session:
             if session.query(self.model_cls).filter_by(name=self.name).count() > 0:
                 # If we find the record ...
@@ -462,10 +598,18 @@ class Experiment:
         # Drop also the entire "experiment_..." table.
         self.db.drop_table(self.get_tablename())
 
+        # Drop tables of Sequence values, if any.
+        for table_name in self.db.get_table_names():
+            if table_name.startswith(self.get_sequence_tablename("")):
+                self.db.drop_table(table_name)
+
         # Drop datastore and archivestore documents of experiment, if any.
         DataStoreIO.delete(relative_path_prefix=str(self.id_experiment))
         ArchiveStoreIO.delete(relative_path_prefix=str(self.id_experiment))
 
+        # Drop Parquet dataset of experiment runs, if any.
+        ParquetStore.delete(str(self.id_experiment))
+
     def df(self, max_level=0) -> pd.DataFrame:
         """
         Return a Pandas dataframe representing the experiment, flattening
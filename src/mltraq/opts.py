@@ -22,6 +22,9 @@ class Options(BaseOptions):
             "query_write_chunk_size": 1000,
             "experiments_tablename": "experiments",
             "experiment_tableprefix": "experiment_",
+            "blobs_tablename": "blobs",
+            "runs_backend": "sql",
+            "sequence_tables": False,
         },
         "datastream": {
             "disable": True,
@@ -32,12 +35,30 @@ class Options(BaseOptions):
             "srv_throttle_recv": 0.0001,
             "srv_throttle_persist": 1,
         },
-        "datastore": {"url": "file:///mltraq.datastore", "relative_path_prefix": "undefined"},
+        "datastore": {
+            "url": "file:///mltraq.datastore",
+            "relative_path_prefix": "undefined",
+            "layout": "flat",
+            "out_of_band_threshold_bytes": None,
+            "writer": {"n_jobs": 8, "fsync": "none", "max_pending_bytes": 256 * 2**20},
+            "cache": {"max_bytes": 0, "url": None},
+            "s3": {
+                "endpoint_url": None,
+                "max_pool_connections": 32,
+                "multipart_threshold_bytes": 8 * 2**20,
+                "multipart_chunksize_bytes": 8 * 2**20,
+                "max_concurrency": 8,
+            },
+        },
+        "parquetstore": {"url": "file:///mltraq.parquetstore", "compression": "zstd"},
         "archivestore": {
             "url": "file:///mltraq.archivestore",
             "relative_path_prefix": "undefined",
             "mode": "x",
             "format": tarfile.GNU_FORMAT,
+            "n_jobs": 4,
+            "prefetch_bytes": 64 * 2**20,
+            "dedup": {"disable": True, "url": "file:///mltraq.archivestore.blobs", "chunk_bytes": 4 * 2**20},
         },
         "execution": {
             "exceptions": {"compact_message": False, "report_basenames": False},
@@ -47,6 +68,7 @@ class Options(BaseOptions):
             "args_field": False,
             "loky_chdir": True,
             "backend_params": {},
+            "serialize_fields": False,
         },
         "codelog": {"disable": True, "field_name": "codelog"},
         "tqdm": {"disable": False, "delay": 0.5, "leave": False},
@@ -54,7 +76,13 @@ class Options(BaseOptions):
             "store_unsafe_pickle": False,
             "serializer": "DataPakSerializer",
             "compression": {"codec": "uncompressed"},
+            "arrow": {"codec": "uncompressed", "level": None, "dictionary": False},
+            "dedup": {"disable": True, "threshold_bytes": 65536},
+            "n_jobs": 1,
+            "policy": {"disable": True, "compress_threshold_bytes": 1048576},
+            "offload_threshold_bytes": None,
         },
+        "gc": {"n_jobs": 8, "min_age_seconds": 3600},
         "cli": {
             "logging": {"level": "INFO", "format": "%(levelname)-9s %(asctime)s  %(message)s"},
             "tabulate": {"maxcolwidths": 70},
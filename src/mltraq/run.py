@@ -189,6 +189,13 @@ class Run:
                     self.exception = RunException(exception_message())
                     break
 
+        if self.exception is None and options.get("execution.serialize_fields"):
+            # Serialize fields before returning to the driver process, s.t. it receives
+            # values ready to be persisted. Importing here to avoid circular import error.
+            from mltraq.storage.serialization import serialize_fields
+
+            self.fields = serialize_fields(self.fields)
+
         self.clear_after_execution()
 
         return self
@@ -1,12 +1,16 @@
+from __future__ import annotations
+
 import logging
 import uuid
 from contextlib import contextmanager
-from typing import Optional
 
 import pandas as pd
+import pyarrow.dataset
 
 from mltraq.experiment import Experiment
 from mltraq.storage.database import Database
+from mltraq.storage.gc import collect_garbage
+from mltraq.utils.bunch import Bunch
 from mltraq.utils.enums import IfExists, enforce_enum
 from mltraq.utils.text import stringify
 
@@ -20,7 +24,7 @@ class Session:
 
     __slots__ = ("db",)
 
-    def __init__(self, url: Optional[str] = None, ask_password: Optional[bool] = None, db: Optional[Database] = None):
+    def __init__(self, url: str | None = None, ask_password: bool | None = None, db: Database | None = None):
         """
         Create a new session handler, with `url` as database URL and `ask_password`
         triggering the interactive input of the password if True.
@@ -57,7 +61,7 @@ class Session:
     def _repr_html_(self) -> str:
         return self.__str__()
 
-    def create_experiment(self, name: Optional[str] = None, **fields) -> Experiment:
+    def create_experiment(self, name: str | None = None, **fields) -> Experiment:
         """
         Create a new experiment, binded to the database of this session:
         - `name` is optional, a 6 alphanum hash of ID experiment is used if missing.
@@ -76,20 +80,43 @@ class Session:
         """
         return Experiment.ls(self.db)
 
+    def gc(self, dry_run: bool = False, n_jobs: int | None = None, min_age_seconds: float | None = None) -> Bunch:
+        """
+        Delete orphaned experiment directories and unreferenced objects of the DataStore, ArchiveStore
+        and ParquetStore, considering the experiments in the database of the session. If `dry_run` is True,
+        nothing is deleted. See `mltraq.storage.gc.collect_garbage` for details.
+        """
+        return collect_garbage(self.db, dry_run=dry_run, n_jobs=n_jobs, min_age_seconds=min_age_seconds)
+
     def load_experiment(
-        self, name: Optional[str] = None, id_experiment: Optional[uuid.UUID] = None, unsafe_pickle: bool = False
+        self,
+        name: str | None = None,
+        id_experiment: uuid.UUID | None = None,
+        unsafe_pickle: bool = False,
+        columns: list[str] | None = None,
+        filter: pyarrow.dataset.Expression | None = None,  # noqa: A002
     ) -> Experiment:
         """
         Loads a persisted experiment by `name` or `id_experiment`. If `pickle` is True, it will
         attempt to reload the pickled Experiment object from database.
         Unpickling Experiment objects is unsafe, but powerful.
         Whenever possible, prefer the safe persistence of experiment states.
+
+        Parameters `columns` and `filter` limit the fields and runs to load. With the Parquet runs backend,
+        they are pushed down to the Parquet reader.
         """
 
-        return Experiment.load(self.db, name=name, id_experiment=id_experiment, unsafe_pickle=unsafe_pickle)
+        return Experiment.load(
+            self.db,
+            name=name,
+            id_experiment=id_experiment,
+            unsafe_pickle=unsafe_pickle,
+            columns=columns,
+            filter=filter,
+        )
 
     def persist_experiment(
-        self, experiment: Experiment, name: Optional[str] = None, if_exists: IfExists = "fail"
+        self, experiment: Experiment, name: str | None = None, if_exists: IfExists = "fail"
     ) -> Experiment:
         """
         Persist the experiment on the database linked by the session (as a copy), and return it.
@@ -116,7 +143,7 @@ class Session:
 
 
 def create_experiment(
-    name: Optional[str] = None, url: Optional[str] = None, ask_password: Optional[bool] = None, **fields
+    name: str | None = None, url: str | None = None, ask_password: bool | None = None, **fields
 ) -> Experiment:
     """
     Create a new experiment bound to a new session. Shortcut to create a single experiment.
@@ -1,43 +1,93 @@
 from __future__ import annotations
 
+import json
 import logging
 import os
 import tarfile
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from io import BytesIO
 from os.path import normpath
 from shutil import rmtree
-from typing import BinaryIO, Optional, Union
+from stat import S_ISREG
+from typing import BinaryIO, Iterator, Optional, Union
+
+import pyarrow as pa
 
 from mltraq.opts import options
 from mltraq.storage.datastore import DataStoreIO
 from mltraq.utils.bunch import Bunch
+from mltraq.utils.exceptions import InvalidInput
 from mltraq.utils.fs import globs
 
 log = logging.getLogger(__name__)
 
+# Magic number of Zstandard frames, used to detect Zstandard-compressed archives.
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# Suffix of archive modes with Zstandard compression (e.g., "x:zst"), handled with PyArrow streams.
+# Other modes (e.g., "x", "x:gz", "x:xz") are handled natively by tarfile.
+ZSTD_MODE_SUFFIX = ":zst"
+
+# Suffix of the member index files, stored alongside the archives of ArchiveStoreIO.
+INDEX_SUFFIX = ".index"
+
+# Size of the reads of file contents during parallel extraction, bounding the memory used by each thread.
+EXTRACT_CHUNK_BYTES = 8 * 2**20
+
+# Header of the manifests of content-addressed archives, followed by the manifest in JSON format.
+MANIFEST_MAGIC = b"MLTRAQ-MANIFEST-0\n"
+
+# Digests of the chunks of files already stored in the blob pool, by pool directory, chunk size and file
+# pathname. Entries are valid as long as the modification time, size and inode of the file are unchanged.
+snapshot_cache = {}
+snapshot_cache_lock = threading.Lock()
+
 
 class Archive:
     """
     Creation of binary TAR binary blob archives and extraction to filesystem.
     """
 
-    __slots__ = ("data",)
+    __slots__ = ("data", "stats", "params")
     __state__ = ("data",)
 
     @classmethod
-    def from_bytes(cls, data: bytes) -> Archive:
+    def from_bytes(cls, data: Union[bytes, memoryview]) -> Archive:
         """
-        Given a binary blob, create a new Archive instance binded to it.
+        Given a binary blob, create a new Archive instance binded to it. `data` can be any object
+        exposing the buffer protocol (bytes, memoryview, mmap), which is wrapped without copies.
         """
         archive = Archive()
         archive.data = data
+        archive.stats = None
+        archive.params = None
         return archive
 
     def to_bytes(self) -> bytes:
         """
-        Return the binary blob representing the TAR file.
+        Return the binary blob representing the TAR file, copying it only if not already a bytes object.
+        """
+        data = self.to_buffer()
+        return data if isinstance(data, bytes) else bytes(data)
+
+    def to_buffer(self) -> Union[bytes, memoryview]:
+        """
+        Return the binary blob representing the TAR file, without copies. Streaming archives
+        (see `create_streaming`) are created on every call, without retaining them.
         """
-        return self.data
+
+        if self.data is not None:
+            return self.data
+
+        buffer = BytesIO()
+        self.stats = ArchiveStoreIO.add_files(fileobj=buffer, **self.params)
+        # The view keeps the buffer alive, and it is released once no longer referenced.
+        return buffer.getbuffer().toreadonly()
 
     @classmethod
     def create(
@@ -53,9 +103,31 @@ class Archive:
 
         buffer = BytesIO()
 
-        ArchiveStoreIO.add_files(fileobj=buffer, src_dir=src_dir, arc_dir=arc_dir, include=include, exclude=exclude)
+        stats = ArchiveStoreIO.add_files(
+            fileobj=buffer, src_dir=src_dir, arc_dir=arc_dir, include=include, exclude=exclude
+        )
+
+        archive = Archive.from_bytes(buffer.getvalue())
+        archive.stats = stats
+        return archive
+
+    @classmethod
+    def create_streaming(
+        cls,
+        src_dir: str,
+        arc_dir: str = ".",
+        include: Union[str, list[str]] = "**",
+        exclude: Union[str, list[str], None] = None,
+    ) -> Archive:
+        """
+        Lazily define an in-memory TAR archive, without creating it. The archive is created upon
+        serialization, directly in a buffer whose contents are written by the DataPak serializer
+        without intermediate copies, and released afterwards.
+        """
 
-        return Archive.from_bytes(buffer.getvalue())
+        archive = Archive.from_bytes(None)
+        archive.params = Bunch(src_dir=src_dir, arc_dir=arc_dir, include=include, exclude=exclude)
+        return archive
 
     def extract(self, target: str = ".", members: Union[list[str], None] = None):
         """
@@ -64,12 +136,9 @@ class Archive:
 
         log.debug(f"Extracting archive to '{target}' ...")
 
-        buffer = BytesIO()
-        buffer.write(self.data)
-        buffer.seek(0)
-
-        with tarfile.open(fileobj=buffer, mode="r") as archive:
-            archive.extractall(target, members=members, filter="data")
+        # Reading the archive without copying it.
+        with open_tar_read(pa.BufferReader(self.to_buffer())) as archive:
+            archive.extractall(target, members=select_members(archive, members), filter="data")
 
 
 class ArchiveStoreIO:
@@ -78,7 +147,7 @@ class ArchiveStoreIO:
     """
 
     # Attributes to store and serialize.
-    __slots__ = ("url",)
+    __slots__ = ("url", "stats", "extract_stats", "index", "manifest")
     __state__ = ("url",)
 
     def __init__(self, url: str):
@@ -86,6 +155,10 @@ class ArchiveStoreIO:
         Create a new linked archive.
         """
         self.url = url
+        self.stats = None
+        self.extract_stats = None
+        self.index = None
+        self.manifest = None
 
     @classmethod
     def add_files(
@@ -95,20 +168,40 @@ class ArchiveStoreIO:
         arc_dir: str = ".",
         include: Union[str, list[str]] = "**",
         exclude: Union[str, list[str], None] = None,
-    ):
+        index: dict | None = None,
+    ) -> Bunch:
         """
         Add files to an open archive file `fileobj`, from directory `src_dir`, using archive directory `arc_dir`,
-        including glob pattern `include`, excluding glob pattern `exclude`.
-        """
-
-        with tarfile.open(
-            fileobj=fileobj, mode=options().get("archivestore.mode"), format=options().get("archivestore.format")
-        ) as archive:
-
-            for idx, glob_name in enumerate(globs(src_dir, include=include, exclude=exclude)):
-                name = normpath(src_dir + os.sep + glob_name)
-                arcname = normpath(arc_dir + os.sep + glob_name)
-
+        including glob pattern `include`, excluding glob pattern `exclude`. If `index` is provided, it is filled
+        with the member index of the archive, see `ArchiveStoreIO.create`.
+
+        The archive is compressed according to option "archivestore.mode" (e.g., "x:gz", "x:xz", "x:zst").
+        File contents are prefetched by "archivestore.n_jobs" threads, holding at most "archivestore.prefetch_bytes"
+        bytes in memory. Larger files are not prefetched, and are read while being added to the archive.
+        Return statistics about the number of files, their size, the archive size and the throughput.
+        """
+
+        time_start = time.perf_counter()
+        position_start = fileobj.tell()
+        n_files = n_bytes = 0
+
+        glob_names = list(globs(src_dir, include=include, exclude=exclude))
+        pathnames = [normpath(src_dir + os.sep + glob_name) for glob_name in glob_names]
+        arcnames = [normpath(arc_dir + os.sep + glob_name) for glob_name in glob_names]
+
+        mode = options().get("archivestore.mode")
+        if index is not None:
+            # Offsets are valid only if the archive is not compressed, otherwise members are read sequentially.
+            # Only regular files are indexed, the names of other members (e.g., symbolic links) are listed.
+            index.update(seekable=":" not in mode or mode.endswith(":"), members={}, others=[])
+
+        with open_tar_write(
+            fileobj, mode=mode, format=options().get("archivestore.format")
+        ) as archive, ThreadPoolExecutor(max_workers=options().get("archivestore.n_jobs")) as executor:
+            for idx, (name, data) in enumerate(
+                prefetch_files(executor, pathnames, options().get("archivestore.prefetch_bytes"))
+            ):
+                arcname = arcnames[idx]
                 info = archive.gettarinfo(name=name, arcname=arcname)
                 log.debug(f"{cls.__name__}: [{idx}] Adding {name} -> .../{arcname}")
 
@@ -117,8 +210,36 @@ class ArchiveStoreIO:
                 info.uname = "root"
                 info.gname = "root"
 
-                with open(name, "rb") as f:
-                    archive.addfile(info, f)
+                offset = archive.offset
+                if not info.isreg():
+                    # Symbolic links and other special files have no contents.
+                    archive.addfile(info)
+                elif data is not None:
+                    # The file might have changed since it was read, we archive the contents we read.
+                    info.size = len(data)
+                    archive.addfile(info, BytesIO(data))
+                else:
+                    with open(name, "rb") as f:
+                        archive.addfile(info, f)
+
+                if index is not None and info.isreg():
+                    # Header offset, data offset and size. Data blocks are padded to a multiple of BLOCKSIZE.
+                    offset_data = archive.offset - -(-info.size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+                    index["members"][info.name] = [offset, offset_data, info.size]
+                elif index is not None:
+                    index["others"].append(info.name)
+
+                n_files += 1
+                n_bytes += info.size
+
+        stats = Bunch(n_files=n_files, n_bytes=n_bytes, archive_bytes=fileobj.tell() - position_start)
+        stats.duration = time.perf_counter() - time_start
+        stats.bytes_per_second = stats.n_bytes / stats.duration if stats.duration > 0 else 0.0
+        log.debug(
+            f"{cls.__name__}: Archived {stats.n_files} files, {stats.n_bytes} bytes -> {stats.archive_bytes} bytes "
+            f"in {stats.duration:.3f}s ({stats.bytes_per_second / 2**20:.1f} MiB/s)"
+        )
+        return stats
 
     @classmethod
     def create(
@@ -130,6 +251,11 @@ class ArchiveStoreIO:
     ) -> ArchiveStoreIO:
         """
         Creates and stores the archive, returning its ArchiveStoreIO representation.
+        The member index, mapping archived file names to their offsets and sizes, is stored
+        alongside the archive (same pathname, with suffix INDEX_SUFFIX), to access members directly.
+
+        If option "archivestore.dedup.disable" is False, a content-addressed archive is created instead,
+        see `add_snapshot`.
         """
 
         pathname, url = DataStoreIO.get_next_pathname_url()
@@ -137,10 +263,78 @@ class ArchiveStoreIO:
         # fails with the PAX default format.
 
         log.debug(f"{cls.__name__}: Creating archive {pathname}")
+        if not options().get("archivestore.dedup.disable"):
+            with open(pathname, "xb") as f:
+                stats = cls.add_snapshot(fileobj=f, src_dir=src_dir, arc_dir=arc_dir, include=include, exclude=exclude)
+            archive = ArchiveStoreIO(url)
+            archive.stats = stats
+            return archive
+
+        index = {}
         with open(pathname, "xb") as f:
-            cls.add_files(fileobj=f, src_dir=src_dir, arc_dir=arc_dir, include=include, exclude=exclude)
+            stats = cls.add_files(
+                fileobj=f, src_dir=src_dir, arc_dir=arc_dir, include=include, exclude=exclude, index=index
+            )
+        with open(pathname + INDEX_SUFFIX, "x") as f:
+            json.dump(index, f)
+
+        archive = ArchiveStoreIO(url)
+        archive.stats = stats
+        archive.index = index
+        return archive
+
+    @classmethod
+    def add_snapshot(
+        cls,
+        fileobj: BinaryIO,
+        src_dir: str,
+        arc_dir: str = ".",
+        include: Union[str, list[str]] = "**",
+        exclude: Union[str, list[str], None] = None,
+    ) -> Bunch:
+        """
+        Write to `fileobj` the manifest of a content-addressed archive of the files in `src_dir`, see `add_files`.
 
-        return ArchiveStoreIO(url)
+        Files are split in chunks of "archivestore.dedup.chunk_bytes" bytes, stored once as blobs named after
+        their hash in the shared pool "archivestore.dedup.url". The manifest lists the chunks of each file.
+        Files unchanged since they were last archived by this process (same modification time, size and inode)
+        are not read again. Files are processed in parallel by "archivestore.n_jobs" threads.
+        Return statistics about the number of files, their size, the read files, the new blobs and the throughput.
+        """
+
+        time_start = time.perf_counter()
+        pool_url = options().get("archivestore.dedup.url")
+        pool_dir = DataStoreIO.get_filepath(pool_url)
+        chunk_bytes = options().get("archivestore.dedup.chunk_bytes")
+
+        glob_names = list(globs(src_dir, include=include, exclude=exclude))
+        pathnames = [normpath(src_dir + os.sep + glob_name) for glob_name in glob_names]
+        arcnames = [normpath(arc_dir + os.sep + glob_name) for glob_name in glob_names]
+
+        with ThreadPoolExecutor(max_workers=options().get("archivestore.n_jobs")) as executor:
+            snapshots = list(executor.map(lambda pathname: snapshot_file(pool_dir, pathname, chunk_bytes), pathnames))
+
+        members = {}
+        for arcname, (digests, stat, _, _) in zip(arcnames, snapshots):
+            members[arcname] = {"digests": digests, "size": stat.st_size, "mode": stat.st_mode, "mtime": stat.st_mtime}
+
+        data = MANIFEST_MAGIC + json.dumps({"url": pool_url, "members": members}).encode()
+        fileobj.write(data)
+
+        stats = Bunch(
+            n_files=len(members),
+            n_bytes=sum(member["size"] for member in members.values()),
+            n_read_files=sum(was_read for _, _, was_read, _ in snapshots),
+            n_new_bytes=sum(new_bytes for _, _, _, new_bytes in snapshots),
+            archive_bytes=len(data),
+        )
+        stats.duration = time.perf_counter() - time_start
+        stats.bytes_per_second = stats.n_bytes / stats.duration if stats.duration > 0 else 0.0
+        log.debug(
+            f"{cls.__name__}: Archived {stats.n_files} files, {stats.n_bytes} bytes ({stats.n_read_files} files read, "
+            f"{stats.n_new_bytes} new bytes) in {stats.duration:.3f}s ({stats.bytes_per_second / 2**20:.1f} MiB/s)"
+        )
+        return stats
 
     @classmethod
     def get_target(cls, target: Optional[str] = None):
@@ -160,35 +354,183 @@ class ArchiveStoreIO:
             )
         return target
 
-    def extract(self, target: Optional[str] = None, members: Union[list[str], None] = None) -> ArchiveStoreIO:
+    def get_manifest(self) -> dict | None:
         """
-        Extracts the archive to `target` directory.
+        Return the manifest of the archive, loading it if necessary. Return None if it is not content-addressed.
+        """
+
+        if self.manifest is None:
+            with open(DataStoreIO.get_pathname_from_url(self.url), "rb") as f:
+                if f.read(len(MANIFEST_MAGIC)) != MANIFEST_MAGIC:
+                    return None
+                self.manifest = json.loads(f.read())
+        return self.manifest
+
+    def get_index(self) -> dict | None:
+        """
+        Return the member index of the archive, loading it if necessary. Return None if missing,
+        e.g., for archives created by previous versions.
+        """
+
+        if self.index is None:
+            try:
+                with open(DataStoreIO.get_pathname_from_url(self.url) + INDEX_SUFFIX) as f:
+                    self.index = json.load(f)
+            except FileNotFoundError:
+                return None
+        return self.index
+
+    def extract(
+        self, target: str | None = None, members: Union[list[str], None] = None, n_jobs: int | None = None
+    ) -> ArchiveStoreIO:
+        """
+        Extracts the archive to `target` directory. If `members` is provided, only the archived files
+        with these names are extracted, seeking directly to them if the archive is indexed and not compressed.
+
+        Files of uncompressed and content-addressed archives are written in parallel by `n_jobs` threads
+        (default: option "archivestore.n_jobs"), after reading the list of members once. Members are checked
+        and sanitized with the tarfile data filter, as in sequential extraction. Statistics about the number
+        of extracted files, their size and the throughput are stored in attribute `extract_stats`.
         """
 
         target = ArchiveStoreIO.get_target(target)
+        n_jobs = options().get("archivestore.n_jobs", prefer=n_jobs)
+        time_start = time.perf_counter()
 
         log.debug(f"Extracting archive to '{target}' ...")
 
+        manifest = self.get_manifest()
+        if manifest is not None:
+            names = manifest["members"] if members is None else members
+            with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+                sizes = list(executor.map(lambda name: extract_snapshot_file(manifest, name, target), names))
+        else:
+            sizes = self.extract_tar(target, members, n_jobs)
+
+        stats = Bunch(n_files=len(sizes), n_bytes=sum(sizes), duration=time.perf_counter() - time_start)
+        stats.files_per_second = stats.n_files / stats.duration if stats.duration > 0 else 0.0
+        stats.bytes_per_second = stats.n_bytes / stats.duration if stats.duration > 0 else 0.0
+        log.debug(
+            f"{self.__class__.__name__}: Extracted {stats.n_files} files, {stats.n_bytes} bytes "
+            f"in {stats.duration:.3f}s ({stats.files_per_second:.1f} files/s, "
+            f"{stats.bytes_per_second / 2**20:.1f} MiB/s)"
+        )
+        self.extract_stats = stats
+        return self
+
+    def extract_tar(self, target: str, members: Union[list[str], None], n_jobs: int) -> list[int]:
+        """
+        Extract the archived files with names `members` (all, if None) of the TAR archive to directory `target`,
+        in parallel with `n_jobs` threads if not compressed. Return the sizes of the extracted members.
+        """
+
+        with open(DataStoreIO.get_pathname_from_url(self.url), "rb") as f:
+            try:
+                archive = tarfile.open(fileobj=f, mode="r:")
+            except tarfile.ReadError:
+                # Compressed archive, extracted sequentially below.
+                archive = None
+
+            if archive is not None:
+                with archive:
+                    return extract_members(f, archive, self.get_members(f, archive, members), target, n_jobs)
+
+        sizes = []
+
+        def extracted(infos: Iterator[tarfile.TarInfo]) -> Iterator[tarfile.TarInfo]:
+            for info in infos:
+                sizes.append(info.size if info.isreg() else 0)
+                yield info
+
         with self.open() as archive:
             # Data filter: https://docs.python.org/3.10/library/tarfile.html#tarfile.data_filter
-            archive.extractall(target, members=members, filter="data")
+            archive.extractall(target, members=extracted(select_members(archive, members) or archive), filter="data")
+        return sizes
 
-        return self
+    def get_members(
+        self, f: BinaryIO, archive: tarfile.TarFile, members: Union[list[str], None]
+    ) -> list[tarfile.TarInfo]:
+        """
+        Return the members with names `members` (all, if None) of the uncompressed TAR `archive`, open on file `f`.
+        If the archive is indexed and `members` are regular files, their headers are read directly.
+        """
+
+        if members is None:
+            return archive.getmembers()
+
+        index = self.get_index()
+        if index is None or any(name not in index["members"] for name in members):
+            names = set(members)
+            return [info for info in archive.getmembers() if info.name in names]
+
+        infos = []
+        for name in members:
+            f.seek(self.get_entry(name)[0])
+            infos.append(tarfile.TarInfo.fromtarfile(archive))
+        return infos
+
+    def read_member(self, name: str) -> bytes:
+        """
+        Return the contents of archived file `name`, without extracting it. If the archive is indexed
+        and not compressed, only the file contents are read. Otherwise, the archive is scanned up to the file.
+        """
+
+        manifest = self.get_manifest()
+        if manifest is not None:
+            return b"".join(read_snapshot_file(manifest, name))
+
+        index = self.get_index()
+        if index is not None and index["seekable"]:
+            _, offset_data, size = self.get_entry(name)
+            with open(DataStoreIO.get_pathname_from_url(self.url), "rb") as f:
+                f.seek(offset_data)
+                return f.read(size)
+
+        with self.open() as archive:
+            for info in archive:
+                if info.name == name and info.isreg():
+                    return archive.extractfile(info).read()
+        raise InvalidInput(f"File '{name}' not found in archive {self.url}")
+
+    def get_entry(self, name: str) -> list[int]:
+        """
+        Return the header offset, data offset and size of archived file `name`, from the member index.
+        """
+
+        entry = self.get_index()["members"].get(name)
+        if entry is None:
+            raise InvalidInput(f"File '{name}' not found in archive {self.url}")
+        return entry
+
+    def get_member_names(self) -> list[str]:
+        """
+        Return the names of the archived files. The member index is used if present, otherwise the archive is scanned.
+        """
+
+        manifest = self.get_manifest()
+        if manifest is not None:
+            return list(manifest["members"])
+        index = self.get_index()
+        if index is not None:
+            return list(index["members"]) + index.get("others", [])
+        with self.open() as archive:
+            return archive.getnames()
 
     def getnames(self, target: Optional[str] = None) -> list[str]:
         """
-        Load archive and return a list with its archived file names.
+        Return a list with its archived file names, prefixed by the `target` directory.
         """
 
         target = ArchiveStoreIO.get_target(target)
-        with self.open() as archive:
-            return [normpath(target + os.sep + name) for name in archive.getnames()]
+        return [normpath(target + os.sep + name) for name in self.get_member_names()]
 
-    def open(self):
+    @contextmanager
+    def open(self) -> Iterator[tarfile.TarFile]:
         """
-        Return the Tarfile object pointing to the archive URL.
+        Return the Tarfile object pointing to the archive URL, as context manager.
         """
-        return tarfile.open(DataStoreIO.get_pathname_from_url(self.url), mode="r")
+        with open(DataStoreIO.get_pathname_from_url(self.url), "rb") as f, open_tar_read(f) as archive:
+            yield archive
 
     @classmethod
     def delete(cls, relative_path_prefix: str):
@@ -228,18 +570,339 @@ class ArchiveStore:
     @staticmethod
     def from_url(url) -> ArchiveStore:
         """
-        Extracts the archive from `url` and returns
-        an ArchiveStore object pointing to it.
+        Returns an ArchiveStore object pointing to the archive at `url`, without extracting it.
+        The archive is extracted on demand, see `get_target`, `extract` and `read_member`.
         """
 
-        ArchiveStoreIO(url).extract()
         obj = ArchiveStore.__new__(ArchiveStore)
-        obj.params = Bunch(target=ArchiveStoreIO.get_target())
+        obj.params = Bunch(url=url, target=ArchiveStoreIO.get_target(), extracted=False)
 
         return obj
 
     def get_target(self) -> Union[str, None]:
         """
-        Return the destination directory of the unarchived files
+        Return the destination directory of the unarchived files, extracting all of them on first access.
         """
+
+        if "url" in self.params and not self.params.extracted:
+            self.extract()
         return self.params.get("target", None)
+
+    def extract(self, members: Union[list[str], None] = None) -> str:
+        """
+        Extract the archived files with names `members`, or all of them, and return the destination directory.
+        """
+
+        ArchiveStoreIO(self.params.url).extract(self.params.target, members=members)
+        if members is None:
+            self.params.extracted = True
+        return self.params.target
+
+    def getnames(self) -> list[str]:
+        """
+        Return the names of the archived files.
+        """
+        return ArchiveStoreIO(self.params.url).get_member_names()
+
+    def read_member(self, name: str) -> bytes:
+        """
+        Return the contents of archived file `name`, without extracting it.
+        """
+        return ArchiveStoreIO(self.params.url).read_member(name)
+
+
+class UnclosableFile:
+    """
+    Write-only proxy of a file object that is not closed by its consumers, used to wrap the file objects
+    passed to PyArrow output streams, which close them on exit.
+    """
+
+    def __init__(self, fileobj: BinaryIO):
+        self.fileobj = fileobj
+        self.closed = False
+
+    def write(self, data: bytes) -> int:
+        return self.fileobj.write(data)
+
+    def flush(self):
+        self.fileobj.flush()
+
+    def tell(self) -> int:
+        return self.fileobj.tell()
+
+    def close(self):
+        self.closed = True
+
+
+@contextmanager
+def open_tar_write(fileobj: BinaryIO, mode: str, format: int) -> Iterator[tarfile.TarFile]:  # noqa: A002
+    """
+    Open a new TAR archive for writing to `fileobj`, with `mode` and `format`. Modes ending with ZSTD_MODE_SUFFIX
+    write a Zstandard-compressed TAR stream, other modes are handled by tarfile. `fileobj` is not closed.
+    """
+
+    if not mode.endswith(ZSTD_MODE_SUFFIX):
+        with tarfile.open(fileobj=fileobj, mode=mode, format=format) as archive:
+            yield archive
+        return
+
+    stream = pa.CompressedOutputStream(pa.PythonFile(UnclosableFile(fileobj), mode="w"), "zstd")
+    try:
+        with tarfile.open(fileobj=stream, mode="w|", format=format) as archive:
+            yield archive
+    finally:
+        stream.close()
+
+
+@contextmanager
+def open_tar_read(fileobj: BinaryIO) -> Iterator[tarfile.TarFile]:
+    """
+    Open the TAR archive in `fileobj` for reading, detecting its compression. Zstandard-compressed archives
+    are read as streams: members can be accessed only sequentially, once.
+    """
+
+    magic = fileobj.read(len(ZSTD_MAGIC))
+    fileobj.seek(-len(magic), os.SEEK_CUR)
+    if magic != ZSTD_MAGIC:
+        with tarfile.open(fileobj=fileobj, mode="r") as archive:
+            yield archive
+        return
+
+    if not isinstance(fileobj, pa.NativeFile):
+        fileobj = pa.PythonFile(fileobj, mode="r")
+    stream = pa.CompressedInputStream(fileobj, "zstd")
+    with tarfile.open(fileobj=stream, mode="r|") as archive:
+        yield archive
+
+
+def select_members(archive: tarfile.TarFile, names: Union[list[str], None]) -> Iterator[tarfile.TarInfo] | None:
+    """
+    Return the members of `archive` with `names`, read sequentially, or None (all members) if `names` is None.
+    """
+
+    if names is None:
+        return None
+    names = set(names)
+    return (info for info in archive if info.name in names)
+
+
+def prefetch_files(
+    executor: ThreadPoolExecutor, pathnames: list[str], max_bytes: int
+) -> Iterator[tuple[str, bytes | None]]:
+    """
+    Yield pairs (pathname, contents) for `pathnames`, in order. Contents are read ahead by `executor`,
+    holding at most `max_bytes` bytes. Files larger than `max_bytes` and files that are not regular
+    (e.g., symbolic links, not followed) are not read, and their contents are None.
+    """
+
+    def read(pathname: str) -> bytes:
+        with open(pathname, "rb") as f:
+            return f.read()
+
+    pending = deque()
+    pending_bytes = 0
+    pos = 0
+    while pos < len(pathnames) or pending:
+        # Read ahead as many files as possible, within the limit.
+        while pos < len(pathnames):
+            stat = os.lstat(pathnames[pos])
+            size = stat.st_size
+            if not S_ISREG(stat.st_mode):
+                pending.append((pathnames[pos], None, 0))
+            elif size > max_bytes:
+                if pending:
+                    break
+                pending.append((pathnames[pos], None, 0))
+            elif pending_bytes + size <= max_bytes:
+                pending.append((pathnames[pos], executor.submit(read, pathnames[pos]), size))
+                pending_bytes += size
+            else:
+                break
+            pos += 1
+
+        pathname, future, size = pending.popleft()
+        pending_bytes -= size
+        yield pathname, None if future is None else future.result()
+
+
+def snapshot_file(pool_dir: str, pathname: str, chunk_bytes: int) -> tuple[list[str], os.stat_result, bool, int]:
+    """
+    Store the chunks of file `pathname` in the blob pool `pool_dir`, unless the file is unchanged since
+    it was last stored. Return the digests of its chunks, its stats, whether it was read, and the new stored bytes.
+    """
+
+    stat = os.stat(pathname)
+    key = (pool_dir, chunk_bytes, os.path.realpath(pathname))
+    signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    with snapshot_cache_lock:
+        cached = snapshot_cache.get(key)
+    if (
+        cached is not None
+        and cached[0] == signature
+        and all(touch_blob(get_blob_pathname(pool_dir, digest)) for digest in cached[1])
+    ):
+        return cached[1], stat, False, 0
+
+    digests = []
+    new_bytes = 0
+    with open(pathname, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_bytes), b""):
+            digest, n_bytes = put_blob(pool_dir, chunk)
+            digests.append(digest)
+            new_bytes += n_bytes
+
+    # If the file changes while being read, its signature changes and it will be read again.
+    with snapshot_cache_lock:
+        snapshot_cache[key] = (signature, digests)
+    return digests, stat, True, new_bytes
+
+
+def get_blob_pathname(pool_dir: str, digest: str) -> str:
+    """
+    Return the pathname of blob `digest` in the blob pool `pool_dir`.
+    """
+    return pool_dir + os.sep + digest[:2] + os.sep + digest
+
+
+def put_blob(pool_dir: str, data: bytes) -> tuple[str, int]:
+    """
+    Store `data` as a blob in the blob pool `pool_dir`, unless already present. Blobs are written atomically.
+    Return the digest of the blob, and the number of written bytes.
+    """
+
+    # Importing here to avoid circular import error.
+    from mltraq.storage.serialization import blob_digest
+
+    digest = blob_digest(data)
+    pathname = get_blob_pathname(pool_dir, digest)
+    if touch_blob(pathname):
+        return digest, 0
+
+    os.makedirs(os.path.dirname(pathname), exist_ok=True)
+    pathname_tmp = f"{pathname}.{uuid.uuid4().hex}.tmp"
+    with open(pathname_tmp, "wb") as f:
+        f.write(data)
+    try:
+        # Linking fails if the blob has been stored concurrently, e.g., by another thread.
+        os.link(pathname_tmp, pathname)
+    except FileExistsError:
+        return digest, 0
+    except OSError:
+        # Hard links not supported by the filesystem.
+        os.replace(pathname_tmp, pathname)
+    finally:
+        if os.path.exists(pathname_tmp):
+            os.remove(pathname_tmp)
+    return digest, len(data)
+
+
+def touch_blob(pathname: str) -> bool:
+    """
+    Update the modification time of blob `pathname`, s.t. it is not garbage collected while
+    being referenced by a new archive. Return False if the blob does not exist.
+    """
+
+    try:
+        os.utime(pathname)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def get_snapshot_member(manifest: dict, name: str) -> dict:
+    """
+    Return the entry of archived file `name` in `manifest`, with its chunk digests, size, mode and modification time.
+    """
+
+    member = manifest["members"].get(name)
+    if member is None:
+        raise InvalidInput(f"File '{name}' not found in content-addressed archive")
+    return member
+
+
+def read_snapshot_file(manifest: dict, name: str) -> Iterator[bytes]:
+    """
+    Yield the chunks of archived file `name` of the content-addressed archive with `manifest`.
+    """
+
+    pool_dir = DataStoreIO.get_filepath(manifest["url"])
+    for digest in get_snapshot_member(manifest, name)["digests"]:
+        with open(get_blob_pathname(pool_dir, digest), "rb") as f:
+            yield f.read()
+
+
+def extract_snapshot_file(manifest: dict, name: str, target: str) -> int:
+    """
+    Extract archived file `name` of the content-addressed archive with `manifest` to directory `target`.
+    Consistently with the tarfile data filter, files outside `target` are rejected, and permissions
+    are limited to the ones of regular files, without group and other write permissions.
+    Return the size of the extracted file.
+    """
+
+    member = get_snapshot_member(manifest, name)
+    target = os.path.realpath(target)
+    pathname = os.path.realpath(os.path.join(target, name))
+    if os.path.commonpath([target, pathname]) != target:
+        raise InvalidInput(f"File '{name}' would be extracted outside of the destination directory")
+
+    os.makedirs(os.path.dirname(pathname), exist_ok=True)
+    with open(pathname, "wb") as f:
+        f.writelines(read_snapshot_file(manifest, name))
+
+    os.chmod(pathname, member["mode"] & 0o755 | 0o600)
+    os.utime(pathname, (member["mtime"], member["mtime"]))
+    return member["size"]
+
+
+def extract_members(
+    f: BinaryIO, archive: tarfile.TarFile, infos: list[tarfile.TarInfo], target: str, n_jobs: int
+) -> list[int]:
+    """
+    Extract members `infos` of the uncompressed TAR `archive`, open on file `f`, to directory `target`.
+    Regular files are checked and sanitized with the tarfile data filter, and written in parallel by `n_jobs`
+    threads with positional reads of their contents. Other members (e.g., directories and links) are extracted
+    afterwards by tarfile. If positional reads are not supported (e.g., on Windows) or `n_jobs` is 1, all members
+    are extracted by tarfile. Return the sizes of the extracted members.
+    """
+
+    if n_jobs <= 1 or not hasattr(os, "pread"):
+        archive.extractall(target, members=infos, filter="data")
+        return [info.size if info.isreg() else 0 for info in infos]
+
+    # If a file is archived multiple times, the last one is extracted, as with tarfile.
+    files = {info.name: info for info in infos if info.isreg() and not info.issparse()}
+    others = [info for info in infos if not info.isreg() or info.issparse()]
+
+    # The data filter raises exceptions for unsafe members, returning members with sanitized attributes otherwise.
+    files = [tarfile.data_filter(info, target) for info in files.values()]
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        list(executor.map(lambda info: extract_file(f.fileno(), info, target), files))
+
+    archive.extractall(target, members=others, filter="data")
+    return [info.size for info in files] + [info.size if info.isreg() else 0 for info in others]
+
+
+def extract_file(fd: int, info: tarfile.TarInfo, target: str):
+    """
+    Extract regular file `info`, already sanitized by the tarfile data filter, to directory `target`,
+    reading its contents from the archive open on file descriptor `fd` with positional reads.
+    """
+
+    pathname = os.path.join(target, info.name)
+    os.makedirs(os.path.dirname(pathname), exist_ok=True)
+
+    offset = info.offset_data
+    remaining = info.size
+    with open(pathname, "wb") as f:
+        while remaining > 0:
+            chunk = os.pread(fd, min(remaining, EXTRACT_CHUNK_BYTES), offset)
+            if not chunk:
+                raise tarfile.ReadError(f"Unexpected end of data extracting '{info.name}'")
+            f.write(chunk)
+            offset += len(chunk)
+            remaining -= len(chunk)
+
+    if info.mode is not None:
+        os.chmod(pathname, info.mode)
+    if info.mtime is not None:
+        os.utime(pathname, (info.mtime, info.mtime))
@@ -0,0 +1,60 @@
+import abc
+from typing import Any, List, Optional, Union
+
+
+class Backend(abc.ABC):
+    """
+    Abstract class for DataStore backends. Objects are stored by key, a relative path
+    (e.g., "id_experiment/uuid") in the namespace identified by the backend URL.
+    """
+
+    def __init__(self, url: str):
+        """
+        Create a new backend, storing objects in the namespace identified by `url`.
+        """
+        self.url = url
+
+    @abc.abstractmethod
+    def write(self, key: str, data: Union[bytes, List[Any]], fsync: bool = False) -> int:
+        """
+        Write `data` to object `key`, either bytes or a list of bytes-like chunks written in sequence.
+        If `fsync` is True, the write must be durable before returning. Return the number of written bytes.
+        """
+        pass
+
+    @abc.abstractmethod
+    def read(
+        self, key: str, offset: int = 0, size: Optional[int] = None, mmap: bool = False
+    ) -> Union[bytes, memoryview]:
+        """
+        Return `size` bytes of object `key` starting from `offset`, or all remaining bytes if `size` is None.
+        If `mmap` is True and supported, a read-only memoryview on the memory-mapped object is returned.
+        """
+        pass
+
+    @abc.abstractmethod
+    def delete_prefix(self, prefix: str):
+        """
+        Delete all objects whose key starts with `prefix` + "/".
+        """
+        pass
+
+    def sync(self, keys: List[str]):  # noqa: B027
+        """
+        Make durable the creation of objects `keys`, already written. By default, nothing is done.
+        """
+        pass
+
+
+def as_chunks(data: Union[bytes, List[Any]]) -> List[Any]:
+    """
+    Return `data` as a list of bytes-like chunks.
+    """
+    return data if isinstance(data, list) else [data]
+
+
+def nbytes(chunks: List[Any]) -> int:
+    """
+    Return the total size of bytes-like `chunks`, in bytes.
+    """
+    return sum(memoryview(chunk).nbytes for chunk in chunks)
@@ -0,0 +1,88 @@
+import mmap as mmap_module
+import os
+from shutil import rmtree
+from typing import Any, List, Optional, Union
+from urllib.parse import urlparse
+
+from mltraq.storage.backends.backend import Backend, as_chunks, nbytes
+from mltraq.utils.exceptions import InvalidInput
+
+
+class FileBackend(Backend):
+    """
+    Backend storing objects as files on the local filesystem, with URLs "file:///relative/or/absolute path".
+    """
+
+    def __init__(self, url: str):
+        """
+        Create a new backend, storing objects in the directory identified by `url`.
+        """
+
+        super().__init__(url)
+        if urlparse(url).scheme != "file" or not url.startswith("file:///"):
+            raise InvalidInput(f"Invalid file path, it must start with file:/// but found {url}")
+        self.pathdir = urlparse(url).path[1:]
+
+    def get_pathname(self, key: str) -> str:
+        """
+        Return the pathname of object `key`.
+        """
+        return self.pathdir + os.sep + key
+
+    def write(self, key: str, data: Union[bytes, List[Any]], fsync: bool = False) -> int:
+        """
+        Write `data` to object `key`. If `fsync` is True, file contents are flushed to disk with fdatasync.
+        """
+
+        pathname = self.get_pathname(key)
+        os.makedirs(os.path.dirname(pathname), exist_ok=True)
+        chunks = as_chunks(data)
+        with open(pathname, "wb") as f:
+            f.writelines(chunks)
+            if fsync:
+                f.flush()
+                getattr(os, "fdatasync", os.fsync)(f.fileno())
+        return nbytes(chunks)
+
+    def read(
+        self, key: str, offset: int = 0, size: Optional[int] = None, mmap: bool = False
+    ) -> Union[bytes, memoryview]:
+        """
+        Read object `key`. If `mmap` is True, the file is memory-mapped read-only and a memoryview
+        on the mapping is returned. The mapping is released once no longer referenced.
+        """
+
+        with open(self.get_pathname(key), "rb") as f:
+            if mmap and os.fstat(f.fileno()).st_size > 0:
+                view = memoryview(mmap_module.mmap(f.fileno(), 0, access=mmap_module.ACCESS_READ))
+                return view[offset:] if size is None else view[offset : offset + size]
+            f.seek(offset)
+            return f.read(-1 if size is None else size)
+
+    def delete_prefix(self, prefix: str):
+        """
+        Delete directory `prefix`.
+        """
+        rmtree(self.get_pathname(prefix), ignore_errors=True)
+
+    def sync(self, keys: List[str]):
+        """
+        Flush to disk the directory entries of the files `keys`, once for each directory.
+        """
+        for dirname in {os.path.dirname(self.get_pathname(key)) for key in keys}:
+            fsync_dir(dirname)
+
+
+def fsync_dir(dirname: str):
+    """
+    Flush to disk the directory entries of `dirname`, making the creation of its files durable.
+    Not supported on Windows, where it does nothing.
+    """
+
+    if os.name == "nt":
+        return
+    fd = os.open(dirname, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,161 @@
+import os
+import threading
+from io import BytesIO
+from typing import Any, List, Optional, Union
+from urllib.parse import urlparse
+
+from mltraq.job import MissingDependency
+from mltraq.opts import options
+from mltraq.storage.backends.backend import Backend, as_chunks, nbytes
+from mltraq.utils.exceptions import ExceptionWithMessage, InvalidInput
+
+# Maximum number of keys per DeleteObjects request.
+DELETE_BATCH_SIZE = 1000
+
+
+class DeleteError(ExceptionWithMessage):
+    """
+    Raised if objects could not be deleted.
+    """
+
+    pass
+
+
+class S3Backend(Backend):
+    """
+    Backend storing objects in an S3-compatible object store (AWS S3, MinIO, ...), with URLs
+    "s3://bucket/optional/key/prefix". Options "datastore.s3.*" control the endpoint, the size of the
+    connection pool, shared by all backends with the same configuration, and multipart transfers:
+    objects larger than "datastore.s3.multipart_threshold_bytes" are uploaded and downloaded in parts
+    of "datastore.s3.multipart_chunksize_bytes" bytes, transferred in parallel by "datastore.s3.max_concurrency"
+    threads. Requires the boto3 package.
+    """
+
+    # Clients, by configuration. Clients are thread-safe and maintain a connection pool.
+    clients = {}
+    lock = threading.Lock()
+
+    def __init__(self, url: str):
+        """
+        Create a new backend, storing objects in the bucket and key prefix identified by `url`.
+        """
+
+        super().__init__(url)
+        parsed = urlparse(url)
+        if parsed.scheme != "s3" or not parsed.netloc:
+            raise InvalidInput(f"Invalid S3 URL, it must be in the form s3://bucket/prefix but found {url}")
+        self.bucket = parsed.netloc
+        self.prefix = parsed.path.strip("/")
+        self.client = self.get_client()
+
+        # Optional dependency, installed if we could create the client.
+        from boto3.s3.transfer import TransferConfig
+
+        self.transfer_config = TransferConfig(
+            multipart_threshold=options().get("datastore.s3.multipart_threshold_bytes"),
+            multipart_chunksize=options().get("datastore.s3.multipart_chunksize_bytes"),
+            max_concurrency=options().get("datastore.s3.max_concurrency"),
+        )
+
+    @classmethod
+    def get_client(cls):
+        """
+        Return the S3 client for the current configuration, creating it if necessary.
+        """
+
+        try:
+            import boto3
+            from botocore.config import Config
+        except ImportError as e:
+            raise MissingDependency("S3 DataStore backend requested but boto3 not installed, aborting.") from e
+
+        endpoint_url = options().get("datastore.s3.endpoint_url")
+        max_pool_connections = options().get("datastore.s3.max_pool_connections")
+        with cls.lock:
+            client = cls.clients.get((endpoint_url, max_pool_connections))
+            if client is None:
+                # Sessions are not thread-safe, we create a new one for each client.
+                client = boto3.session.Session().client(
+                    "s3", endpoint_url=endpoint_url, config=Config(max_pool_connections=max_pool_connections)
+                )
+                cls.clients[(endpoint_url, max_pool_connections)] = client
+            return client
+
+    def get_key(self, key: str) -> str:
+        """
+        Return the S3 key of object `key`.
+        """
+        # Keys of the DataStore are built with the path separator of the OS, S3 keys with "/".
+        key = key.replace(os.sep, "/")
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def write(self, key: str, data: Union[bytes, List[Any]], fsync: bool = False) -> int:
+        """
+        Write `data` to object `key`, with a multipart upload if larger than the multipart threshold.
+        Writes are durable once acknowledged, `fsync` is ignored.
+        """
+
+        chunks = as_chunks(data)
+        size = nbytes(chunks)
+        body = BytesIO(chunks[0]) if len(chunks) == 1 else join_chunks(chunks, size)
+        if size >= self.transfer_config.multipart_threshold:
+            self.client.upload_fileobj(body, self.bucket, self.get_key(key), Config=self.transfer_config)
+        else:
+            self.client.put_object(Bucket=self.bucket, Key=self.get_key(key), Body=body)
+        return size
+
+    def read(
+        self, key: str, offset: int = 0, size: Optional[int] = None, mmap: bool = False
+    ) -> Union[bytes, memoryview]:
+        """
+        Read object `key`. Complete reads of objects larger than the multipart threshold are done
+        with parallel ranged requests, partial reads with a single ranged request. `mmap` is ignored.
+        """
+
+        if offset == 0 and size is None:
+            buffer = BytesIO()
+            self.client.download_fileobj(self.bucket, self.get_key(key), buffer, Config=self.transfer_config)
+            return buffer.getvalue()
+
+        if size == 0:
+            return b""
+        byte_range = f"bytes={offset}-" if size is None else f"bytes={offset}-{offset + size - 1}"
+        return self.client.get_object(Bucket=self.bucket, Key=self.get_key(key), Range=byte_range)["Body"].read()
+
+    def delete_prefix(self, prefix: str):
+        """
+        Delete all objects whose key starts with `prefix` + "/", in batches.
+        """
+
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.get_key(prefix) + "/"):
+            keys = [{"Key": item["Key"]} for item in page.get("Contents", [])]
+            for pos in range(0, len(keys), DELETE_BATCH_SIZE):
+                response = self.client.delete_objects(
+                    Bucket=self.bucket, Delete={"Objects": keys[pos : pos + DELETE_BATCH_SIZE], "Quiet": True}
+                )
+                # Failed deletions are reported in the response, rather than raised.
+                errors = response.get("Errors", [])
+                if errors:
+                    raise DeleteError(
+                        f"Failed to delete {len(errors)} objects from bucket {self.bucket}, "
+                        f"e.g., {errors[0].get('Key')}: {errors[0].get('Code')} {errors[0].get('Message')}"
+                    )
+
+
+def join_chunks(chunks: List[Any], size: int) -> BytesIO:
+    """
+    Return a file object with the concatenation of bytes-like `chunks`, of `size` bytes in total,
+    copied in a single buffer allocated upfront.
+    """
+
+    body = BytesIO()
+    if size > 0:
+        # Writing the last byte allocates the whole buffer, chunks are then copied in place.
+        body.seek(size - 1)
+        body.write(b"\0")
+        body.seek(0)
+    for chunk in chunks:
+        body.write(chunk)
+    body.seek(0)
+    return body
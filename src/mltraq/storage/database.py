@@ -3,10 +3,10 @@ import logging
 import re
 import uuid
 from functools import partial
-from typing import Callable, Iterator, List, Optional, Union
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Union
 
 import pandas as pd
-from sqlalchemy import MetaData, Table, create_engine, inspect, sql
+from sqlalchemy import Index, MetaData, String, Table, cast, create_engine, delete, inspect, select, sql
 from sqlalchemy.engine import make_url
 from sqlalchemy.exc import DBAPIError, OperationalError
 from sqlalchemy.orm import Query, sessionmaker
@@ -17,7 +17,7 @@ from sqlalchemy.sql.selectable import Select
 from tqdm.auto import tqdm
 
 from mltraq.opts import options
-from mltraq.storage.models import Base
+from mltraq.storage.models import Base, Blob
 from mltraq.utils.bunch import Bunch
 from mltraq.utils.enums import IfExists
 from mltraq.utils.exceptions import InvalidInput
@@ -77,7 +77,10 @@ class Database:
         self.session = sessionmaker(self.engine)
 
         if create_tables:
-            Base.metadata.create_all(self.engine)
+            # The blobs table is created on first use by `insert_blobs`, if deduplication is enabled.
+            Base.metadata.create_all(
+                self.engine, tables=[table for table in Base.metadata.sorted_tables if table is not Blob.__table__]
+            )
 
     def copy(self):
         """
@@ -170,6 +173,37 @@ class Database:
                     funcs.append(partial(process_chunk, df_chunk, idx))
                 tqdm_chunks(funcs, len(df))
 
+    def chunks_to_sql(
+        self,
+        chunks: Iterable[pd.DataFrame],
+        name: str,
+        if_exists: IfExists,
+        dtype: Optional[dict] = None,
+        total: Optional[int] = None,
+    ):
+        """
+        Insert the Pandas dataframes in `chunks` as a new database table `name`, with the semantics of
+        `pandas_to_sql` for `if_exists` and `dtype`. Chunks are consumed lazily, one at a time:
+        the chunk N+1 can be prepared while chunk N is being written. There must be at least one chunk.
+
+        Progress bar with tqdm, `total` is the expected number of rows.
+        """
+
+        with self.session() as session:
+
+            def process_chunk(df_chunk, idx):
+                df_chunk.to_sql(
+                    name, session.bind, if_exists=if_exists if idx == 0 else "append", index=False, dtype=dtype
+                )
+                return len(df_chunk), None
+
+            funcs = (partial(process_chunk, df_chunk, idx) for idx, df_chunk in enumerate(chunks))
+            if options().get("tqdm.disable"):
+                for func in funcs:
+                    func()
+            else:
+                tqdm_chunks(funcs, total)
+
     def get_table_names(self) -> List[str]:
         """
         Return table names.
@@ -181,6 +215,15 @@ class Database:
         with self.session() as session:
             return inspect(session.bind).has_table(table_name)
 
+    def create_index(self, table_name: str, column_name: str):
+        """
+        Create an index on column `column_name` of table `table_name`.
+        """
+
+        with self.session() as session:
+            table = Table(table_name, MetaData(), autoload_with=session.bind)
+            Index(f"ix_{table_name}_{column_name}", table.c[column_name]).create(bind=session.bind)
+
     def drop_table(self, name: str) -> bool:
         """
         Drop table it it exists, returning True. Returns False otherwise.
@@ -200,15 +243,27 @@ class Database:
             session.commit()
             return 1
 
-    def query_table(self, name: str) -> pd.DataFrame:
+    def query_table(
+        self, name: str, columns: Optional[List[str]] = None, text_columns: Optional[List[str]] = None
+    ) -> pd.DataFrame:
         """
-        Read the complete table `name` from db
+        Read the complete table `name` from db, limited to `columns` if provided.
+        Columns in `text_columns` are cast to text, s.t. their values are not altered by the type
+        conversions of Pandas (e.g., nullable integers would be read as float64, losing precision).
         """
         with self.session() as session:
             meta = MetaData()
             meta.reflect(bind=session.bind)
             table = Table(name, meta)
-            return session.query(table)
+            if columns is None and not text_columns:
+                return session.query(table)
+            text_columns = text_columns or []
+            return session.query(
+                *[
+                    cast(table.c[col_name], String).label(col_name) if col_name in text_columns else table.c[col_name]
+                    for col_name in (columns if columns is not None else table.c.keys())
+                ]
+            )
 
     def get_table_columns(self, name: str) -> List[str]:
         """
@@ -262,6 +317,54 @@ class Database:
     def query_count(self, query) -> int:
         return query_count(query, self.session)
 
+    def insert_blobs(self, blobs: Dict[str, bytes]) -> int:
+        """
+        Insert content-addressed `blobs` (digest -> data), skipping the ones already present.
+        The blobs table is created if missing. It returns the number of inserted blobs.
+        """
+
+        if not blobs:
+            return 0
+
+        with self.session() as session:
+            Blob.__table__.create(session.bind, checkfirst=True)
+            chunk_size = options().get("database.query_write_chunk_size")
+
+            existing = set()
+            for digests in chunker(list(blobs.keys()), chunk_size):
+                existing |= set(session.scalars(select(Blob.id_blob).where(Blob.id_blob.in_(digests))))
+
+            missing = [digest for digest in blobs if digest not in existing]
+            session.add_all([Blob(id_blob=digest, data=blobs[digest]) for digest in missing])
+            session.commit()
+
+        log.debug(f"Inserted {len(missing)} blobs ({len(existing)} already present)")
+        return len(missing)
+
+    def delete_blobs(self, digests: List[str]) -> int:
+        """
+        Delete the content-addressed blobs identified by `digests`, returning the number of deleted blobs.
+        """
+
+        n_deleted = 0
+        with self.session() as session:
+            for chunk in chunker(digests, options().get("database.query_write_chunk_size")):
+                n_deleted += session.execute(delete(Blob).where(Blob.id_blob.in_(chunk))).rowcount
+            session.commit()
+        return n_deleted
+
+    def fetch_blobs(self, digests: List[str]) -> Dict[str, bytes]:
+        """
+        Return the content-addressed blobs (digest -> data) identified by `digests`.
+        """
+
+        blobs = {}
+        with self.session() as session:
+            for chunk in chunker(digests, options().get("database.query_read_chunk_size")):
+                for id_blob, data in session.execute(select(Blob.id_blob, Blob.data).where(Blob.id_blob.in_(chunk))):
+                    blobs[id_blob] = data
+        return blobs
+
 
 def sanitize_table_name(name: str) -> str:
     """
@@ -1,16 +1,40 @@
 from __future__ import annotations
 
+import contextvars
+import hashlib
+import logging
 import os
-from shutil import rmtree
-from typing import Optional
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Optional, Union
 from urllib.parse import urlparse
 
 from mltraq.opts import options
 from mltraq.storage import serialization
+from mltraq.storage.backends.backend import Backend, as_chunks, nbytes
+from mltraq.storage.backends.file import FileBackend
+from mltraq.storage.backends.s3 import S3Backend
 from mltraq.storage.database import next_uuid
 from mltraq.utils.bunch import Bunch
 from mltraq.utils.exceptions import InvalidInput, T, validate_type
 
+log = logging.getLogger(__name__)
+
+# DataStore backends, by URL scheme of option "datastore.url".
+BACKENDS = {"file": FileBackend, "s3": S3Backend}
+
+# Durability policies of DataStore writes, option "datastore.writer.fsync":
+# "none": rely on the OS to flush the files; "file": fdatasync each file after writing it;
+# "dir": fsync the directories of the written files once, after all files have been written.
+FSYNC_POLICIES = ("none", "file", "dir")
+
+# Active DataStoreWriter, if any. Being a context variable, concurrent persists in different threads
+# use distinct writers. Worker threads must inherit it explicitly, see `serialization.inherit_context`.
+active_writer: contextvars.ContextVar[DataStoreWriter | None] = contextvars.ContextVar("active_writer", default=None)
+
 
 class DataStore(Bunch):
     """
@@ -24,11 +48,13 @@ class DataStore(Bunch):
         return DataStoreIO.serialize_write(dict(self)).url
 
     @staticmethod
-    def from_url(url) -> DataStore:
+    def from_url(url, mmap: bool = False) -> DataStore:
         """
-        Loads an object from an url.
+        Loads an object from an url. If `mmap` is True, the file is memory-mapped: NumPy arrays and Arrow
+        tables stored as out-of-band buffers (see option `datastore.out_of_band_threshold_bytes`) are
+        returned as read-only views on the mapping, without reading them in memory upfront.
         """
-        obj = DataStoreIO(url).read_deserialize(expected_type=dict)
+        obj = DataStoreIO(url).read_deserialize(expected_type=dict, mmap=mmap)
         return DataStore(obj)
 
 
@@ -68,15 +94,28 @@ class DataStoreIO:
         Delete directory `relative_path_prefix`, used to drop directory
         associated to an experiment being deleted.
         """
-        pathdir = DataStoreIO.get_filepath(options().get("datastore.url")) + os.sep + relative_path_prefix
-        rmtree(pathdir, ignore_errors=True)
+        get_backend().delete_prefix(relative_path_prefix)
+        datastore_cache.evict_prefix(relative_path_prefix)
+        tier = get_cache_tier()
+        if tier is not None:
+            tier.delete_prefix(relative_path_prefix)
 
     @classmethod
     def serialize_write(cls, obj: any, relative_path_prefix: Optional[str] = None) -> DataStoreIO:
         """
-        Serialize object to file.
+        Serialize object to file. If option `datastore.out_of_band_threshold_bytes` is set and the
+        DataPak serializer is used, large NumPy arrays and Arrow tables are stored uncompressed
+        as aligned out-of-band buffers, s.t. they can be memory-mapped on read.
         """
-        data = serialization.serialize(obj)
+
+        threshold_bytes = options().get("datastore.out_of_band_threshold_bytes")
+        if threshold_bytes is not None and options().get("serialization.serializer") == "DataPakSerializer":
+            # Importing here to avoid circular import error.
+            from mltraq.storage.serializers.datapak import DataPakSerializer
+
+            data = DataPakSerializer.serialize_out_of_band(obj, threshold_bytes)
+        else:
+            data = serialization.serialize(obj)
         return cls.write(data, relative_path_prefix=relative_path_prefix)
 
     @classmethod
@@ -86,43 +125,99 @@ class DataStoreIO:
         return pathname
 
     @classmethod
-    def get_next_pathname_url(cls, relative_path_prefix: Optional[str] = None):
+    def get_next_key_url(cls, relative_path_prefix: str | None = None):
         """
-        Generate the next pathname and url to store a new resource.
+        Generate the next key and url to store a new resource. With the "sharded" layout
+        (option "datastore.layout"), resources are fanned out in two levels of subdirectories,
+        named after the hash of the resource name (e.g., ".../ab/cd/<uuid>"), to avoid huge flat directories.
+        URLs are relative to the datastore, and remain valid regardless of the layout and the backend.
         """
 
         relative_path_prefix = options().get("datastore.relative_path_prefix", prefer=relative_path_prefix)
-        pathdir = DataStoreIO.get_filepath(options().get("datastore.url")) + os.sep + relative_path_prefix
-        os.makedirs(pathdir, exist_ok=True)
+        layout = options().get("datastore.layout")
         basename = next_uuid().hex
-        pathname = pathdir + os.sep + basename
-        url = "file:///" + relative_path_prefix + os.sep + basename
+        if layout == "sharded":
+            digest = hashlib.md5(basename.encode(), usedforsecurity=False).hexdigest()
+            relative_path_prefix = relative_path_prefix + os.sep + digest[:2] + os.sep + digest[2:4]
+        elif layout != "flat":
+            raise InvalidInput(f"Invalid datastore layout '{layout}', expected 'flat' or 'sharded'")
+        key = relative_path_prefix + os.sep + basename
+        return key, "file:///" + key
+
+    @classmethod
+    def get_next_pathname_url(cls, relative_path_prefix: str | None = None):
+        """
+        Generate the next pathname and url to store a new resource on the filesystem.
+        """
+
+        _, url = cls.get_next_key_url(relative_path_prefix)
+        pathname = cls.get_pathname_from_url(url)
+        os.makedirs(os.path.dirname(pathname), exist_ok=True)
         return pathname, url
 
     @classmethod
-    def write(cls, data: bytes, relative_path_prefix: Optional[str] = None) -> DataStoreIO:
+    def write(cls, data: Union[bytes, list[Any]], relative_path_prefix: str | None = None) -> DataStoreIO:
         """
         Create a new linked object "/.../optional relative path prefix/..., write to it,
-        and return a DataStore instance.
+        and return a DataStore instance. `data` can be a list of bytes-like chunks, written in sequence.
+        If a DataStoreWriter is active, the write is scheduled on its thread pool and not awaited.
         """
 
-        pathname, url = cls.get_next_pathname_url(relative_path_prefix)
-        with open(pathname, "wb") as f:
-            f.write(data)
+        key, url = cls.get_next_key_url(relative_path_prefix)
+        backend = get_backend()
+        writer = active_writer.get()
+        if writer is not None:
+            writer.submit(backend, key, data)
+        else:
+            fsync = DataStoreWriter.get_fsync()
+            backend.write(key, data, fsync=fsync == "file")
+            if fsync == "dir":
+                backend.sync([key])
         return DataStoreIO(url)
 
-    def read(self) -> bytes:
+    def read(self, mmap: bool = False, offset: int = 0, size: int | None = None) -> Union[bytes, memoryview]:
         """
-        Return the contents of the linked object.
+        Return `size` bytes of the contents of the linked object starting from `offset`, or all remaining bytes
+        if `size` is None. If `mmap` is True and supported by the backend, the object is memory-mapped read-only
+        and a memoryview on the mapping is returned. The mapping is released once no longer referenced.
+        If option "datastore.cache.url" is set, objects of remote backends are read through an on-disk cache.
         """
 
-        pathname = self.get_pathname_from_url(self.url)
-        with open(pathname, "rb") as f:
-            return f.read()
+        key = self.get_filepath(self.url)
+        tier = get_cache_tier()
+        if tier is None:
+            return get_backend().read(key, offset=offset, size=size, mmap=mmap)
+
+        if not os.path.exists(tier.get_pathname(key)):
+            # Write to a temporary file first, s.t. concurrent readers never see partial files.
+            tmp_key = f"{key}.{uuid.uuid4().hex}.tmp"
+            tier.write(tmp_key, get_backend().read(key))
+            os.replace(tier.get_pathname(tmp_key), tier.get_pathname(key))
+        return tier.read(key, offset=offset, size=size, mmap=mmap)
+
+    def read_deserialize(self, expected_type: T | None = None, mmap: bool = False) -> any:
+        """
+        Read and deserialize the linked object. If `mmap` is True, the file is memory-mapped and
+        out-of-band buffers are decoded as read-only views, without copies.
+        """
 
-    def read_deserialize(self, expected_type: Optional[T] = None) -> any:
-        data = DataStoreIO(self.url).read()
-        obj = serialization.deserialize(data)
+        # Importing here to avoid circular import error.
+        from mltraq.storage.serializers.datapak import MAGIC_OUT_OF_BAND, DataPakSerializer
+
+        # Decoded objects are cached if option "datastore.cache.max_bytes" is positive, see DataStoreCache.
+        cache_key = (options().get("datastore.url"), self.url)
+        obj = datastore_cache.get(cache_key)
+        if obj is not None:
+            if expected_type:
+                validate_type(obj, expected_type)
+            return obj
+
+        data = DataStoreIO(self.url).read(mmap=mmap)
+        if data[: len(MAGIC_OUT_OF_BAND)] == MAGIC_OUT_OF_BAND:
+            obj = DataPakSerializer.deserialize_out_of_band(data, copy=not mmap)
+        else:
+            obj = serialization.deserialize(bytes(data))
+        datastore_cache.put(cache_key, obj, len(data))
 
         if expected_type:
             validate_type(obj, expected_type)
@@ -142,3 +237,228 @@ class DataStoreIO:
         # Set state
         for k, v in state.items():
             self.__setattr__(k, v)
+
+
+class DataStoreWriter:
+    """
+    Write-behind writer of DataStore files. While active (used as context manager), the files written with
+    `DataStoreIO.write` are queued and written by a thread pool of `n_jobs` threads, and their URLs are returned
+    without waiting for the writes to complete. The queue is bounded: if more than `max_pending_bytes` bytes
+    are waiting to be written, `DataStoreIO.write` blocks until enough writes complete.
+
+    On exit, pending writes are finalized: they are awaited, errors are propagated, and the durability policy
+    `fsync` is applied (see FSYNC_POLICIES). If `wait` is False, the finalization happens in the background
+    and `future` is resolved with the writer statistics once done. Writers can be nested.
+    """
+
+    def __init__(
+        self,
+        n_jobs: int | None = None,
+        fsync: str | None = None,
+        max_pending_bytes: int | None = None,
+        wait: bool = True,
+    ):
+        """
+        Create a new writer, with `n_jobs` threads, durability policy `fsync`
+        and queue bounded to `max_pending_bytes` bytes.
+        """
+        self.n_jobs = options().get("datastore.writer.n_jobs", prefer=n_jobs)
+        self.fsync = self.get_fsync(fsync)
+        self.max_pending_bytes = options().get("datastore.writer.max_pending_bytes", prefer=max_pending_bytes)
+        self.wait = wait
+        self.executor = None
+        self.futures: list[Future] = []
+        self.written = {}
+        self.pending_bytes = 0
+        self.condition = threading.Condition()
+        self.stats = Bunch(n_files=0, n_bytes=0, duration=0.0, bytes_per_second=0.0)
+        self.future = Future()
+        self.time_start = None
+        self.token = None
+
+    @classmethod
+    def get_fsync(cls, fsync: str | None = None) -> str:
+        """
+        Return the durability policy, validating it.
+        """
+        fsync = options().get("datastore.writer.fsync", prefer=fsync)
+        if fsync not in FSYNC_POLICIES:
+            raise InvalidInput(f"Invalid fsync policy '{fsync}', expected one of {FSYNC_POLICIES}")
+        return fsync
+
+    def __enter__(self) -> DataStoreWriter:
+        self.executor = ThreadPoolExecutor(max_workers=self.n_jobs)
+        self.time_start = time.perf_counter()
+        self.token = active_writer.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        active_writer.reset(self.token)
+        if exc_type is not None or self.wait:
+            # If we are already handling an exception, errors encountered while writing are not raised.
+            self.finalize(raise_errors=exc_type is None)
+        else:
+            threading.Thread(target=self.finalize, name=self.__class__.__name__, daemon=False).start()
+
+    def finalize(self, raise_errors: bool = True):
+        """
+        Wait for pending writes, apply the durability policy and resolve `future`.
+        The first error encountered while writing is raised if `raise_errors` is True.
+        """
+
+        try:
+            try:
+                wait(self.futures)
+                n_bytes = [future.result() for future in self.futures] if raise_errors else []
+                if self.fsync == "dir":
+                    for backend, keys in self.written.values():
+                        backend.sync(keys)
+            finally:
+                self.executor.shutdown(wait=True)
+        except BaseException as e:
+            self.future.set_exception(e)
+            if self.wait:
+                raise
+            return
+
+        self.stats.n_files = len(n_bytes)
+        self.stats.n_bytes = sum(n_bytes)
+        self.stats.duration = time.perf_counter() - self.time_start
+        self.stats.bytes_per_second = self.stats.n_bytes / self.stats.duration if self.stats.duration > 0 else 0.0
+        if self.stats.n_files > 0:
+            log.debug(
+                f"{self.__class__.__name__}: Wrote {self.stats.n_files} files, {self.stats.n_bytes} bytes "
+                f"in {self.stats.duration:.3f}s ({self.stats.bytes_per_second / 2**20:.1f} MiB/s)"
+            )
+        self.future.set_result(self.stats)
+
+    def submit(self, backend: Backend, key: str, data: Union[bytes, list[Any]]):
+        """
+        Schedule the write of `data` to object `key` of `backend`, blocking while the queue is full.
+        A write larger than `max_pending_bytes` is accepted once the queue is empty.
+        """
+
+        size = nbytes(as_chunks(data))
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.pending_bytes == 0 or self.pending_bytes + size <= self.max_pending_bytes
+            )
+            self.pending_bytes += size
+
+        self.written.setdefault(backend.url, (backend, []))[1].append(key)
+        future = self.executor.submit(backend.write, key, data, self.fsync == "file")
+        future.add_done_callback(lambda _: self.release(size))
+        self.futures.append(future)
+
+    def release(self, size: int):
+        """
+        Remove `size` bytes from the queue, once written.
+        """
+        with self.condition:
+            self.pending_bytes -= size
+            self.condition.notify_all()
+
+
+class DataStoreCache:
+    """
+    Process-wide LRU cache of decoded DataStore objects, keyed by datastore URL and object URL.
+    The size of an entry is the size of its serialized representation. If the total size exceeds
+    option "datastore.cache.max_bytes", least recently used entries are evicted. Disabled if zero.
+    Cached objects are shared by all readers, and must not be modified in place.
+    """
+
+    def __init__(self):
+        """
+        Create a new, empty cache.
+        """
+        self.entries = OrderedDict()
+        self.size_bytes = 0
+        self.lock = threading.Lock()
+        self.stats = Bunch(hits=0, misses=0, evictions=0)
+
+    def get(self, key: tuple[str, str]) -> Any:
+        """
+        Return the object cached with `key`, marking it as recently used, or None if missing.
+        """
+
+        if options().get("datastore.cache.max_bytes") <= 0:
+            return None
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats.hits += 1
+            return entry[0]
+
+    def put(self, key: tuple[str, str], obj: Any, size: int):
+        """
+        Cache object `obj` of size `size` with `key`, evicting least recently used entries if necessary.
+        Objects larger than the cache are not cached.
+        """
+
+        max_bytes = options().get("datastore.cache.max_bytes")
+        if size > max_bytes:
+            return
+
+        with self.lock:
+            if key in self.entries:
+                self.size_bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (obj, size)
+            self.size_bytes += size
+            while self.size_bytes > max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.size_bytes -= evicted_size
+                self.stats.evictions += 1
+
+    def evict_prefix(self, relative_path_prefix: str):
+        """
+        Evict the objects stored in directory `relative_path_prefix`, used if the directory is deleted.
+        """
+
+        url_prefix = "file:///" + relative_path_prefix + os.sep
+        with self.lock:
+            for key in [key for key in self.entries if key[1].startswith(url_prefix)]:
+                self.size_bytes -= self.entries.pop(key)[1]
+
+    def clear(self):
+        """
+        Evict all entries and reset statistics.
+        """
+
+        with self.lock:
+            self.entries.clear()
+            self.size_bytes = 0
+            self.stats = Bunch(hits=0, misses=0, evictions=0)
+
+
+# Process-wide cache of decoded DataStore objects.
+datastore_cache = DataStoreCache()
+
+
+def get_cache_tier() -> FileBackend | None:
+    """
+    Return the on-disk cache of the objects of the current remote backend, if option "datastore.cache.url"
+    is set. Objects of different backends are stored in different subdirectories. Filesystem backends are
+    not cached on disk.
+    """
+
+    url = options().get("datastore.url")
+    cache_url = options().get("datastore.cache.url")
+    if cache_url is None or urlparse(url).scheme == "file":
+        return None
+    return FileBackend(cache_url + "/" + hashlib.md5(url.encode(), usedforsecurity=False).hexdigest())
+
+
+def get_backend(url: str | None = None) -> Backend:
+    """
+    Return the DataStore backend for `url`, defaulting to option "datastore.url".
+    """
+
+    url = options().get("datastore.url", prefer=url)
+    scheme = urlparse(url).scheme
+    if scheme not in BACKENDS:
+        raise InvalidInput(f"Unsupported URL scheme: {scheme}")
+    return BACKENDS[scheme](url)
@@ -0,0 +1,380 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from shutil import rmtree
+from typing import Iterator
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+from sqlalchemy import MetaData, Table, select
+
+from mltraq.opts import options
+from mltraq.storage import models
+from mltraq.storage.archivestore import INDEX_SUFFIX, MANIFEST_MAGIC
+from mltraq.storage.database import Database
+from mltraq.storage.datastore import DataStoreIO
+from mltraq.storage.parquetstore import ParquetStore
+from mltraq.storage.serialization import BLOB_REF_PREFIX
+from mltraq.storage.serializers.serializer import Serializer
+from mltraq.utils.bunch import Bunch
+from mltraq.utils.exceptions import InvalidInput
+
+log = logging.getLogger(__name__)
+
+# Names of stored objects are hexadecimal UUIDs, see `DataStoreIO.get_next_key_url`.
+# References to them are found by searching for their names in the stored values.
+OBJECT_NAME_PATTERN = re.compile(rb"[0-9a-f]{32}")
+
+# Names of blobs in the pool of content-addressed archives, see `mltraq.storage.archivestore.put_blob`.
+BLOB_NAME_PATTERN = re.compile(rb"[0-9a-f]{64}")
+
+
+def collect_garbage(
+    db: Database,
+    dry_run: bool = False,
+    n_jobs: int | None = None,
+    min_age_seconds: float | None = None,
+) -> Bunch:
+    """
+    Delete orphaned and unreferenced objects of the DataStore, ArchiveStore and ParquetStore.
+
+    - Orphaned directories: directories named as experiment IDs that are not in the "experiments" table of `db`.
+    - Unreferenced objects: DataStore objects of existing experiments that are not referenced by any value
+    stored in `db`, in the Parquet runs datasets, or in the DataStore objects referenced by them.
+    - Unreferenced pool blobs: blobs in the pool of content-addressed archives ("archivestore.dedup.url")
+    not listed by the manifests of the archives in the DataStore, excluding the archives being deleted.
+    The pool must be used only by archives in the DataStore. Blobs are touched when reused by new archives.
+    - Unreferenced blobs: content-addressed blobs in the blobs table of `db` that are not referenced by any
+    value stored in `db` or in the Parquet runs datasets. Blobs have no modification time: collect them
+    while no experiment is being persisted, as its blobs are inserted before the runs referencing them.
+
+    Directories and objects modified less than `min_age_seconds` ago are ignored, to leave alone experiments
+    being persisted. Directories not named as experiment IDs are ignored, as their objects are not managed
+    by experiments. Deletions run in parallel with `n_jobs` threads. If `dry_run` is True, nothing is deleted.
+    Options "gc.n_jobs" and "gc.min_age_seconds" are the defaults of `n_jobs` and `min_age_seconds`.
+
+    The stores must be used only by the experiments of `db`: experiments persisted with other databases
+    in the same stores are considered orphaned, and deleted. To protect from this, in-memory databases
+    and databases without the "experiments" table are refused, raising `InvalidInput`.
+
+    Return the list of (to be) deleted paths, and statistics about the deleted directories, files, bytes and blobs.
+    """
+
+    check_database(db)
+
+    n_jobs = options().get("gc.n_jobs", prefer=n_jobs)
+    min_age_seconds = options().get("gc.min_age_seconds", prefer=min_age_seconds)
+    time_start = time.perf_counter()
+    mtime_max = time.time() - min_age_seconds
+
+    datastore_dir = get_store_dir("datastore.url")
+    with db.session() as session:
+        id_experiments = {id_experiment for (id_experiment,) in session.query(models.Experiment.id_experiment)}
+
+    # Orphaned directories, in all stores.
+    dirs = []
+    for option_name in ["datastore.url", "archivestore.url", "parquetstore.url"]:
+        for entry, id_experiment in scan_experiment_dirs(get_store_dir(option_name)):
+            if id_experiment not in id_experiments and entry.stat().st_mtime < mtime_max:
+                dirs.append(entry.path)
+
+    # Unreferenced objects of existing experiments.
+    objects = {
+        os.path.basename(pathname).encode(): pathname
+        for entry, id_experiment in scan_experiment_dirs(datastore_dir)
+        if id_experiment in id_experiments
+        for pathname in scan_objects(entry.path)
+    }
+    parquet_names, parquet_digests = find_parquet_references(id_experiments)
+    names, blobs = find_database_references(db, parquet_digests)
+    referenced = find_referenced_objects(names | parquet_names, objects)
+    files = [
+        pathname
+        for name, pathname in objects.items()
+        if name not in referenced and os.stat(pathname).st_mtime < mtime_max
+    ]
+    # Member indexes stored alongside unreferenced ArchiveStore objects.
+    files += [pathname + INDEX_SUFFIX for pathname in files if os.path.isfile(pathname + INDEX_SUFFIX)]
+
+    # Unreferenced blobs.
+    if not dry_run and blobs:
+        db.delete_blobs(blobs)
+
+    # Unreferenced blobs of the ArchiveStore pool, not listed by the manifests of retained archives.
+    files += find_unreferenced_pool_blobs(datastore_dir, set(dirs), set(files), mtime_max)
+
+    # Deletion of files and directories, in parallel.
+    paths = dirs + files
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        counts = list(executor.map(lambda path: delete_path(path, dry_run), paths))
+
+    stats = Bunch(
+        dry_run=dry_run,
+        n_dirs=len(dirs),
+        n_files=sum(n_files for n_files, _ in counts),
+        n_bytes=sum(n_bytes for _, n_bytes in counts),
+        n_blobs=len(blobs),
+        duration=time.perf_counter() - time_start,
+    )
+    stats.files_per_second = stats.n_files / stats.duration if stats.duration > 0 else 0.0
+    stats.bytes_per_second = stats.n_bytes / stats.duration if stats.duration > 0 else 0.0
+
+    log.info(
+        f"{'Found' if dry_run else 'Deleted'} {stats.n_dirs} orphaned directories and {len(files)} unreferenced "
+        f"objects, {stats.n_blobs} unreferenced blobs: {stats.n_files} files, {stats.n_bytes} bytes "
+        f"in {stats.duration:.3f}s "
+        f"({stats.files_per_second:.1f} files/s, {stats.bytes_per_second / 2**20:.1f} MiB/s)"
+    )
+
+    return Bunch(paths=paths, stats=stats)
+
+
+def check_database(db: Database):
+    """
+    Raise `InvalidInput` if `db` is an in-memory database, or if it has no experiments table, as all
+    experiment directories in the stores would be considered orphaned.
+    """
+
+    url = db.url
+    if url.get_backend_name() == "sqlite" and (
+        url.database in [None, "", ":memory:"]
+        or url.database.startswith("file::memory:")
+        or url.query.get("mode") == "memory"
+    ):
+        raise InvalidInput("Garbage collection refused on an in-memory database, use the database of the stores")
+
+    tablename = models.Experiment.__tablename__
+    if not db.has_table(tablename):
+        raise InvalidInput(f"Garbage collection refused on a database without table '{tablename}'")
+
+
+def get_store_dir(option_name: str) -> str:
+    """
+    Return the directory of the store with URL in option `option_name`, which must be on the filesystem.
+    """
+
+    url = options().get(option_name)
+    if not url.startswith("file:///"):
+        raise InvalidInput(f"Garbage collection supported only for filesystem stores, but {option_name}={url}")
+    return DataStoreIO.get_filepath(url)
+
+
+def scan_experiment_dirs(pathdir: str) -> Iterator[tuple[os.DirEntry, uuid.UUID]]:
+    """
+    Yield the subdirectories of `pathdir` named as experiment IDs, with their ID.
+    """
+
+    if not os.path.isdir(pathdir):
+        return
+    with os.scandir(pathdir) as entries:
+        for entry in entries:
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+            try:
+                yield entry, uuid.UUID(entry.name)
+            except ValueError:
+                continue
+
+
+def scan_objects(pathdir: str) -> Iterator[str]:
+    """
+    Yield the pathnames of objects in directory `pathdir` and its subdirectories (sharded layout).
+    """
+
+    with os.scandir(pathdir) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from scan_objects(entry.path)
+            elif OBJECT_NAME_PATTERN.fullmatch(entry.name.encode()):
+                yield entry.path
+
+
+def find_names(value: object) -> set[bytes]:
+    """
+    Return the object names found in `value`, decompressing it if necessary.
+    """
+
+    if isinstance(value, str):
+        value = value.encode()
+    if not isinstance(value, bytes):
+        return set()
+    return set(OBJECT_NAME_PATTERN.findall(Serializer.decompress(value)))
+
+
+def find_unreferenced_pool_blobs(
+    datastore_dir: str, deleted_dirs: set[str], deleted_files: set[str], mtime_max: float
+) -> list[str]:
+    """
+    Return the pathnames of the blobs in the pool of content-addressed archives modified before `mtime_max`,
+    and not listed by the manifests of the archives in `datastore_dir`, excluding the archives in `deleted_files`
+    and in the experiment directories `deleted_dirs`. Return an empty list if the pool does not exist.
+    """
+
+    pool_dir = get_store_dir("archivestore.dedup.url")
+    if not os.path.isdir(pool_dir):
+        return []
+
+    # Digests of blobs listed by the manifests of retained archives, in the same pool.
+    digests = set()
+    if os.path.isdir(datastore_dir):
+        for pathname in scan_objects(datastore_dir):
+            experiment_dir = os.path.join(datastore_dir, os.path.relpath(pathname, datastore_dir).split(os.sep)[0])
+            if pathname in deleted_files or experiment_dir in deleted_dirs:
+                continue
+            manifest = read_manifest(pathname)
+            if manifest is not None and DataStoreIO.get_filepath(manifest["url"]) == pool_dir:
+                digests |= {digest for member in manifest["members"].values() for digest in member["digests"]}
+
+    return [
+        pathname
+        for pathname in scan_pool_blobs(pool_dir)
+        if os.path.basename(pathname) not in digests and os.stat(pathname).st_mtime < mtime_max
+    ]
+
+
+def read_manifest(pathname: str) -> dict | None:
+    """
+    Return the manifest of the content-addressed archive `pathname`, or None if it is not a manifest.
+    """
+
+    with open(pathname, "rb") as f:
+        if f.read(len(MANIFEST_MAGIC)) != MANIFEST_MAGIC:
+            return None
+        return json.loads(f.read())
+
+
+def scan_pool_blobs(pool_dir: str) -> Iterator[str]:
+    """
+    Yield the pathnames of the blobs in the pool of content-addressed archives `pool_dir`.
+    """
+
+    with os.scandir(pool_dir) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from scan_pool_blobs(entry.path)
+            elif BLOB_NAME_PATTERN.fullmatch(entry.name.encode()):
+                yield entry.path
+
+
+def find_blob_digest(value: object) -> str | None:
+    """
+    Return the digest of the content-addressed blob referenced by `value`, or None if not a reference.
+    """
+
+    if isinstance(value, bytes) and value.startswith(BLOB_REF_PREFIX):
+        return value[len(BLOB_REF_PREFIX) :].decode("ascii")
+    return None
+
+
+def find_referenced_objects(names: set[bytes], objects: dict) -> set[bytes]:
+    """
+    Return the names of `objects` (name -> pathname) in `names`, or referenced by them, recursively.
+    """
+
+    # Objects referenced by referenced objects, e.g., DataStore objects nested in DataStore objects.
+    referenced = set()
+    pending = names & objects.keys()
+    while pending:
+        name = pending.pop()
+        referenced.add(name)
+        with open(objects[name], "rb") as f:
+            pending |= (find_names(f.read()) & objects.keys()) - referenced
+    return referenced
+
+
+def find_database_references(db: Database, digests: set[str]) -> tuple[set[bytes], list[str]]:
+    """
+    Return the object names found in the values of all tables of `db`, read in chunks, and the digests
+    of the content-addressed blobs not referenced by these values nor in `digests`. Object names
+    in the unreferenced blobs are ignored.
+    """
+
+    names = set()
+    referenced = set(digests)
+    unreferenced = []
+    blobs_table_name = models.Blob.__tablename__
+    chunk_size = options().get("database.query_read_chunk_size")
+
+    with db.session() as session:
+        meta = MetaData()
+        meta.reflect(bind=session.bind)
+        table_names = db.get_table_names()
+        for table_name in table_names:
+            if table_name == blobs_table_name:
+                continue
+            for row in session.execute(select(Table(table_name, meta))).yield_per(chunk_size):
+                for value in row:
+                    digest = find_blob_digest(value)
+                    if digest is not None:
+                        referenced.add(digest)
+                    else:
+                        names |= find_names(value)
+
+        # Blobs are scanned last, once their references are known.
+        if blobs_table_name in table_names:
+            blobs = Table(blobs_table_name, meta)
+            for id_blob, data in session.execute(select(blobs.c.id_blob, blobs.c.data)).yield_per(chunk_size):
+                if id_blob in referenced:
+                    names |= find_names(data)
+                else:
+                    unreferenced.append(id_blob)
+
+    return names, unreferenced
+
+
+def find_parquet_references(id_experiments: set[uuid.UUID]) -> tuple[set[bytes], set[str]]:
+    """
+    Return the object names and the digests of the content-addressed blobs found in the binary and
+    string columns of the Parquet runs datasets of experiments `id_experiments`, read in batches.
+    """
+
+    names = set()
+    digests = set()
+    for id_experiment in id_experiments:
+        pathdir = ParquetStore.get_pathdir(str(id_experiment))
+        if not os.path.isdir(pathdir):
+            continue
+        for batch in ds.dataset(pathdir, format="parquet").to_batches():
+            for column in batch.columns:
+                if pa.types.is_binary(column.type) or pa.types.is_string(column.type):
+                    for value in column.to_pylist():
+                        digest = find_blob_digest(value)
+                        if digest is not None:
+                            digests.add(digest)
+                        else:
+                            names |= find_names(value)
+    return names, digests
+
+
+def delete_path(path: str, dry_run: bool = False) -> tuple[int, int]:
+    """
+    Delete file or directory `path`, unless `dry_run` is True. Return the number of files and bytes (to be) deleted.
+    """
+
+    pathnames: list[str] = [path]
+    if os.path.isdir(path):
+        pathnames = [os.path.join(dirpath, name) for dirpath, _, names in os.walk(path) for name in names]
+
+    n_bytes = 0
+    for pathname in pathnames:
+        try:
+            n_bytes += os.path.getsize(pathname)
+        except FileNotFoundError:
+            pass
+
+    if not dry_run:
+        if os.path.isdir(path):
+            rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    return len(pathnames), n_bytes
@@ -32,3 +32,15 @@ class Experiment(Base):
     meta = Column(LargeBinary, nullable=True, default=None)
     fields = Column(LargeBinary, nullable=False, default=None)
     unsafe_pickle = Column(LargeBinary, nullable=True, default=None)
+
+
+class Blob(Base):
+    """
+    Model representing a content-addressed serialized value, shared across runs and experiments:
+    - id_blob: hex digest of `data`
+    - data: serialized value
+    """
+
+    __tablename__ = options().get("database.blobs_tablename")
+    id_blob = Column(String, primary_key=True, default=None)
+    data = Column(LargeBinary, nullable=False, default=None)
@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import os
+import uuid
+from shutil import rmtree
+from typing import Iterable
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from mltraq.opts import options
+from mltraq.storage.datastore import DataStoreIO
+from mltraq.utils.enums import IfExists, enforce_enum
+from mltraq.utils.exceptions import ExceptionWithMessage
+
+# Arrow types of native columns, given the name of their inferred Python type.
+# Columns of other native types use the Arrow type inferred from their values.
+ARROW_TYPES = {
+    "bool": pa.bool_(),
+    "int": pa.int64(),
+    "float": pa.float64(),
+    "str": pa.string(),
+    "bytes": pa.binary(),
+    "UUID": pa.string(),
+}
+
+
+class DatasetAlreadyExists(ExceptionWithMessage):
+    """
+    Raised if we try to overwrite an existing Parquet dataset, with if_exists="fail".
+    """
+
+    pass
+
+
+class ParquetStore:
+    """
+    Storage of the runs of experiments as Parquet datasets, one directory for each experiment.
+    Native columns are stored as Arrow columns, serialized columns as binary columns.
+    Currently, supporting only filesystem storage.
+    """
+
+    @classmethod
+    def get_pathdir(cls, relative_path: str) -> str:
+        """
+        Return the directory of the dataset `relative_path`, used to store the runs of an experiment.
+        """
+        return DataStoreIO.get_filepath(options().get("parquetstore.url")) + os.sep + relative_path
+
+    @classmethod
+    def schema(cls, meta: dict, dfs: list[pd.DataFrame], final: bool = True) -> pa.Schema | None:
+        """
+        Return the Arrow schema of runs with metadata `meta`, considering the chunks of runs `dfs`.
+        Columns of types not in ARROW_TYPES use the type inferred from the first chunk with non-missing
+        values. If all values of such a column are missing, the schema cannot be determined yet and
+        None is returned, unless `final` is True: in this case, the column is stored as strings.
+        """
+
+        schemas = [pa.Schema.from_pandas(df, preserve_index=False) for df in dfs]
+        fields = {"id_experiment": pa.string(), "id_run": pa.string()}
+        fields |= {col_name: pa.binary() for col_name in meta.runs.columns.serialized}
+        for col_name in meta.runs.columns.non_serialized:
+            type_name = meta.runs.columns.types[col_name]
+            if type_name in ARROW_TYPES:
+                fields[col_name] = ARROW_TYPES[type_name]
+                continue
+            types = [schema.field(col_name).type for schema in schemas]
+            fields[col_name] = next((t for t in types if not pa.types.is_null(t)), None)
+            if fields[col_name] is None:
+                if not final:
+                    return None
+                # Missing values in all chunks, we cannot infer the type.
+                fields[col_name] = pa.string()
+        return pa.schema([pa.field(name, fields[name]) for name in schemas[0].names])
+
+    @classmethod
+    def uuid_columns(cls, meta: dict) -> list[str]:
+        """
+        Return the names of the columns with UUID values, stored as strings.
+        """
+        return ["id_experiment", "id_run"] + [
+            col_name for col_name in meta.runs.columns.non_serialized if meta.runs.columns.types[col_name] == "UUID"
+        ]
+
+    @classmethod
+    def write(
+        cls,
+        relative_path: str,
+        chunks: Iterable[pd.DataFrame],
+        meta: dict,
+        if_exists: IfExists = IfExists["fail"],
+    ) -> int:
+        """
+        Write the chunks of runs `chunks`, with metadata `meta`, as a new Parquet dataset `relative_path`,
+        with a row group for each chunk. There must be at least one chunk. Return the number of written rows.
+
+        If the dataset exists, it is replaced if `if_exists` is "replace" or "delete", otherwise
+        `DatasetAlreadyExists` is raised. Chunks are buffered until the schema is determined,
+        see `ParquetStore.schema`.
+        """
+
+        if_exists = enforce_enum(if_exists, IfExists)
+        pathdir = cls.get_pathdir(relative_path)
+        if os.path.isdir(pathdir) and os.listdir(pathdir):
+            if if_exists == IfExists["fail"]:
+                raise DatasetAlreadyExists(f"Parquet dataset '{relative_path}' already existing")
+            cls.delete(relative_path)
+        os.makedirs(pathdir, exist_ok=True)
+
+        writer = None
+        pending = []
+        n_rows = 0
+        try:
+            for df_chunk in chunks:
+                for col_name in cls.uuid_columns(meta):
+                    df_chunk[col_name] = df_chunk[col_name].map(lambda value: None if value is None else str(value))
+                pending.append(df_chunk)
+                if writer is None:
+                    schema = cls.schema(meta, pending, final=False)
+                    if schema is None:
+                        continue
+                    writer = cls.open_writer(pathdir, schema)
+                n_rows += cls.write_chunks(writer, pending)
+                pending = []
+
+            if pending:
+                if writer is None:
+                    writer = cls.open_writer(pathdir, cls.schema(meta, pending))
+                n_rows += cls.write_chunks(writer, pending)
+        finally:
+            if writer is not None:
+                writer.close()
+
+        return n_rows
+
+    @classmethod
+    def open_writer(cls, pathdir: str, schema: pa.Schema) -> pq.ParquetWriter:
+        """
+        Return a Parquet writer of the dataset in directory `pathdir`, with Arrow schema `schema`.
+        """
+        return pq.ParquetWriter(
+            pathdir + os.sep + "part-0.parquet", schema, compression=options().get("parquetstore.compression")
+        )
+
+    @classmethod
+    def write_chunks(cls, writer: pq.ParquetWriter, dfs: list[pd.DataFrame]) -> int:
+        """
+        Write the chunks of runs `dfs` with `writer`, a row group for each chunk. Return the number of written rows.
+        """
+        for df in dfs:
+            writer.write_table(pa.Table.from_pandas(df, schema=writer.schema, preserve_index=False))
+        return sum(len(df) for df in dfs)
+
+    @classmethod
+    def read(
+        cls,
+        relative_path: str,
+        meta: dict,
+        columns: list[str] | None = None,
+        filter: ds.Expression | None = None,  # noqa: A002
+    ) -> pd.DataFrame:
+        """
+        Read the runs with metadata `meta` from Parquet dataset `relative_path`. Only `columns` are read, if
+        provided, and only rows matching the `filter` expression (e.g., `pyarrow.dataset.field("score") > 0.5`).
+        Both are pushed down to the Parquet reader, skipping columns and row groups.
+        """
+
+        dataset = ds.dataset(cls.get_pathdir(relative_path), format="parquet")
+        # Integer columns with missing values are read as Python ints, rather than as float64.
+        df = dataset.to_table(columns=columns, filter=filter).to_pandas(integer_object_nulls=True)
+        for col_name in cls.uuid_columns(meta):
+            if col_name in df.columns:
+                df[col_name] = df[col_name].map(lambda value: None if value is None else uuid.UUID(value))
+        return df
+
+    @classmethod
+    def delete(cls, relative_path: str):
+        """
+        Delete dataset `relative_path`, used to drop the runs of an experiment being deleted.
+        """
+        rmtree(cls.get_pathdir(relative_path), ignore_errors=True)
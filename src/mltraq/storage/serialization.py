@@ -1,11 +1,20 @@
+import contextvars
+import copy
 import datetime
+import hashlib
+import os
+import sys
 import uuid
-from typing import Any, List, Tuple
+from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 from numpy import float32, float64, int32, int64
 
 from mltraq.opts import options
+from mltraq.run import Run
 from mltraq.runs import Runs
 from mltraq.storage import models
 from mltraq.storage.serializers.datapak import DataPakSerializer
@@ -13,6 +22,7 @@ from mltraq.storage.serializers.pickle import PickleSerializer
 from mltraq.storage.serializers.serializer import Serializer
 from mltraq.utils.bunch import Bunch
 from mltraq.utils.frames import reorder_columns
+from mltraq.utils.sequence import Sequence
 
 # Dictionary of available serializers
 SERIALIZERS = {"DataPakSerializer": DataPakSerializer, "PickleSerializer": PickleSerializer}
@@ -35,14 +45,38 @@ NATIVE_DATABASE_TYPES = [
     bytes,
 ]
 
+# Families of native types that are promoted to a single type, in order of preference.
+PROMOTED_NATIVE_TYPES = {
+    bool: {bool},
+    int: {int, int32, int64},
+    float: {int, int32, int64, float, float32, float64},
+}
 
-def serialize(obj: object) -> bytes:
+# Kinds of NumPy scalars that the "numpy-scalar" encoding casts to native database types (booleans,
+# 64-bit signed integers and double-precision floats), with the largest item size that fits them.
+NUMPY_SCALAR_NATIVE_KINDS = {"b": 1, "i": 8, "u": 4, "f": 8}
+
+# Pandas dtypes and casts of numeric columns with missing values.
+NULLABLE_PANDAS_DTYPES = {"bool": "boolean", "int": "Int64", "float": "float64"}
+NULLABLE_PANDAS_CASTS = {"bool": bool, "int": int, "float": float}
+
+
+# Prefix of serialized values replaced by a reference to a content-addressed blob,
+# followed by the hex digest of the blob. Serialized values start either with
+# a compression prefix or with the Pickle protocol opcode, so there are no collisions.
+BLOB_REF_PREFIX = b"B00"
+
+# Prefix of serialized values offloaded to the DataStore, followed by their URL.
+OFFLOAD_REF_PREFIX = b"D00"
+
+
+def serialize(obj: object, codec: Optional[str] = None) -> bytes:
     """
-    Serialize object, using the preferred serializer.
+    Serialize object, using the preferred serializer and compression `codec`, if provided.
     """
 
     serializer: Serializer = SERIALIZERS[options().get("serialization.serializer")]
-    return serializer.serialize(obj)
+    return serializer.serialize(obj, codec=codec)
 
 
 def deserialize(data: bytes) -> Any:
@@ -54,6 +88,203 @@ def deserialize(data: bytes) -> Any:
     return serializer.deserialize(data)
 
 
+class SerializedValue:
+    """
+    Serialized value of a run field, with the name of its original type.
+    """
+
+    # Attributes to store and serialize.
+    __slots__ = ("type_name", "data")
+    __state__ = ("type_name", "data")
+
+    def __init__(self, type_name: str, data: bytes):
+        """
+        Create a new serialized value.
+        """
+        self.type_name = type_name
+        self.data = data
+
+    def __getstate__(self):
+        """
+        Create state for pickling. Only attributes in `__state__` are considered.
+        """
+        state = {key: getattr(self, key) for key in self.__state__}
+        return state
+
+    def __setstate__(self, state):
+        """
+        Set state for unpickling.
+        """
+        for k, v in state.items():
+            self.__setattr__(k, v)
+
+
+class SerializedFields(Bunch):
+    """
+    Bunch of run fields whose values might be serialized, as returned by workers if option
+    "execution.serialize_fields" is enabled, or offloaded to the DataStore. Serialized values
+    are deserialized on first access, and persisted as they are otherwise.
+    """
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        if isinstance(value, SerializedValue):
+            value = deserialize(load_offloaded(value.data))
+            super().__setitem__(key, value)
+        return value
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def values(self):
+        return [self[key] for key in self]
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+    def __reduce__(self):
+        # Pickle serialized values as they are, without deserializing them.
+        return self.__class__, (list(OrderedDict.items(self)),)
+
+
+def offload(data: bytes, threshold_bytes: Optional[int] = None) -> bytes:
+    """
+    Write the serialized value `data` to the DataStore if larger than `threshold_bytes`, returning
+    a reference to it. Option "serialization.offload_threshold_bytes" is the default threshold,
+    the offloading is disabled if it is None.
+    """
+
+    # Importing here to avoid circular import error.
+    from mltraq.storage.datastore import DataStoreIO
+
+    threshold_bytes = options().get("serialization.offload_threshold_bytes", prefer=threshold_bytes)
+    if threshold_bytes is None or len(data) < threshold_bytes or data.startswith(OFFLOAD_REF_PREFIX):
+        return data
+    return OFFLOAD_REF_PREFIX + DataStoreIO.write(data).url.encode()
+
+
+def is_offloaded(data: Any) -> bool:
+    """
+    Return True if `data` is a reference to a serialized value offloaded to the DataStore.
+    """
+    return isinstance(data, bytes) and data.startswith(OFFLOAD_REF_PREFIX)
+
+
+def load_offloaded(data: bytes) -> bytes:
+    """
+    Return the serialized value referenced by `data`, if offloaded to the DataStore, or `data` otherwise.
+    """
+
+    # Importing here to avoid circular import error.
+    from mltraq.storage.datastore import DataStoreIO
+
+    if not is_offloaded(data):
+        return data
+    return DataStoreIO(data[len(OFFLOAD_REF_PREFIX) :].decode()).read()
+
+
+def deserialize_lazy(data: bytes, type_name: str) -> Any:
+    """
+    Deserialize `data`, unless it is a reference to a value offloaded to the DataStore: in this case,
+    return a SerializedValue of type `type_name` to be deserialized on first access, see `SerializedFields`.
+    """
+
+    if is_offloaded(data):
+        return SerializedValue(type_name, data)
+    return deserialize(data)
+
+
+def load_offloaded_fields(runs: Runs):
+    """
+    Replace in place the references to values offloaded to the DataStore in the fields of `runs`
+    with the serialized values, s.t. they do not depend on the DataStore files anymore.
+    """
+
+    for run in runs.values():
+        for value in OrderedDict.values(run.fields):
+            if isinstance(value, SerializedValue) and is_offloaded(value.data):
+                value.data = load_offloaded(value.data)
+
+
+def get_raw_field(fields: Bunch, key: str) -> Any:
+    """
+    Return the value of field `key` in `fields` (None if missing), without deserializing it.
+    """
+
+    return OrderedDict.get(fields, key)
+
+
+def is_numpy_scalar_native(obj_type: type) -> bool:
+    """
+    Return True if the values of NumPy scalar type `obj_type` can be stored exactly as native database types.
+    """
+
+    if not issubclass(obj_type, np.generic):
+        return False
+    dtype = np.dtype(obj_type)
+    return dtype.itemsize <= NUMPY_SCALAR_NATIVE_KINDS.get(dtype.kind, 0)
+
+
+def compress_serialized(data: bytes, codec: Optional[str] = None) -> bytes:
+    """
+    Return serialized value `data` compressed with `codec`, if requested and not already compressed.
+    """
+
+    if codec is None or Serializer.decompress(data) is not data:
+        return data
+    return Serializer.compress(data, codec=codec)
+
+
+def numpy_scalar_to_python(value: Any) -> Any:
+    """
+    Return NumPy boolean and numeric scalar `value` (e.g., `np.uint8`) as the corresponding Python scalar,
+    or `value` if it has no Python equivalent (e.g., `np.complex128`) or it is not a NumPy scalar.
+    """
+
+    return value.item() if isinstance(value, np.generic) and value.dtype.kind in "biuf" else value
+
+
+def references_stores(obj: object) -> bool:
+    """
+    Return True if `obj` is, or contains, a DataStore or ArchiveStore object.
+    """
+
+    # Importing here to avoid circular import error.
+    from mltraq.storage.archivestore import ArchiveStore
+    from mltraq.storage.datastore import DataStore
+
+    if isinstance(obj, (DataStore, ArchiveStore)):
+        return True
+    elif isinstance(obj, dict):
+        return any(references_stores(v) for v in obj.values())
+    elif isinstance(obj, (list, tuple, set)):
+        return any(references_stores(v) for v in obj)
+    else:
+        return False
+
+
+def serialize_fields(fields: Bunch) -> SerializedFields:
+    """
+    Serialize the values of `fields` that are not mapped to native database types, or None.
+
+    Values referencing DataStore/ArchiveStore objects are not serialized, as they must be written
+    by the driver process once the experiment is persisted, with its ID as relative path prefix.
+    """
+
+    serialized_fields = SerializedFields()
+    for key, value in OrderedDict.items(fields):
+        if (
+            value is None
+            or isinstance(value, SerializedValue)
+            or any(isinstance(value, db_type) for db_type in NATIVE_DATABASE_TYPES)
+            or references_stores(value)
+        ):
+            serialized_fields[key] = value
+        else:
+            serialized_fields[key] = SerializedValue(type(value).__name__, serialize(numpy_scalar_to_python(value)))
+    return serialized_fields
+
+
 def meta() -> dict:
     """
     Get dictionary describing the preferred serialization strategy, and
@@ -78,61 +309,419 @@ def unsafe_unpickle(data: bytes) -> Any:
     return PickleSerializer.deserialize(data, assert_safe=False)
 
 
+def infer_column_type(values: List[Any]) -> Tuple[str, bool, bool]:
+    """
+    Infer the type of a column of run fields with `values`, returning a tuple with
+    the name of the type, whether it must be serialized, and whether it is nullable.
+
+    Numeric types are promoted (e.g., int and float values result in a float column), and None
+    values make the column nullable. Columns whose values have mixed types are serialized.
+    """
+
+    # Values serialized by workers are not deserialized, we rely on their original type.
+    types = set(map(type, values))
+    nullable = type(None) in types
+    types.discard(type(None))
+
+    if SerializedValue in types:
+        type_names = {value.type_name for value in values if isinstance(value, SerializedValue)}
+        return "|".join(sorted(type_names | {t.__name__ for t in types if t is not SerializedValue})), True, nullable
+
+    for promoted_type, family in PROMOTED_NATIVE_TYPES.items():
+        if types and types <= family:
+            return promoted_type.__name__, False, nullable
+
+    if len(types) == 1 and issubclass(next(iter(types)), tuple(NATIVE_DATABASE_TYPES)):
+        return types.pop().__name__, False, nullable
+    elif len(types) == 0:
+        # All values are missing, we serialize them to preserve compatibility with previous schemas.
+        return type(None).__name__, True, nullable
+    else:
+        return "|".join(sorted(t.__name__ for t in types)), True, nullable
+
+
 def meta_runs(runs: Runs, table_name: str) -> dict:
     """
     Return dictionary with metadata about the runs persistence:
     - table name for experiment
     - numer of runs
-    - fields and their python types
+    - fields and their python types, inferred from all runs
     - serialized/non-serialized columns
+    - nullable columns (with None values, or missing in some of the runs)
     """
     meta = Bunch({"count": len(runs), "table_name": table_name})
     meta.columns = Bunch()
+    meta.columns.types = {}
+    meta.columns.serialized = []
+    meta.columns.non_serialized = []
+    meta.columns.nullable = []
 
-    if runs:
-        fields = runs.first().fields
-        meta.columns.types = {k: type(v).__name__ for k, v in fields.items()}
-        meta.columns.serialized = set()
-        for k, v in fields.items():
-            if not any(isinstance(v, db_type) for db_type in NATIVE_DATABASE_TYPES):
-                meta.columns.serialized.add(k)
-        meta.columns.non_serialized = list(set(fields.keys()) - meta.columns.serialized)
-        meta.columns.serialized = list(meta.columns.serialized)
-        meta.columns.non_serialized = list(meta.columns.non_serialized)
-    else:
-        meta.columns.types = {}
-        meta.columns.serialized = []
-        meta.columns.non_serialized = []
+    # Union of fields across all runs, in order of appearance.
+    col_names = dict.fromkeys(key for run in runs.values() for key in OrderedDict.keys(run.fields))
+
+    for col_name in col_names:
+        values = [get_raw_field(run.fields, col_name) for run in runs.values()]
+        type_name, serialized, nullable = infer_column_type(values)
+        meta.columns.types[col_name] = type_name
+        (meta.columns.serialized if serialized else meta.columns.non_serialized).append(col_name)
+        if nullable:
+            meta.columns.nullable.append(col_name)
 
     return meta
 
 
-def runs_to_sql(id_experiment: uuid.UUID, meta: dict, runs: Runs) -> Tuple[pd.DataFrame, List]:
+def nullable_to_sql(meta: dict, col_name: str, values: List[Any]) -> Any:
+    """
+    Return the non-serialized `values` of column `col_name` as an array with a Pandas dtype that
+    supports missing values, preserving the SQL type of promoted numeric columns.
+    """
+
+    type_name = meta.runs.columns.types[col_name]
+    if type_name == "float":
+        return np.array(values, dtype=float64)
+    elif type_name in NULLABLE_PANDAS_DTYPES and col_name in meta.runs.columns.get("nullable", []):
+        return pd.array(values, dtype=NULLABLE_PANDAS_DTYPES[type_name])
+    else:
+        return values
+
+
+def nullable_int_columns(meta: dict) -> List[str]:
     """
-    Prepare a Runs object for experiment `id_experiment`,
-    with metadata `meta`, to be stored in SQL.
-    It returns a Pandas dataframe and dtype(s) to use in the insert.
+    Return the nullable, non-serialized integer columns, which must be read from the database
+    without passing through float64 to preserve their values.
     """
 
-    if runs:
-        # The experiment has runs, let's find out the columns definition and persist it with the experiment.
-        # Work on a copy, to avoid modifications a slided copy of the dataframe.
-        df_runs = runs.df(max_level=0).copy()
-        df_runs["id_experiment"] = id_experiment
-        df_runs = reorder_columns(df_runs, ["id_experiment", "id_run"])
+    return [
+        col_name
+        for col_name in meta.runs.columns.get("nullable", [])
+        if col_name not in meta.runs.columns.serialized and meta.runs.columns.types[col_name] == "int"
+    ]
 
-        if len(meta.runs.columns.serialized) > 0:
-            # If there are columns to serialize, handle them.
-            for col_name in meta.runs.columns.serialized:
-                df_runs[col_name] = df_runs[col_name].map(lambda v: serialize(v))
 
-    else:
-        df_runs = pd.DataFrame(columns=["id_experiment", "id_run"])
+def nullable_from_sql(df: pd.DataFrame, meta: dict):
+    """
+    Replace in place missing values (e.g., NaN) of nullable, non-serialized columns in `df` with None,
+    casting the other values to the inferred type of the column, if numeric.
+    """
+
+    for col_name in meta.runs.columns.get("nullable", []):
+        if col_name in meta.runs.columns.serialized:
+            continue
+        cast = NULLABLE_PANDAS_CASTS.get(meta.runs.columns.types[col_name], lambda value: value)
+        values = [None if pd.isna(value) else cast(value) for value in df[col_name]]
+        df[col_name] = pd.Series(values, index=df.index, dtype=object)
+
+
+def runs_dtype(meta: dict) -> dict:
+    """
+    Return the SQLAlchemy types to use in the insert of runs, given the experiment metadata `meta`.
+    """
 
-    dtype = (
+    return (
         {"id_experiment": models.Uuid}
         | {"id_run": models.Uuid}
-        | {col_name: models.LargeBinary for col_name in meta.runs.columns.serialized}
+        | dict.fromkeys(meta.runs.columns.serialized, models.LargeBinary)
     )
 
-    return df_runs, dtype
+
+def runs_to_sql_chunks(
+    id_experiment: uuid.UUID,
+    meta: dict,
+    runs: Runs,
+    chunk_size: Optional[int] = None,
+    n_jobs: Optional[int] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Prepare a Runs object for experiment `id_experiment`, with metadata `meta`, to be stored in SQL.
+    It yields Pandas dataframes of up to `chunk_size` rows, preserving the order of runs.
+
+    Values are serialized by a pool of `n_jobs` threads. As soon as a chunk is yielded, the serialization
+    of the next chunk is already in progress, overlapping with the processing (e.g., the insert) of the
+    yielded chunk. Objects shared across runs (e.g., a config Bunch or a DataFrame set by `init_fields`)
+    are serialized only once, reusing their serialized value.
+
+    Options "database.query_write_chunk_size" and "serialization.n_jobs" are the defaults
+    of `chunk_size` and `n_jobs`.
+    """
+
+    chunk_size = options().get("database.query_write_chunk_size", prefer=chunk_size)
+    n_jobs = options().get("serialization.n_jobs", prefer=n_jobs)
+    if n_jobs < 0:
+        n_jobs = os.cpu_count() + 1 + n_jobs
+
+    runs_list = list(runs.values())
+
+    # Dictionary (id(obj), codec) -> (obj, future), we keep a reference to `obj`,
+    # s.t. its id cannot be reused by other objects while the memo is alive.
+    memo = {}
+
+    # Worker threads inherit the context variables of the caller, e.g., the active DataStoreWriter.
+    with ThreadPoolExecutor(
+        max_workers=n_jobs, initializer=inherit_context, initargs=(contextvars.copy_context(),)
+    ) as executor:
+        pending = None
+        for pos in range(0, len(runs_list), chunk_size):
+            submitted = submit_runs_chunk(executor, memo, id_experiment, meta, runs_list[pos : pos + chunk_size])
+            if pending is not None:
+                yield collect_runs_chunk(meta, pending)
+            pending = submitted
+
+        if pending is not None:
+            yield collect_runs_chunk(meta, pending)
+
+
+def inherit_context(context: contextvars.Context):
+    """
+    Set in the current thread the context variables of `context`, used to initialize worker threads.
+    """
+    for var, value in context.items():
+        var.set(value)
+
+
+def serialize_offload(obj: object, codec: Optional[str] = None) -> bytes:
+    """
+    Serialize `obj` with compression `codec`, offloading it to the DataStore if it is too large.
+    """
+    return offload(serialize(obj, codec=codec))
+
+
+def compress_offload(data: bytes, codec: Optional[str] = None) -> bytes:
+    """
+    Compress serialized value `data` with `codec`, offloading it to the DataStore if it is too large.
+    """
+    return offload(compress_serialized(data, codec))
+
+
+def submit_runs_chunk(
+    executor: Executor, memo: dict, id_experiment: uuid.UUID, meta: dict, runs_chunk: List[Run]
+) -> Dict[str, List]:
+    """
+    Submit to `executor` the serialization of the fields of `runs_chunk`, returning the columns
+    of the chunk, with futures in place of serialized values. Objects already in `memo` are not resubmitted.
+    """
+
+    encodings = meta.runs.columns.get("encodings", {})
+    codecs = {col_name: "zlib" for col_name, encoding in encodings.items() if encoding == "datapak-zlib"}
+
+    columns = {"id_experiment": id_experiment, "id_run": [run.id_run for run in runs_chunk]}
+    for col_name in meta.runs.columns.types:
+        if col_name in meta.runs.columns.get("sequences", []):
+            # Stored in a separate table.
+            continue
+        values = [get_raw_field(run.fields, col_name) for run in runs_chunk]
+        if col_name in meta.runs.columns.serialized:
+            for idx, value in enumerate(values):
+                codec = codecs.get(col_name)
+                if isinstance(value, SerializedValue):
+                    # Serialized by the worker that executed the run, compressed as required by the encoding.
+                    values[idx] = executor.submit(compress_offload, value.data, codec)
+                    continue
+                # The same object might be encoded differently in other columns.
+                key = (id(value), codec)
+                if key not in memo:
+                    memo[key] = (value, executor.submit(serialize_offload, numpy_scalar_to_python(value), codec))
+                values[idx] = memo[key][1]
+        else:
+            if encodings.get(col_name) == "numpy-scalar":
+                values = [None if value is None else value.item() for value in values]
+            values = nullable_to_sql(meta, col_name, values)
+        columns[col_name] = values
+    return columns
+
+
+def collect_runs_chunk(meta: dict, columns: Dict[str, List]) -> pd.DataFrame:
+    """
+    Wait for the serialized values of a chunk returned by `submit_runs_chunk`, and return it as a Pandas dataframe.
+    """
+
+    for col_name in meta.runs.columns.serialized:
+        columns[col_name] = [future.result() for future in columns[col_name]]
+    return pd.DataFrame(columns)
+
+
+def estimate_size(obj: object) -> int:
+    """
+    Return a cheap estimate of the size in bytes of `obj`, without serializing it.
+    """
+
+    if isinstance(obj, (bytes, str)):
+        return len(obj)
+    elif isinstance(obj, SerializedValue):
+        # Serialized by a worker, the size of its serialized representation.
+        return len(obj.data)
+    elif isinstance(getattr(obj, "nbytes", None), int):
+        # NumPy arrays, Arrow tables, ...
+        return obj.nbytes
+    elif isinstance(obj, (pd.DataFrame, pd.Series)):
+        return int(np.sum(obj.memory_usage(index=False)))
+    elif isinstance(obj, Sequence):
+        return estimate_size(obj.df())
+    elif isinstance(obj, dict):
+        return sum(estimate_size(k) + estimate_size(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        return sum(estimate_size(v) for v in obj)
+    else:
+        return sys.getsizeof(obj)
+
+
+def meta_encodings(meta: dict, runs: Runs):
+    """
+    Choose in place the encoding of the columns of `meta`, recorded in `meta.runs.columns.encodings`:
+    - "native": Native database type
+    - "numpy-scalar": NumPy scalars not mapped to native types (e.g., `np.uint8`), cast to native database types
+      if they can be stored exactly (e.g., not `np.uint64` and `np.complex128`, serialized instead)
+    - "datapak": Serialized with DATAPAK
+    - "datapak-zlib": Serialized with DATAPAK and compressed with zlib
+    - "table": Sequence values stored in a separate table
+
+    If option "serialization.policy.disable" is True, serialized columns use the DATAPAK encoding,
+    compressed as requested by option "serialization.compression.codec".
+    """
+
+    columns = meta.runs.columns
+    policy = options().get("serialization.policy")
+    columns.encodings = dict.fromkeys(columns.non_serialized, "native")
+    columns.encodings |= dict.fromkeys(columns.get("sequences", []), "table")
+
+    for col_name in list(columns.serialized):
+        if policy["disable"]:
+            columns.encodings[col_name] = "datapak"
+            continue
+
+        values = [get_raw_field(run.fields, col_name) for run in runs.values()]
+        types = set(map(type, values)) - {type(None)}
+
+        if len(types) == 1 and is_numpy_scalar_native(next(iter(types))):
+            # Tiny scalars do not need to be serialized.
+            columns.types[col_name] = np.dtype(types.pop()).name
+            columns.serialized.remove(col_name)
+            columns.non_serialized.append(col_name)
+            columns.encodings[col_name] = "numpy-scalar"
+        elif any(estimate_size(value) >= policy["compress_threshold_bytes"] for value in values):
+            columns.encodings[col_name] = "datapak-zlib"
+        else:
+            columns.encodings[col_name] = "datapak"
+
+
+def encoding_casts(meta: dict) -> Dict[str, Callable]:
+    """
+    Return the functions to restore the types of values cast to native database types, by column name,
+    given their encoding in `meta`.
+    """
+
+    return {
+        col_name: np.dtype(meta.runs.columns.types[col_name]).type
+        for col_name, encoding in meta.runs.columns.get("encodings", {}).items()
+        if encoding == "numpy-scalar"
+    }
+
+
+def meta_select_columns(meta: dict, columns: List[str]) -> Tuple[dict, List[str]]:
+    """
+    Return a copy of `meta` restricted to the fields in `columns`, and the names of the columns to read
+    from the table of runs, including `id_run`.
+    """
+
+    meta = copy.deepcopy(meta)
+    for key in ["serialized", "non_serialized", "nullable", "sequences"]:
+        meta.runs.columns[key] = [col_name for col_name in meta.runs.columns.get(key, []) if col_name in columns]
+    return meta, ["id_run"] + meta.runs.columns.serialized + meta.runs.columns.non_serialized
+
+
+def meta_sequences(meta: dict):
+    """
+    Move in place the columns of `meta` with Sequence values in all runs from the serialized columns
+    to the list of columns stored as separate tables, `meta.runs.columns.sequences`.
+    """
+
+    meta.runs.columns.sequences = [
+        col_name
+        for col_name in meta.runs.columns.serialized
+        if meta.runs.columns.types[col_name] == Sequence.__name__ and col_name not in meta.runs.columns.nullable
+    ]
+    meta.runs.columns.serialized = [
+        col_name for col_name in meta.runs.columns.serialized if col_name not in meta.runs.columns.sequences
+    ]
+
+
+def sequence_to_sql(runs: Runs, col_name: str) -> pd.DataFrame:
+    """
+    Return the Sequence objects of field `col_name` in `runs` as a Pandas dataframe in long format,
+    with columns `id_run`, `idx`, `timestamp` and the tracked attributes.
+    """
+
+    frames = [run.fields[col_name].df().assign(id_run=run.id_run) for run in runs.values()]
+    return reorder_columns(pd.concat(frames, ignore_index=True), ["id_run", "idx", "timestamp"])
+
+
+def sequence_from_sql(df: pd.DataFrame, id_runs: List[uuid.UUID]) -> List[Sequence]:
+    """
+    Return the Sequence objects of runs `id_runs` stored in `df` in long format, as produced by `sequence_to_sql`.
+    """
+
+    df["timestamp"] = df["timestamp"].astype("datetime64[us]")
+    df = df.sort_values(["id_run", "idx"], kind="stable")
+    groups = {
+        id_run: frame.drop(columns="id_run").reset_index(drop=True)
+        for id_run, frame in df.groupby("id_run", sort=False)
+    }
+    return [Sequence(frame=groups[id_run]) if id_run in groups else Sequence() for id_run in id_runs]
+
+
+def blob_digest(data: bytes) -> str:
+    """
+    Return the hex digest identifying the content-addressed blob `data`.
+    """
+    return hashlib.blake2b(data, digest_size=32).hexdigest()
+
+
+def dedup_blobs(df_runs: pd.DataFrame, columns: List[str], threshold_bytes: Optional[int] = None) -> Dict[str, bytes]:
+    """
+    Replace (in place) serialized values in `columns` of `df_runs` larger than `threshold_bytes`
+    with references to content-addressed blobs. It returns the dictionary of blobs to store,
+    indexed by their digest. Identical values are stored only once.
+
+    Option "serialization.dedup.disable" controls if the deduplication is enabled,
+    "serialization.dedup.threshold_bytes" is the default value of `threshold_bytes`.
+    """
+
+    if options().get("serialization.dedup.disable"):
+        return {}
+
+    threshold_bytes = options().get("serialization.dedup.threshold_bytes", prefer=threshold_bytes)
+    blobs = {}
+
+    def dedup_value(data: bytes) -> bytes:
+        if not isinstance(data, bytes) or len(data) < threshold_bytes:
+            return data
+        digest = blob_digest(data)
+        blobs[digest] = data
+        return BLOB_REF_PREFIX + digest.encode("ascii")
+
+    for col_name in columns:
+        df_runs[col_name] = df_runs[col_name].map(dedup_value)
+
+    return blobs
+
+
+def resolve_blobs(df: pd.DataFrame, columns: List[str], fetch: Callable[[List[str]], Dict[str, bytes]]):
+    """
+    Replace (in place) references to content-addressed blobs in `columns` of `df` with their
+    serialized values, retrieved with `fetch(digests)`.
+    """
+
+    def blob_ref(data: Any) -> Optional[str]:
+        if isinstance(data, bytes) and data.startswith(BLOB_REF_PREFIX):
+            return data[len(BLOB_REF_PREFIX) :].decode("ascii")
+        return None
+
+    refs = {col_name: df[col_name].map(blob_ref) for col_name in columns}
+    digests = set().union(*[set(col_refs.dropna()) for col_refs in refs.values()]) if refs else set()
+    if not digests:
+        return
+
+    blobs = fetch(list(digests))
+    for col_name, col_refs in refs.items():
+        mask = col_refs.notna()
+        if mask.any():
+            df.loc[mask, col_name] = col_refs[mask].map(blobs.__getitem__)
@@ -1,18 +1,24 @@
+import json
+import pickle
+import struct
 import uuid
+from importlib import import_module
 from io import BytesIO
-from typing import Any
+from pickle import PickleBuffer
+from typing import Any, Callable, Dict, List, Optional
 
 import numpy as np
 import pandas as pd
 import pyarrow as pa
-from pyarrow.feather import read_feather, read_table, write_feather
+from pyarrow.feather import read_table, write_feather
 
+from mltraq.opts import options
 from mltraq.storage.archivestore import Archive, ArchiveStore
 from mltraq.storage.datastore import DataStore
-from mltraq.storage.serializers.pickle import PickleSerializer
+from mltraq.storage.serializers.pickle import PICKLE_DEFAULT_PROTOCOL, PickleSerializer
 from mltraq.storage.serializers.serializer import Serializer
 from mltraq.utils.bunch import Bunch
-from mltraq.utils.exceptions import ExceptionWithMessage
+from mltraq.utils.exceptions import ExceptionWithMessage, InvalidInput
 from mltraq.utils.sequence import Sequence
 
 NoneType = type(None)
@@ -55,13 +61,17 @@ COMPLEX_TYPES = [
     pa.Table,
     np.ndarray,
     np.datetime64,
+    np.generic,
     uuid.UUID,
 ]
 
 # Magic dict key encoding types in the list COMPLEX_TYPES (see below)
 KEY_MAGIC = "DATAPAK-0"
 
-# Key of dictionaries encoding complex types
+# Key of dictionaries encoding complex types.
+# Keys ending with "-0" are the original encodings, keys ending with "-1"
+# are used for Arrow IPC payloads written with compression and/or dictionary
+# encoding. Both versions are supported in decoding.
 KEY_BUNCH_0 = "mltraq.Bunch-0"
 KEY_SEQUENCE_0 = "mltraq.Sequence-0"
 KEY_DATASTORE_0 = "mltraq.DataStore-0"
@@ -71,9 +81,16 @@ KEY_PANDAS_SERIES_0 = "pandas.Series-0"
 KEY_PANDAS_DATAFRAME_0 = "pandas.DataFrame-0"
 KEY_PYARROW_TABLE_0 = "pyarrow.Table-0"
 KEY_NUMPY_NDARRAY_0 = "numpy.ndarray-0"
+KEY_PANDAS_SERIES_1 = "pandas.Series-1"
+KEY_PANDAS_DATAFRAME_1 = "pandas.DataFrame-1"
+KEY_PYARROW_TABLE_1 = "pyarrow.Table-1"
 
 # Microseconds since epoch, example of value: numpy.datetime64('2024-01-02T17:16:15.12345', 'us')
 KEY_NUMPY_DATETIME64_0 = "numpy.datetime64-0"
+# NumPy scalars (e.g., numpy.complex128), stored as 0-dimensional arrays in NPY format.
+KEY_NUMPY_GENERIC_0 = "numpy.generic-0"
+# NumPy scalars of the default dtypes of Python scalars are encoded as Python scalars, without loss.
+NUMPY_SCALAR_BUILTINS = [np.bool_, np.int64, np.float64]
 KEY_UUID_0 = "uuid.UUID-0"
 
 
@@ -87,6 +104,14 @@ class EncodingError(ExceptionWithMessage):
     pass
 
 
+# Supported Arrow IPC buffer compression codecs.
+ARROW_COMPRESSION_CODECS = ["uncompressed", "lz4", "zstd"]
+
+# Arrow schema metadata key listing, as a JSON array of indices, the columns that have been
+# dictionary-encoded by DATAPAK, and that must be decoded back to their original type upon loading.
+ARROW_METADATA_DICTIONARY_KEY = b"mltraq.dictionary"
+
+
 def ensure_bytes(data: bytes) -> bytes:
     """
     Ensure that the type of `data` is indeed `bytes`, as a safety
@@ -100,10 +125,64 @@ def ensure_bytes(data: bytes) -> bytes:
     return data
 
 
+def encode_arrow(table: pa.Table) -> tuple[bytes, bool]:
+    """
+    Encode an Arrow table in the Arrow IPC (Feather V2) format, honoring the options
+    "serialization.arrow.codec", "serialization.arrow.level" and "serialization.arrow.dictionary".
+    It returns the encoded bytes, and True if the payload requires the versioned "-1" magic key.
+    """
+
+    codec = options().get("serialization.arrow.codec")
+    if codec not in ARROW_COMPRESSION_CODECS:
+        raise EncodingError(f"Arrow compression codec not supported: '{codec}'")
+
+    # Dictionary-encode string columns, keeping track of them in the schema metadata,
+    # s.t. we can restore their original type upon decoding.
+    dictionary_columns = []
+    if options().get("serialization.arrow.dictionary"):
+        for idx, field in enumerate(table.schema):
+            if pa.types.is_string(field.type) or pa.types.is_large_string(field.type):
+                table = table.set_column(idx, field.name, table.column(idx).dictionary_encode())
+                dictionary_columns.append(idx)
+        if dictionary_columns:
+            metadata = (table.schema.metadata or {}) | {ARROW_METADATA_DICTIONARY_KEY: json.dumps(dictionary_columns)}
+            table = table.replace_schema_metadata(metadata)
+
+    # The compression level is meaningful only if the payload is compressed.
+    level = None if codec == "uncompressed" else options().get("serialization.arrow.level")
+
+    buffer = BytesIO()
+    write_feather(table, buffer, compression=codec, compression_level=level)
+    return ensure_bytes(buffer.getvalue()), codec != "uncompressed" or len(dictionary_columns) > 0
+
+
+def decode_arrow(data: Any) -> pa.Table:
+    """
+    Decode an Arrow table encoded with `encode_arrow`. `data` can be any object exposing
+    the buffer protocol (bytes, memoryview, mmap), which is wrapped without copies.
+    Compression is detected automatically.
+    """
+
+    table = read_table(pa.BufferReader(pa.py_buffer(data)), memory_map=False)
+
+    metadata = table.schema.metadata or {}
+    if ARROW_METADATA_DICTIONARY_KEY in metadata:
+        for idx in json.loads(metadata[ARROW_METADATA_DICTIONARY_KEY]):
+            field = table.schema.field(idx)
+            table = table.set_column(idx, field.name, table.column(idx).cast(field.type.value_type))
+        metadata = {k: v for k, v in metadata.items() if k != ARROW_METADATA_DICTIONARY_KEY}
+        table = table.replace_schema_metadata(metadata or None)
+
+    return table
+
+
 class DataPakSerializer(Serializer):
     """
     Class that implement the DataPak serialization format.
 
+    Objects are encoded/decoded by looking up their exact type in the ENCODERS/DECODERS
+    dispatch tables. Subclasses of registered types are resolved once by walking their MRO.
+    Third-party types can be supported by registering their codec with `register(...)`.
     """
 
     @classmethod
@@ -111,15 +190,15 @@ class DataPakSerializer(Serializer):
         return f"{cls.__name__}-{VERSION_SERIALIZER}"
 
     @classmethod
-    def serialize(cls, obj: object) -> bytes:
+    def serialize(cls, obj: object, codec: Optional[str] = None) -> bytes:
         """
         Serialize an object:
         1. Encode it
         2. Serialize it with Pickle
-        3. Compress it, if requested
+        3. Compress it with `codec`, if requested
         """
 
-        return PickleSerializer.serialize(cls.encode(obj))
+        return PickleSerializer.serialize(cls.encode(obj), codec=codec)
 
     @classmethod
     def deserialize(cls, data: bytes) -> Any:
@@ -133,117 +212,434 @@ class DataPakSerializer(Serializer):
 
     @classmethod
     def encode(cls, obj: object) -> Any:
-        for obj_type in BASIC_TYPES:
-            if isinstance(obj, obj_type):
-                return obj
-        if isinstance(obj, dict) and not isinstance(obj, Bunch):
-            return {k: cls.encode(v) for k, v in obj.items()}
-        elif isinstance(obj, set):
-            return {cls.encode(v) for v in obj}
-        elif isinstance(obj, list):
-            return [cls.encode(v) for v in obj]
-        elif isinstance(obj, tuple):
-            return tuple([cls.encode(v) for v in obj])
-        else:
-            return encode_magic_key(cls, obj)
+        encoder = ENCODERS.get(type(obj))
+        if encoder is None:
+            encoder = resolve_encoder(cls, type(obj))
+        return encoder(cls, obj)
 
     @classmethod
     def decode(cls, obj: object) -> Any:
-        for obj_type in BASIC_TYPES:
-            if isinstance(obj, obj_type):
-                return obj
-        if isinstance(obj, list):
-            return [cls.decode(v) for v in obj]
-        if isinstance(obj, set):
-            return {cls.decode(v) for v in obj}
-        elif isinstance(obj, tuple):
-            return tuple([cls.decode(v) for v in obj])
-        elif isinstance(obj, dict):
-            if KEY_MAGIC not in obj:
-                return {k: cls.decode(v) for k, v in obj.items()}
-            else:
-                return decode_magic_key(cls, obj)
-        else:
+        decoder = DECODERS_BY_TYPE.get(type(obj))
+        if decoder is None:
             raise UnsupportedObjectType(f"{cls.__class__} is unable to deserialize type {obj.__class__}")
+        return decoder(cls, obj)
+
+    @classmethod
+    def register(
+        cls,
+        obj_type: type,
+        key: str,
+        encode: Callable[[type, Any], Any],
+        decode: Callable[[type, Any], Any],
+    ):
+        """
+        Register a codec for type `obj_type`, identified by magic `key`:
+        - `encode(cls, obj)` returns the value to store, composed only of `BASIC_TYPES` and `CONTAINER_TYPES`
+        - `decode(cls, value)` returns the object, given the stored value
+
+        Subclasses of `obj_type` are encoded with the same codec, unless they have a codec of their own.
+        """
+
+        if key in DECODERS:
+            raise InvalidInput(f"Magic key '{key}' already registered")
+
+        register_encoder(obj_type, lambda cls, obj: {KEY_MAGIC: key, "value": encode(cls, obj)})
+        register_decoder(key, lambda cls, obj: decode(cls, obj["value"]))
+
+    @classmethod
+    def unregister(cls, obj_type: type, key: str):
+        """
+        Unregister the codec for type `obj_type`, identified by magic `key`, registered with `register(...)`.
+        """
+
+        if key not in DECODERS:
+            raise InvalidInput(f"Magic key '{key}' not registered")
+
+        ENCODERS.pop(obj_type, None)
+        ENCODERS_RESOLVED.clear()
+        del DECODERS[key]
+
+    @classmethod
+    def register_lazy(cls, package: str, module: str):
+        """
+        Register codecs lazily: the first time an object of a type defined in `package` is encoded,
+        or a magic key starting with `package.` is decoded, `module` is imported. The module is
+        expected to register its codecs with `register(...)`, and `package` is never imported
+        unless needed.
+        """
+        EXTENSIONS[package] = module
+
+    @classmethod
+    def codecs(cls) -> Bunch:
+        """
+        Return the registry of codecs: `encoders` lists the types with a registered encoder,
+        `decoders` lists the registered magic keys, `extensions` maps packages to the
+        modules not yet imported that provide their codecs.
+        """
+        return Bunch(encoders=list(ENCODERS.keys()), decoders=list(DECODERS.keys()), extensions=dict(EXTENSIONS))
+
+    @classmethod
+    def serialize_out_of_band(cls, obj: object, threshold_bytes: int) -> List[Any]:
+        """
+        Serialize an object, storing the NPY and Arrow IPC payloads larger than `threshold_bytes` as
+        out-of-band buffers (Pickle protocol 5), aligned to OUT_OF_BAND_ALIGNMENT bytes. The result is
+        returned as a list of bytes-like chunks to write in sequence, without concatenating them:
+
+        MAGIC_OUT_OF_BAND | pickle length (u64) | buffer count (u64) | (offset, size) of buffers (u64 pairs) |
+        pickle | padding | buffer | padding | buffer ...
+
+        No compression is applied, s.t. buffers can be memory-mapped, see `deserialize_out_of_band`.
+        """
+
+        buffers = []
+        stream = pickle.dumps(
+            wrap_out_of_band(cls.encode(obj), threshold_bytes),
+            protocol=PICKLE_DEFAULT_PROTOCOL,
+            buffer_callback=buffers.append,
+        )
+        PickleSerializer.assert_safe(stream, allow_buffers=True)
+
+        views = [buffer.raw() for buffer in buffers]
+        header_size = len(MAGIC_OUT_OF_BAND) + 16 + 16 * len(views)
+        chunks = [None, stream]
+        offset = header_size + len(stream)
+        table = []
+        for view in views:
+            padding = -offset % OUT_OF_BAND_ALIGNMENT
+            chunks += [b"\0" * padding, view]
+            offset += padding
+            table += [offset, view.nbytes]
+            offset += view.nbytes
+        chunks[0] = MAGIC_OUT_OF_BAND + struct.pack(f"<{2 + len(table)}Q", len(stream), len(views), *table)
+        return chunks
+
+    @classmethod
+    def deserialize_out_of_band(cls, data: Any, copy: bool = True) -> Any:
+        """
+        Deserialize an object serialized with `serialize_out_of_band`. `data` can be any object exposing
+        the buffer protocol (bytes, memoryview, mmap). If `copy` is False, NumPy arrays and Arrow tables
+        are decoded as read-only views on `data`, without copies: if `data` is memory-mapped,
+        their contents are paged in by the OS on demand.
+        """
+
+        data = memoryview(data)
+        offset = len(MAGIC_OUT_OF_BAND)
+        pickle_size, n_buffers = struct.unpack_from("<2Q", data, offset)
+        table = struct.unpack_from(f"<{2 * n_buffers}Q", data, offset + 16)
+        offset += 16 + 16 * n_buffers
+
+        stream = bytes(data[offset : offset + pickle_size])
+        buffers = [data[table[i] : table[i] + table[i + 1]] for i in range(0, len(table), 2)]
+        if copy:
+            buffers = [bytes(buffer) for buffer in buffers]
+
+        PickleSerializer.assert_safe(stream, allow_buffers=True)
+        return cls.decode(pickle.loads(stream, buffers=buffers))  # noqa: S301
+
+
+# Magic prefix of objects serialized with out-of-band buffers, see `DataPakSerializer.serialize_out_of_band`.
+MAGIC_OUT_OF_BAND = b"M00"
+
+# Alignment of out-of-band buffers, in bytes.
+OUT_OF_BAND_ALIGNMENT = 64
+
+# Magic keys whose bytes values can be stored as out-of-band buffers, and decoded from memoryview objects.
+OUT_OF_BAND_KEYS = {
+    KEY_ARCHIVE_0,
+    KEY_NUMPY_NDARRAY_0,
+    KEY_PANDAS_SERIES_0,
+    KEY_PANDAS_DATAFRAME_0,
+    KEY_PYARROW_TABLE_0,
+    KEY_PANDAS_SERIES_1,
+    KEY_PANDAS_DATAFRAME_1,
+    KEY_PYARROW_TABLE_1,
+}
+
+# Dispatch table of encoders, by exact type. Encoders have signature
+# encoder(cls, obj) and return an object composed only of BASIC_TYPES and CONTAINER_TYPES.
+ENCODERS: Dict[type, Callable[[type, Any], Any]] = {}
+
+# Encoders resolved for subclasses of registered types, cleared at every registration.
+ENCODERS_RESOLVED: Dict[type, Callable[[type, Any], Any]] = {}
+
+# Dispatch table of decoders for complex types, by magic key. Decoders have signature
+# decoder(cls, obj) where `obj` is the dictionary containing the magic key.
+DECODERS: Dict[str, Callable[[type, dict], Any]] = {}
+
+# Modules providing codecs for third-party packages, imported on first use (package name -> module name).
+EXTENSIONS: Dict[str, str] = {}
+
+# Set of types that are returned as-is, used as fast path when encoding/decoding containers.
+BASIC_TYPES_SET = frozenset(BASIC_TYPES)
+
+
+def register_encoder(obj_type: type, encoder: Callable[[type, Any], Any]):
+    """
+    Register (or replace) the encoder of type `obj_type`.
+    """
+    ENCODERS[obj_type] = encoder
+    ENCODERS_RESOLVED.clear()
+
+
+def register_decoder(key: str, decoder: Callable[[type, dict], Any]):
+    """
+    Register (or replace) the decoder of complex objects with magic key `key`.
+    """
+    DECODERS[key] = decoder
+
+
+def resolve_encoder(cls, obj_type: type) -> Callable[[type, Any], Any]:
+    """
+    Find the encoder of the closest registered ancestor of `obj_type`, in MRO order.
+    E.g., `BunchEvent` is encoded as `Bunch`, and `numpy.float32` as `numpy.generic`.
+    """
+
+    encoder = ENCODERS_RESOLVED.get(obj_type)
+    if encoder is not None:
+        return encoder
+
+    for base in obj_type.__mro__:
+        encoder = ENCODERS.get(base)
+        if encoder is not None:
+            ENCODERS_RESOLVED[obj_type] = encoder
+            return encoder
+
+    # The type might be supported by an extension that has not been loaded yet.
+    if load_extension(obj_type.__module__.split(".")[0]):
+        return resolve_encoder(cls, obj_type)
+
+    raise UnsupportedObjectType(f"{cls.__name__} does not support type {obj_type}")
+
+
+def resolve_decoder(cls, key: str) -> Callable[[type, dict], Any]:
+    """
+    Find the decoder of magic key `key`, loading the extension of its package if required.
+    """
+
+    decoder = DECODERS.get(key)
+    if decoder is None and load_extension(key.split(".")[0]):
+        decoder = DECODERS.get(key)
+
+    if decoder is None:
+        raise UnsupportedObjectType(f"{cls.__class__} does not support type {key}")
+
+    return decoder
+
+
+def load_extension(package: str) -> bool:
+    """
+    Import the module registering the codecs of `package`, if any.
+    It returns True if the module has been imported.
+    """
+
+    module = EXTENSIONS.pop(package, None)
+    if module is None:
+        return False
+
+    try:
+        import_module(module)
+    except ImportError as e:
+        raise UnsupportedObjectType(f"Unable to load DATAPAK extension '{module}' for package '{package}'") from e
+
+    return True
+
+
+def encode_identity(cls, obj: Any) -> Any:
+    return obj
+
+
+def encode_dict(cls, obj: dict) -> dict:
+    return {k: v if type(v) in BASIC_TYPES_SET else cls.encode(v) for k, v in obj.items()}
+
+
+def encode_list(cls, obj: list) -> list:
+    return [v if type(v) in BASIC_TYPES_SET else cls.encode(v) for v in obj]
+
+
+def encode_set(cls, obj: set) -> set:
+    return {v if type(v) in BASIC_TYPES_SET else cls.encode(v) for v in obj}
+
+
+def encode_tuple(cls, obj: tuple) -> tuple:
+    return tuple([v if type(v) in BASIC_TYPES_SET else cls.encode(v) for v in obj])
+
+
+def decode_dict(cls, obj: dict) -> Any:
+    if KEY_MAGIC in obj:
+        decoder = DECODERS.get(obj[KEY_MAGIC])
+        if decoder is None:
+            decoder = resolve_decoder(cls, obj[KEY_MAGIC])
+        return decoder(cls, obj)
+    return {k: v if type(v) in BASIC_TYPES_SET else cls.decode(v) for k, v in obj.items()}
 
 
-def encode_magic_key(cls, obj: object) -> dict:  # noqa: C901
-    """
-    Encode the complex object, using as key MAGIC_KEY to identify
-    the dictionary as a serialized complex object.
-    """
-    if isinstance(obj, Sequence):
-        return {KEY_MAGIC: KEY_SEQUENCE_0, "value": cls.encode(obj.flush().frame)}
-    elif isinstance(obj, Archive):
-        return {KEY_MAGIC: KEY_ARCHIVE_0, "value": obj.to_bytes()}
-    elif isinstance(obj, DataStore):
-        return {KEY_MAGIC: KEY_DATASTORE_0, "value": obj.to_url()}
-    elif isinstance(obj, ArchiveStore):
-        return {KEY_MAGIC: KEY_ARCHIVESTORE_0, "value": obj.to_url()}
-    elif isinstance(obj, Bunch):
-        return {KEY_MAGIC: KEY_BUNCH_0, "value": cls.encode(dict(obj))}
-    elif isinstance(obj, uuid.UUID):
-        return {KEY_MAGIC: KEY_UUID_0, "value": obj.hex}
-    elif isinstance(obj, pd.DataFrame):
-        buffer = BytesIO()
-        write_feather(obj, buffer, compression="uncompressed")
-        return {KEY_MAGIC: KEY_PANDAS_DATAFRAME_0, "value": ensure_bytes(buffer.getvalue())}
-    elif isinstance(obj, pd.Series):
-        buffer = BytesIO()
-        write_feather(obj.to_frame(), buffer, compression="uncompressed")
-        return {KEY_MAGIC: KEY_PANDAS_SERIES_0, "value": ensure_bytes(buffer.getvalue())}
-    elif isinstance(obj, pa.Table):
-        buffer = BytesIO()
-        write_feather(obj, buffer, compression="uncompressed")
-        return {KEY_MAGIC: KEY_PYARROW_TABLE_0, "value": ensure_bytes(buffer.getvalue())}
-    elif isinstance(obj, np.ndarray):
-        # Store in NPY format, a "simple format for saving numpy arrays to disk with the full information about them."
-        # https://numpy.org/doc/stable/reference/generated/numpy.lib.format.html
-        buffer = BytesIO()
-        np.save(buffer, obj, allow_pickle=False)
-        return {KEY_MAGIC: KEY_NUMPY_NDARRAY_0, "value": ensure_bytes(buffer.getvalue())}
-    elif isinstance(obj, np.datetime64):
-        return {KEY_MAGIC: KEY_NUMPY_DATETIME64_0, "value": int(np.datetime64(obj, "us").astype(np.int64))}
+def decode_list(cls, obj: list) -> list:
+    return [v if type(v) in BASIC_TYPES_SET else cls.decode(v) for v in obj]
+
+
+def decode_set(cls, obj: set) -> set:
+    return {v if type(v) in BASIC_TYPES_SET else cls.decode(v) for v in obj}
+
+
+def decode_tuple(cls, obj: tuple) -> tuple:
+    return tuple([v if type(v) in BASIC_TYPES_SET else cls.decode(v) for v in obj])
+
+
+# Decoders of unpickled objects, by exact type. Unpickling safe opcodes
+# can only result in BASIC_TYPES and CONTAINER_TYPES.
+DECODERS_BY_TYPE: Dict[type, Callable[[type, Any], Any]] = dict.fromkeys(BASIC_TYPES, encode_identity) | {
+    dict: decode_dict,
+    list: decode_list,
+    set: decode_set,
+    tuple: decode_tuple,
+}
+
+
+def encode_pandas_dataframe(cls, obj: pd.DataFrame) -> dict:
+    data, versioned = encode_arrow(pa.Table.from_pandas(obj, preserve_index=None))
+    return {KEY_MAGIC: KEY_PANDAS_DATAFRAME_1 if versioned else KEY_PANDAS_DATAFRAME_0, "value": data}
+
+
+def encode_pandas_series(cls, obj: pd.Series) -> dict:
+    data, versioned = encode_arrow(pa.Table.from_pandas(obj.to_frame(), preserve_index=None))
+    return {KEY_MAGIC: KEY_PANDAS_SERIES_1 if versioned else KEY_PANDAS_SERIES_0, "value": data}
+
+
+def encode_pyarrow_table(cls, obj: pa.Table) -> dict:
+    data, versioned = encode_arrow(obj)
+    return {KEY_MAGIC: KEY_PYARROW_TABLE_1 if versioned else KEY_PYARROW_TABLE_0, "value": data}
+
+
+def encode_numpy_ndarray(cls, obj: np.ndarray) -> bytes:
+    # Store in NPY format, a "simple format for saving numpy arrays to disk with the full information about them."
+    # https://numpy.org/doc/stable/reference/generated/numpy.lib.format.html
+    buffer = BytesIO()
+    np.save(buffer, obj, allow_pickle=False)
+    return ensure_bytes(buffer.getvalue())
+
+
+def wrap_out_of_band(obj: Any, threshold_bytes: int) -> Any:
+    """
+    Return the encoded object `obj`, wrapping in PickleBuffer objects the values of magic keys in
+    OUT_OF_BAND_KEYS larger than `threshold_bytes`, s.t. they are pickled as out-of-band buffers.
+    Values already wrapped in PickleBuffer objects (e.g., archives) are otherwise pickled in-band.
+    """
+
+    if isinstance(obj, dict):
+        value = obj.get("value")
+        if (
+            obj.get(KEY_MAGIC) in OUT_OF_BAND_KEYS
+            and isinstance(value, (bytes, PickleBuffer))
+            and memoryview(value).nbytes >= threshold_bytes
+        ):
+            return obj | {"value": value if isinstance(value, PickleBuffer) else PickleBuffer(value)}
+        return {k: wrap_out_of_band(v, threshold_bytes) for k, v in obj.items()}
+    elif isinstance(obj, (list, tuple)):
+        return type(obj)(wrap_out_of_band(v, threshold_bytes) for v in obj)
     else:
-        raise UnsupportedObjectType(f"{cls.__name__} does not support type {obj.__class__}")
-
-
-def decode_magic_key(cls, obj: dict) -> Any:  # noqa: C901
-    """
-    Decode a complex object, encoded as a dictionary {k:v}
-    where `k` is a predefined list of string values, and
-    `v` is a bytes object that contains the serialized value.
-    """
-    if obj[KEY_MAGIC] == KEY_SEQUENCE_0:
-        return Sequence(frame=cls.decode(obj["value"]))
-    elif obj[KEY_MAGIC] == KEY_UUID_0:
-        return uuid.UUID(hex=obj["value"])
-    elif obj[KEY_MAGIC] == KEY_BUNCH_0:
-        return Bunch(cls.decode(obj["value"]))
-    elif obj[KEY_MAGIC] == KEY_ARCHIVE_0:
-        return Archive.from_bytes(obj["value"])
-    elif obj[KEY_MAGIC] == KEY_DATASTORE_0:
-        return DataStore.from_url(obj["value"])
-    elif obj[KEY_MAGIC] == KEY_ARCHIVESTORE_0:
-        return ArchiveStore.from_url(obj["value"])
-    elif obj[KEY_MAGIC] == KEY_PANDAS_DATAFRAME_0:
-        output_stream = pa.BufferOutputStream()
-        output_stream.write(obj["value"])
-        return read_feather(output_stream.getvalue())
-    elif obj[KEY_MAGIC] == KEY_PANDAS_SERIES_0:
-        output_stream = pa.BufferOutputStream()
-        output_stream.write(obj["value"])
-        return read_feather(output_stream.getvalue())[0]
-    elif obj[KEY_MAGIC] == KEY_NUMPY_NDARRAY_0:
-        memfile = BytesIO()
-        memfile.write(obj["value"])
-        memfile.seek(0)
-        return np.load(memfile, allow_pickle=False)
-    elif obj[KEY_MAGIC] == KEY_NUMPY_DATETIME64_0:
-        return np.datetime64(obj["value"], "us")
-    elif obj[KEY_MAGIC] == KEY_PYARROW_TABLE_0:
-        output_stream = pa.BufferOutputStream()
-        output_stream.write(obj["value"])
-        return read_table(output_stream.getvalue())
+        return obj
+
+
+def decode_numpy_ndarray(cls, value: Any) -> np.ndarray:
+    if isinstance(value, memoryview):
+        # Out-of-band buffer, we return a read-only view on it.
+        return view_numpy_ndarray(value)
+
+    memfile = BytesIO()
+    memfile.write(value)
+    memfile.seek(0)
+    return np.load(memfile, allow_pickle=False)
+
+
+def view_numpy_ndarray(value: memoryview) -> np.ndarray:
+    """
+    Return a read-only NumPy array viewing the NPY payload `value`, without copying its data.
+    """
+
+    # Parse the header only: magic string, version, header length and header.
+    version = tuple(value[6:8])
+    header_start = 10 if version == (1, 0) else 12
+    (header_len,) = struct.unpack_from("<H" if version == (1, 0) else "<I", value, 8)
+    memfile = BytesIO(bytes(value[: header_start + header_len]))
+    np.lib.format.read_magic(memfile)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(memfile)
     else:
-        raise UnsupportedObjectType(f"{cls.__class__} does not support type {obj[KEY_MAGIC]}")
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(memfile)
+
+    if dtype.hasobject:
+        raise UnsupportedObjectType("NumPy arrays with object dtype are not supported")
+
+    array = np.frombuffer(value, dtype=dtype, count=int(np.prod(shape)), offset=header_start + header_len)
+    return array.reshape(shape, order="F" if fortran_order else "C")
+
+
+def register_codecs():
+    """
+    Register the codecs of basic, container and complex types.
+    """
+
+    # Registration of basic and container types, returned as-is or encoded recursively.
+    for obj_type in BASIC_TYPES:
+        register_encoder(obj_type, encode_identity)
+    register_encoder(dict, encode_dict)
+    register_encoder(list, encode_list)
+    register_encoder(set, encode_set)
+    register_encoder(tuple, encode_tuple)
+
+    # Registration of complex types, encoded as dictionaries with the special key MAGIC_KEY.
+    DataPakSerializer.register(
+        Sequence,
+        KEY_SEQUENCE_0,
+        lambda cls, obj: cls.encode(obj.flush().frame),
+        lambda cls, v: Sequence(frame=cls.decode(v)),
+    )
+    DataPakSerializer.register(
+        Archive,
+        KEY_ARCHIVE_0,
+        lambda cls, obj: PickleBuffer(obj.to_buffer()),
+        lambda cls, v: Archive.from_bytes(v),
+    )
+    DataPakSerializer.register(
+        DataStore, KEY_DATASTORE_0, lambda cls, obj: obj.to_url(), lambda cls, v: DataStore.from_url(v)
+    )
+    DataPakSerializer.register(
+        ArchiveStore, KEY_ARCHIVESTORE_0, lambda cls, obj: obj.to_url(), lambda cls, v: ArchiveStore.from_url(v)
+    )
+    DataPakSerializer.register(
+        Bunch, KEY_BUNCH_0, lambda cls, obj: cls.encode(dict(obj)), lambda cls, v: Bunch(cls.decode(v))
+    )
+    DataPakSerializer.register(uuid.UUID, KEY_UUID_0, lambda cls, obj: obj.hex, lambda cls, v: uuid.UUID(hex=v))
+    DataPakSerializer.register(np.ndarray, KEY_NUMPY_NDARRAY_0, encode_numpy_ndarray, decode_numpy_ndarray)
+    DataPakSerializer.register(
+        np.datetime64,
+        KEY_NUMPY_DATETIME64_0,
+        lambda cls, obj: int(np.datetime64(obj, "us").astype(np.int64)),
+        lambda cls, v: np.datetime64(v, "us"),
+    )
+    DataPakSerializer.register(
+        np.generic,
+        KEY_NUMPY_GENERIC_0,
+        lambda cls, obj: encode_numpy_ndarray(cls, np.asarray(obj)),
+        lambda cls, v: decode_numpy_ndarray(cls, v)[()],
+    )
+    for obj_type in NUMPY_SCALAR_BUILTINS:
+        register_encoder(obj_type, lambda cls, obj: obj.item())
+
+    # Pandas and Arrow tables are encoded with versioned magic keys, depending on compression options.
+    register_encoder(pd.DataFrame, encode_pandas_dataframe)
+    register_encoder(pd.Series, encode_pandas_series)
+    register_encoder(pa.Table, encode_pyarrow_table)
+    for key in [KEY_PANDAS_DATAFRAME_0, KEY_PANDAS_DATAFRAME_1]:
+        register_decoder(key, lambda cls, obj: decode_arrow(obj["value"]).to_pandas())
+    for key in [KEY_PANDAS_SERIES_0, KEY_PANDAS_SERIES_1]:
+        register_decoder(key, lambda cls, obj: decode_arrow(obj["value"]).to_pandas().iloc[:, 0])
+    for key in [KEY_PYARROW_TABLE_0, KEY_PYARROW_TABLE_1]:
+        register_decoder(key, lambda cls, obj: decode_arrow(obj["value"]))
+
+
+register_codecs()
+
+# Codecs of optional third-party packages, loaded only if objects of these packages are encountered.
+DataPakSerializer.register_lazy("scipy", "mltraq.storage.serializers.extensions.scipy_sparse")
+DataPakSerializer.register_lazy("polars", "mltraq.storage.serializers.extensions.polars_frame")
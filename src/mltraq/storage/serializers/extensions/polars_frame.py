@@ -0,0 +1,20 @@
+"""
+DATAPAK codec for Polars dataframes, stored in the Arrow IPC format
+honoring the "serialization.arrow" options.
+"""
+
+import polars
+
+from mltraq.storage.serializers.datapak import DataPakSerializer, decode_arrow, encode_arrow
+
+
+def encode_polars_dataframe(cls, obj: polars.DataFrame) -> bytes:
+    data, _ = encode_arrow(obj.to_arrow())
+    return data
+
+
+def decode_polars_dataframe(cls, value: bytes) -> polars.DataFrame:
+    return polars.from_arrow(decode_arrow(value))
+
+
+DataPakSerializer.register(polars.DataFrame, "polars.DataFrame-0", encode_polars_dataframe, decode_polars_dataframe)
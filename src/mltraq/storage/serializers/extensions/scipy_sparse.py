@@ -0,0 +1,44 @@
+"""
+DATAPAK codecs for SciPy sparse matrices and arrays in CSR/CSC formats.
+Components `data`, `indices` and `indptr` are stored in NPY format, without densifying.
+"""
+
+import scipy.sparse
+
+from mltraq.storage.serializers.datapak import DataPakSerializer, decode_numpy_ndarray, encode_numpy_ndarray
+
+
+def encode_compressed_sparse(cls, obj) -> dict:
+    return {
+        "shape": tuple(obj.shape),
+        "data": encode_numpy_ndarray(cls, obj.data),
+        "indices": encode_numpy_ndarray(cls, obj.indices),
+        "indptr": encode_numpy_ndarray(cls, obj.indptr),
+    }
+
+
+def decoder(sparse_type: type):
+    """
+    Return the decoder reconstructing objects of type `sparse_type` from their components.
+    """
+
+    def decode_compressed_sparse(cls, value: dict):
+        return sparse_type(
+            (
+                decode_numpy_ndarray(cls, value["data"]),
+                decode_numpy_ndarray(cls, value["indices"]),
+                decode_numpy_ndarray(cls, value["indptr"]),
+            ),
+            shape=value["shape"],
+        )
+
+    return decode_compressed_sparse
+
+
+for name in ["csr_matrix", "csc_matrix", "csr_array", "csc_array"]:
+    # Sparse arrays are available since SciPy 1.8.
+    sparse_type = getattr(scipy.sparse, name, None)
+    if sparse_type is not None:
+        DataPakSerializer.register(
+            sparse_type, f"scipy.sparse.{name}-0", encode_compressed_sparse, decoder(sparse_type)
+        )
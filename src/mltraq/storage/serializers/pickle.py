@@ -1,5 +1,6 @@
+from io import BytesIO
 from pickletools import genops
-from typing import Any
+from typing import Any, Optional, Union
 
 import cloudpickle
 
@@ -13,9 +14,16 @@ from mltraq.utils.exceptions import ExceptionWithMessage
 # In the simpler scenario of pickling a dictionary of bytes values (as in SerializerPYBIN), there are no issues.
 PICKLE_DEFAULT_PROTOCOL = 5
 
+# Opcodes of out-of-band buffers (Pickle protocol version 5), not included in the whitelist of safe opcodes.
+# They are safe if the unpickler is provided with the buffers, which are returned as they are.
+PICKLE_BUFFER_OPCODES = {"NEXT_BUFFER", "READONLY_BUFFER"}
+
 # Version of the Pickle serializer
 VERSION_SERIALIZER = "0.0"
 
+# Minimum size of the arguments of opcodes (e.g., bytes values) scanned without copying them, see `PickleReader`.
+LARGE_ARGUMENT_BYTES = 2**16
+
 
 class UnsafePickle(ExceptionWithMessage):
     """
@@ -30,29 +38,40 @@ class PickleSerializer(Serializer):
     def name(cls) -> str:
         return f"{cls.__name__}-{VERSION_SERIALIZER}"
 
-    def assert_safe(pickle: bytes):
+    def assert_safe(pickle: bytes, allow_buffers: bool = False):
         """
         Make sure that it is safe to unpickle the object, by checking the opcodes defining it.
         No class/execution of code is allowed, only primitive types and containers (lists, dicts, tuples, sets).
+        If `allow_buffers` is True, out-of-band buffers are also allowed, loaded as provided to the unpickler.
         """
 
-        pickle_opcodes = {opcode.name for opcode, arg, pos in genops(pickle)}
+        try:
+            pickle_opcodes = {opcode.name for opcode, arg, pos in genops(PickleReader(pickle))}
+        except AttributeError:
+            # Arguments of legacy string opcodes must be bytes objects, we scan again copying them.
+            pickle_opcodes = {opcode.name for opcode, arg, pos in genops(pickle)}
         unsafe_opcodes = pickle_opcodes - pickle_safe_opcodes_set
+        if allow_buffers:
+            unsafe_opcodes -= PICKLE_BUFFER_OPCODES
         if unsafe_opcodes:
             raise UnsafePickle(f"Encountered Pickle opcodes that might be unsafe: {unsafe_opcodes}, aborting.")
 
     @classmethod
-    def serialize(cls, obj: object, assert_safe: bool = True) -> bytes:
+    def serialize(cls, obj: object, assert_safe: bool = True, codec: Optional[str] = None) -> bytes:
         """
         Serialize object:
         1. Check safety of opcodes, if requested
         2. Pickle
-        3. Compress, if requested
+        3. Compress with `codec`, if requested
         """
-        pickle = cloudpickle.dumps(obj, protocol=PICKLE_DEFAULT_PROTOCOL)
+        # Pickling to a file object, large bytes-like values (e.g., archives) are written directly
+        # to it, without being copied to the intermediate buffer of the pickler first.
+        buffer = BytesIO()
+        cloudpickle.dump(obj, buffer, protocol=PICKLE_DEFAULT_PROTOCOL)
+        pickle = buffer.getvalue()
         if assert_safe:
             cls.assert_safe(pickle)
-        return cls.compress(pickle)
+        return cls.compress(pickle, codec=codec)
 
     @classmethod
     def deserialize(cls, data: bytes, assert_safe: bool = True) -> Any:
@@ -66,3 +85,31 @@ class PickleSerializer(Serializer):
         if assert_safe:
             cls.assert_safe(pickle)
         return cloudpickle.loads(pickle)
+
+
+class PickleReader:
+    """
+    Read-only file object over a pickle, used to scan its opcodes. Large reads (e.g., arguments of
+    opcodes with bytes values) are returned as memoryview slices, without copying them.
+    """
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.view = memoryview(data)
+        self.pos = 0
+
+    def read(self, size: int = -1) -> Union[bytes, memoryview]:
+        end = len(self.data) if size < 0 else min(self.pos + size, len(self.data))
+        view = self.view[self.pos : end]
+        self.pos = end
+        return view if len(view) >= LARGE_ARGUMENT_BYTES else bytes(view)
+
+    def readline(self) -> bytes:
+        end = self.data.find(b"\n", self.pos)
+        end = len(self.data) if end < 0 else end + 1
+        line = self.data[self.pos : end]
+        self.pos = end
+        return line
+
+    def tell(self) -> int:
+        return self.pos
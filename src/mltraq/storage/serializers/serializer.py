@@ -1,7 +1,7 @@
 import abc
 import zlib
 from enum import Enum
-from typing import Any
+from typing import Any, Optional
 
 from mltraq.opts import options
 from mltraq.utils.bunch import Bunch
@@ -29,6 +29,9 @@ MAGIC_COMPRESSION_PREFIX = {
 # Inverse map, used for lookups at decompression.
 MAGIC_COMPRESSION_PREFIX_MAP = {v: k for k, v in MAGIC_COMPRESSION_PREFIX.items()}
 
+# Length of compression prefixes.
+MAGIC_COMPRESSION_PREFIX_LEN = 3
+
 
 class Serializer(abc.ABC):
     """
@@ -61,16 +64,16 @@ class Serializer(abc.ABC):
         )
 
     @classmethod
-    def compress(cls, data: bytes) -> Any:
+    def compress(cls, data: bytes, codec: Optional[str] = None) -> Any:
         """
-        Compress `data`.
+        Compress `data` with `codec`, defaulting to option "serialization.compression.codec".
         """
 
         # Make sure that we compress bytes
         if not isinstance(data, bytes):
             raise InvalidInput("You can compress only type `bytes`.")
 
-        codec = CompressionCodec[options().get("serialization.compression.codec")]
+        codec = CompressionCodec[options().get("serialization.compression.codec", prefer=codec)]
         if codec == CompressionCodec.uncompressed:
             return data
         elif codec == CompressionCodec.zlib:
@@ -85,7 +88,7 @@ class Serializer(abc.ABC):
         if the decompression procedure fails.
         """
 
-        codec = MAGIC_COMPRESSION_PREFIX_MAP.get(data[:2], CompressionCodec.uncompressed)
+        codec = MAGIC_COMPRESSION_PREFIX_MAP.get(data[:MAGIC_COMPRESSION_PREFIX_LEN], CompressionCodec.uncompressed)
 
         # If uncompressed (magic prefix not found), return `data`.
         # If compressed, attempt to decompress.
@@ -94,7 +97,7 @@ class Serializer(abc.ABC):
             return data
         elif codec == CompressionCodec.zlib:
             try:
-                return zlib.decompress(data[2:])
+                return zlib.decompress(data[MAGIC_COMPRESSION_PREFIX_LEN:])
             except zlib.error:
                 return data
         else:
@@ -1,6 +1,7 @@
 import fnmatch
 import logging
 import os
+import re
 from contextlib import contextmanager
 from glob import glob as _glob
 from shutil import rmtree
@@ -87,37 +88,113 @@ def globs(src_dir, include="**/*", exclude=None, recursive=True):
     """
     Enumerate files matching the glob patterns in the `include` string list, excluding
     matches in `exclude` string list, inside directory `src_dir`.
+
+    Include patterns follow the semantics of `glob.glob` (hidden names are matched only explicitly),
+    exclude patterns the semantics of `fnmatch.fnmatch`. The directory tree is walked once with
+    `os.scandir`, without changing the current directory, entering only directories that can contain
+    matches and that are not excluded by patterns ending with "*".
     """
 
     if not os.path.isdir(src_dir):
         raise InvalidInput(f"Source directory '{src_dir}' does not exist")
 
     # Normalise include/exclude type to list of patterns
-    if isinstance(include, str):
-        include = [include]
-    if isinstance(exclude, str):
-        exclude = [exclude]
-    if isinstance(exclude, NoneType):
-        exclude = []
-
-    candidates = []
-
-    for pattern in include:
-        candidates += glob(pattern, root_dir=src_dir, recursive=recursive)
-
-    # Drop duplicates
-    candidates = set(candidates)
-
-    # Let's identify matches we should drop accordingly to `excludes` patterns (or, if not a regular file).
-    dropped = []
-    for name in candidates:
-        if not os.path.isfile(src_dir + os.sep + name):
-            dropped.append(name)
-        else:
-            for pattern in exclude:
-                if fnmatch.fnmatch(name, pattern):
-                    dropped.append(name)
-                    break
-
-    matches = list(candidates - set(dropped))
+    include = as_patterns(include)
+    exclude = as_patterns(exclude)
+
+    includes = [compile_glob(pattern, recursive=recursive) for pattern in include]
+    excludes = [re.compile(fnmatch.translate(os.path.normcase(pattern))).match for pattern in exclude]
+    # Directories matching these patterns contain only excluded files, as their trailing "*" matches any suffix.
+    prunes = [match for match, pattern in zip(excludes, exclude) if pattern.endswith("*")]
+
+    matches = []
+    pending = [("", closure_globs(includes, {(idx, 0) for idx in range(len(includes))}))]
+    while pending:
+        prefix, states = pending.pop()
+        with os.scandir(src_dir + os.sep + prefix if prefix else src_dir) as entries:
+            for entry in entries:
+                name = prefix + entry.name
+                next_states, matched = advance_globs(includes, states, entry.name)
+                if entry.is_dir():
+                    if next_states and not any(match(os.path.normcase(name + os.sep)) for match in prunes):
+                        pending.append((name + os.sep, next_states))
+                elif matched and entry.is_file():
+                    if not any(match(os.path.normcase(name)) for match in excludes):
+                        matches.append(name)
+
     return matches
+
+
+def as_patterns(patterns):
+    """
+    Return `patterns` as a list of patterns, given a pattern, a list of patterns or None.
+    """
+
+    if isinstance(patterns, str):
+        return [patterns]
+    if isinstance(patterns, NoneType):
+        return []
+    return patterns
+
+
+def compile_glob(pattern, recursive=True):
+    """
+    Compile glob `pattern` to a list of path components, either "**" (matching any number of
+    non-hidden components, if `recursive`) or a compiled regular expression matching a single component.
+    """
+
+    components = []
+    for component in pattern.replace(os.sep, "/").split("/"):
+        if component in ("", "."):
+            continue
+        if recursive and component == "**":
+            if components[-1:] != ["**"]:
+                components.append("**")
+            continue
+        if component == "**":
+            component = "*"
+        regex = fnmatch.translate(component)
+        # Wildcards do not match hidden names, unless the component starts with a dot.
+        if not component.startswith("."):
+            regex = r"(?!\.)" + regex
+        components.append(re.compile(regex).match)
+    return components
+
+
+def advance_globs(includes, states, name):
+    """
+    Advance the matching of compiled glob patterns `includes` by a path component `name`, given the
+    current `states`, a set of (pattern index, component index) pairs closed with `closure_globs`.
+    Return the closed set of states to match the following components, and whether a pattern is fully
+    matched by `name`.
+    """
+
+    next_states = set()
+    matched = False
+    hidden = name.startswith(".")
+    for idx, pos in states:
+        components = includes[idx]
+        if pos == len(components):
+            continue
+        component = components[pos]
+        if component == "**":
+            if not hidden:
+                next_states.add((idx, pos))
+                matched = matched or pos == len(components) - 1
+        elif component(name):
+            next_states.add((idx, pos + 1))
+            matched = matched or pos == len(components) - 1
+    return {(idx, pos) for idx, pos in closure_globs(includes, next_states) if pos < len(includes[idx])}, matched
+
+
+def closure_globs(includes, states):
+    """
+    Return `states`, adding the states reached by matching "**" components with zero path components.
+    """
+
+    closure = set(states)
+    for idx, pos in states:
+        while pos < len(includes[idx]) and includes[idx][pos] == "**":
+            pos += 1
+            closure.add((idx, pos))
+    return closure
@@ -38,8 +38,10 @@ def fetch(url: str, pathname: Optional[str] = None) -> Bunch:
     chunk_size = 8192
     # Set user agent to something less blocked
     headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-        "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/111.0.0.0 Safari/537.36"
+        "User-Agent": (
+            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+            "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/111.0.0.0 Safari/537.36"
+        )
     }
     # Wait for a response up to `timeout` seconds
     timeout = 10
@@ -0,0 +1,26 @@
+import os
+
+from mltraq.storage.backends.file import FileBackend
+from mltraq.utils.fs import tmpdir_ctx
+
+
+def test_file_backend():
+    """
+    Test: We can write, read (also ranges and memory-mapped) and delete objects on the filesystem.
+    """
+
+    with tmpdir_ctx():
+        backend = FileBackend("file:///datastore")
+
+        assert backend.write("abc/x", b"0123456789") == 10
+        assert backend.write("abc/y", [b"01", memoryview(b"234")], fsync=True) == 5
+        backend.sync(["abc/x", "abc/y"])
+
+        assert backend.read("abc/x") == b"0123456789"
+        assert backend.read("abc/y") == b"01234"
+        assert backend.read("abc/x", offset=2, size=3) == b"234"
+        assert backend.read("abc/x", offset=8) == b"89"
+        assert bytes(backend.read("abc/x", offset=2, size=3, mmap=True)) == b"234"
+
+        backend.delete_prefix("abc")
+        assert not os.path.exists("datastore/abc")
@@ -0,0 +1,120 @@
+import os
+
+import numpy as np
+import pytest
+
+import mltraq
+from mltraq import options
+from mltraq.storage.backends.s3 import DeleteError, S3Backend
+from mltraq.storage.datastore import DataStore, DataStoreIO
+from mltraq.utils.fs import tmpdir_ctx
+
+boto3 = pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+
+@pytest.fixture
+def bucket(monkeypatch):
+    """
+    Mocked S3 bucket "mltraq", with clients created in the scope of the mock.
+    """
+
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with moto.mock_aws():
+        S3Backend.clients.clear()
+        boto3.client("s3").create_bucket(Bucket="mltraq")
+        yield "mltraq"
+        S3Backend.clients.clear()
+
+
+def test_s3_backend(bucket):
+    """
+    Test: We can write, read (also ranges and multipart) and delete objects in an S3 bucket.
+    """
+
+    # Small thresholds, forcing multipart transfers (5 MB is the minimum part size).
+    with options().ctx(
+        {"datastore.s3.multipart_threshold_bytes": 5 * 2**20, "datastore.s3.multipart_chunksize_bytes": 5 * 2**20}
+    ):
+        backend = S3Backend(f"s3://{bucket}/datastore")
+
+        assert backend.write("abc/x", b"0123456789") == 10
+        assert backend.read("abc/x") == b"0123456789"
+        assert backend.read("abc/x", offset=2, size=3) == b"234"
+        assert backend.read("abc/x", offset=8) == b"89"
+
+        data = np.random.default_rng(1).bytes(12 * 2**20)
+        assert backend.write("abc/large", [data[:100], data[100:]]) == len(data)
+        assert backend.read("abc/large") == data
+
+        assert backend.write("abc/chunks", [b"01", memoryview(b"234"), b"", b"5"]) == 6
+        assert backend.read("abc/chunks") == b"012345"
+        assert backend.write("abc/empty", [b"", b""]) == 0
+        assert backend.read("abc/empty") == b""
+
+        backend.delete_prefix("abc")
+        assert boto3.client("s3").list_objects_v2(Bucket=bucket).get("KeyCount") == 0
+
+
+def test_s3_backend_keys(bucket, monkeypatch):
+    """
+    Test: S3 keys are separated by "/", regardless of the path separator of the OS.
+    """
+
+    backend = S3Backend(f"s3://{bucket}/datastore")
+    monkeypatch.setattr(os, "sep", "\\")
+    assert backend.get_key("abc\\x") == "datastore/abc/x"
+
+
+def test_s3_backend_delete_errors(bucket, monkeypatch):
+    """
+    Test: Objects that could not be deleted result in an exception.
+    """
+
+    backend = S3Backend(f"s3://{bucket}/datastore")
+    backend.write("abc/x", b"0123456789")
+
+    def delete_objects(**kwargs):
+        return {"Errors": [{"Key": "datastore/abc/x", "Code": "AccessDenied", "Message": "Access Denied"}]}
+
+    monkeypatch.setattr(backend.client, "delete_objects", delete_objects)
+    with pytest.raises(DeleteError, match="AccessDenied"):
+        backend.delete_prefix("abc")
+
+
+def test_s3_datastore(bucket):
+    """
+    Test: DataStore objects of persisted experiments are stored in S3, and deleted with the experiment.
+    """
+
+    with tmpdir_ctx(), options().ctx({"datastore.url": f"s3://{bucket}/datastore"}):
+        session = mltraq.create_session()
+        experiment = session.create_experiment("test")
+        with experiment.run() as run:
+            run.fields.ds = DataStore(a=np.arange(10))
+        experiment.persist()
+
+        experiment = session.load_experiment("test")
+        assert (experiment.runs.first().fields.ds.a == np.arange(10)).all()
+
+        experiment.delete()
+        assert boto3.client("s3").list_objects_v2(Bucket=bucket, Prefix="datastore/").get("KeyCount") == 0
+
+
+def test_s3_cache_tier(bucket):
+    """
+    Test: Objects of remote backends are read through the on-disk cache, if enabled.
+    """
+
+    with tmpdir_ctx(), options().ctx(
+        {"datastore.url": f"s3://{bucket}/datastore", "datastore.cache.url": "file:///cache"}
+    ):
+        url = DataStore(a=np.arange(10)).to_url()
+        assert (DataStore.from_url(url).a == np.arange(10)).all()
+
+        # Once cached on disk, the object is readable also if removed from the bucket.
+        S3Backend(f"s3://{bucket}/datastore").delete_prefix(options().get("datastore.relative_path_prefix"))
+        assert (DataStore.from_url(url).a == np.arange(10)).all()
+        assert DataStoreIO(url).read(offset=0, size=3) == DataStoreIO(url).read()[:3]
@@ -1,5 +1,8 @@
 import os
+import subprocess
+import sys
 import uuid
+from collections import OrderedDict
 
 import numpy as np
 import pandas as pd
@@ -10,8 +13,9 @@ from mltraq import Sequence, options
 from mltraq.storage.archivestore import Archive
 from mltraq.storage.database import next_uuid
 from mltraq.storage.datastore import DataStore
-from mltraq.storage.serializers.datapak import DataPakSerializer, UnsupportedObjectType
+from mltraq.storage.serializers.datapak import DataPakSerializer, EncodingError, UnsupportedObjectType
 from mltraq.utils.bunch import Bunch, BunchEvent
+from mltraq.utils.exceptions import InvalidInput
 from mltraq.utils.fs import tmpdir_ctx
 
 NoneType = type(None)
@@ -70,6 +74,12 @@ def test_serialization_compression_onoff():
     with options().ctx({"serialization.compression.codec": "zlib"}):
         data = DataPakSerializer.serialize(obj)
         assert b"THIS_IS_A_TEST THIS_IS_A_TEST" not in data
+        assert DataPakSerializer.deserialize(data) == obj
+
+    # Codec passed explicitly.
+    data = DataPakSerializer.serialize(obj, codec="zlib")
+    assert b"THIS_IS_A_TEST THIS_IS_A_TEST" not in data
+    assert DataPakSerializer.deserialize(data) == obj
 
 
 def test_serialization_bunch():
@@ -191,6 +201,24 @@ def test_serialization_datetime64_s_ns():
     assert str(obj2) == "2024-01-02T17:16:15.123456"
 
 
+def test_serialization_numpy_scalars():
+    """
+    Test: We can serialize/deserialize NumPy scalars without a Python equivalent, preserving their type.
+    """
+    for obj in [np.uint64(2**64 - 1), np.complex128(1 + 2j), np.longdouble(1.5)]:
+        obj2 = DataPakSerializer.deserialize(DataPakSerializer.serialize(obj))
+        assert type(obj2) is type(obj)
+        assert obj2 == obj
+
+    # NumPy scalars of the default dtypes are encoded as Python scalars, as compact as them.
+    obj = [np.float64(0.5), np.int64(-1), np.bool_(True)]
+    data = DataPakSerializer.serialize(obj)
+    assert len(data) == len(DataPakSerializer.serialize([0.5, -1, True]))
+    obj2 = DataPakSerializer.deserialize(data)
+    assert obj2 == [0.5, -1, True]
+    assert [type(value) for value in obj2] == [float, int, bool]
+
+
 def test_serialization_none():
     """
     Test: We can serialize/deserialize a None.
@@ -316,3 +344,193 @@ def test_archive():
         assert isinstance(obj2, Archive)
         obj2.extract("test2")
         assert os.path.isfile("test2/a/x.y")
+
+
+def test_serialization_arrow_compression():
+    """
+    Test: We can compress Arrow IPC payloads, using the versioned magic keys.
+    """
+
+    obj = pd.DataFrame({"a": np.arange(10000), "b": ["value"] * 10000})
+    data_uncompressed = DataPakSerializer.serialize(obj)
+    assert b"pandas.DataFrame-0" in data_uncompressed
+
+    for codec in ["lz4", "zstd"]:
+        with options().ctx({"serialization.arrow.codec": codec}):
+            data = DataPakSerializer.serialize(obj)
+        assert b"pandas.DataFrame-1" in data
+        assert len(data) < len(data_uncompressed)
+
+        obj2 = DataPakSerializer.deserialize(data)
+        assert obj2.equals(obj)
+
+    with options().ctx({"serialization.arrow.codec": "zstd", "serialization.arrow.level": 10}):
+        obj = pd.Series(np.arange(10000))
+        obj2 = DataPakSerializer.deserialize(DataPakSerializer.serialize(obj))
+        assert isinstance(obj2, pd.Series)
+        assert obj2.equals(obj)
+
+
+def test_serialization_arrow_dictionary():
+    """
+    Test: Dictionary-encoded string columns are restored to their original type.
+    """
+
+    obj = pyarrow.table({"a": [1, 2, 3], "b": ["x", "y", "x"]})
+
+    with options().ctx({"serialization.arrow.dictionary": True}):
+        data = DataPakSerializer.serialize(obj)
+    assert b"pyarrow.Table-1" in data
+
+    obj2 = DataPakSerializer.deserialize(data)
+    assert obj2.equals(obj)
+    assert obj2.schema.metadata is None
+
+
+def test_serialization_arrow_dictionary_column_names():
+    """
+    Test: Dictionary-encoded columns are restored also if their names contain commas or are repeated.
+    """
+
+    obj = pd.DataFrame({"a,b": ["x", "y", "x"], "c": [1, 2, 3], "d": ["z", "z", "w"]})
+
+    with options().ctx({"serialization.arrow.dictionary": True}):
+        obj2 = DataPakSerializer.deserialize(DataPakSerializer.serialize(obj))
+    assert obj2.equals(obj)
+
+    obj = pyarrow.table([["x", "y"], ["z", "z"]], names=["a", "a"])
+    with options().ctx({"serialization.arrow.dictionary": True}):
+        obj2 = DataPakSerializer.deserialize(DataPakSerializer.serialize(obj))
+    assert obj2.equals(obj)
+
+
+def test_serialization_arrow_codec_not_supported():
+    """
+    Test: Unknown Arrow compression codecs are rejected.
+    """
+
+    with options().ctx({"serialization.arrow.codec": "unknown"}), pytest.raises(EncodingError):
+        DataPakSerializer.serialize(pd.DataFrame({"a": [1, 2, 3]}))
+
+
+def test_serialization_register():
+    """
+    Test: We can register codecs for third-party types, including their subclasses.
+    """
+
+    class Point:
+        def __init__(self, x, y):
+            self.x = x
+            self.y = y
+
+    class Point3D(Point):
+        pass
+
+    DataPakSerializer.register(
+        Point, "tests.Point-0", lambda cls, obj: (obj.x, obj.y), lambda cls, value: Point(*value)
+    )
+
+    try:
+        obj2 = DataPakSerializer.deserialize(DataPakSerializer.serialize({"a": [Point(1, 2), Point3D(3, 4)]}))
+        assert isinstance(obj2["a"][0], Point)
+        assert (obj2["a"][1].x, obj2["a"][1].y) == (3, 4)
+
+        with pytest.raises(InvalidInput):
+            DataPakSerializer.register(Point, "tests.Point-0", lambda cls, obj: None, lambda cls, value: None)
+    finally:
+        DataPakSerializer.unregister(Point, "tests.Point-0")
+
+    # Once unregistered, the codec is not available anymore.
+    assert "tests.Point-0" not in DataPakSerializer.codecs().decoders
+    with pytest.raises(UnsupportedObjectType):
+        DataPakSerializer.serialize(Point3D(3, 4))
+    with pytest.raises(InvalidInput):
+        DataPakSerializer.unregister(Point, "tests.Point-0")
+
+
+def test_serialization_subclasses():
+    """
+    Test: Subclasses of supported types are encoded as their closest supported ancestor.
+    """
+
+    obj2 = DataPakSerializer.deserialize(DataPakSerializer.serialize(OrderedDict(a=BunchEvent(b=1))))
+    assert type(obj2) is dict
+    assert type(obj2["a"]) is Bunch
+    assert obj2["a"].b == 1
+
+
+def test_serialization_scipy_sparse():
+    """
+    Test: We can serialize/deserialize SciPy sparse matrices, without densifying them.
+    """
+
+    scipy_sparse = pytest.importorskip("scipy.sparse")
+
+    for obj in [
+        scipy_sparse.random(100, 50, density=0.1, format="csr", random_state=1),
+        scipy_sparse.random(100, 50, density=0.1, format="csc", random_state=1),
+    ]:
+        data = DataPakSerializer.serialize(obj)
+        assert f"scipy.sparse.{type(obj).__name__}-0".encode() in data
+        obj2 = DataPakSerializer.deserialize(data)
+        assert type(obj2) is type(obj)
+        assert (obj2 != obj).nnz == 0
+
+
+def test_serialization_polars():
+    """
+    Test: We can serialize/deserialize Polars dataframes.
+    """
+
+    polars = pytest.importorskip("polars")
+
+    obj = polars.DataFrame({"a": [1, 2, 3], "b": ["x", "y", "z"]})
+    with options().ctx({"serialization.arrow.codec": "zstd"}):
+        data = DataPakSerializer.serialize(obj)
+    obj2 = DataPakSerializer.deserialize(data)
+    assert isinstance(obj2, polars.DataFrame)
+    assert obj2.equals(obj)
+
+
+def test_serialization_extension_not_loaded():
+    """
+    Test: Extensions are not loaded until objects of their package are encountered.
+    """
+
+    with pytest.raises(UnsupportedObjectType):
+        DataPakSerializer.deserialize(DataPakSerializer.serialize({"DATAPAK-0": "unknown.Type-0", "value": None}))
+
+    pytest.importorskip("scipy.sparse")
+    pytest.importorskip("polars")
+
+    # The check runs in a fresh interpreter, as other tests might have loaded the extensions already.
+    code = """
+import sys
+
+import numpy as np
+import pandas as pd
+
+from mltraq.storage.serializers.datapak import DataPakSerializer
+
+
+def loaded(package):
+    codecs = DataPakSerializer.codecs()
+    keys = [key for key in codecs.decoders if key.startswith(f"{package}.")]
+    assert (package in sys.modules) == (package not in codecs.extensions) == (len(keys) > 0), package
+    return package in sys.modules
+
+
+DataPakSerializer.serialize({"a": np.zeros(3), "b": pd.DataFrame({"c": [1, 2]}), "d": [1.0, "x", None]})
+assert not loaded("scipy") and not loaded("polars")
+
+import scipy.sparse
+
+DataPakSerializer.serialize(scipy.sparse.eye(3, format="csr"))
+assert loaded("scipy") and not loaded("polars")
+
+import polars
+
+DataPakSerializer.serialize(polars.DataFrame({"a": [1, 2]}))
+assert loaded("scipy") and loaded("polars")
+"""
+    subprocess.run([sys.executable, "-c", code], check=True)  # noqa: S603
@@ -26,3 +26,15 @@ def test_unsafe():
     data = pickle.dumps({"a": unsafe_func})
     with pytest.raises(UnsafePickle):
         PickleSerializer.assert_safe(data)
+
+
+def test_safe_large():
+    """
+    Test: We can check large values and legacy string opcodes, also with large arguments.
+    """
+
+    PickleSerializer.assert_safe(pickle.dumps({"a": b"x" * 2**20, "b": "y" * 2**20}, protocol=5))
+
+    # Legacy BINSTRING opcode (protocol 0-2 strings), with a large argument, followed by STOP.
+    data = pickle.BINSTRING + (2**17).to_bytes(4, "little") + b"z" * 2**17 + pickle.STOP
+    PickleSerializer.assert_safe(data)
@@ -1,7 +1,14 @@
 import os
+import tarfile
+from io import BytesIO
 
-from mltraq import create_experiment
-from mltraq.storage.archivestore import Archive, ArchiveStore, ArchiveStoreIO
+import pytest
+
+from mltraq import create_experiment, options
+from mltraq.storage.archivestore import INDEX_SUFFIX, Archive, ArchiveStore, ArchiveStoreIO
+from mltraq.storage.datastore import DataStore, DataStoreIO
+from mltraq.storage.serializers.datapak import DataPakSerializer
+from mltraq.utils.exceptions import InvalidInput
 from mltraq.utils.fs import tmpdir_ctx
 
 
@@ -115,6 +122,246 @@ def test_archivestore():
         e.fields.archive = ArchiveStore("test")
         e.persist()
 
-        # Reload experiment, and verify that files have been unarchived in the experiment's folder.
-        e.reload()
+        # Reload experiment, and verify that files are unarchived in the experiment's folder on demand.
+        e = e.reload()
+        assert not os.path.exists(f"mltraq.archivestore/{str(e.id_experiment)}/a/a1.x")
+        assert e.fields.archive.get_target() == f"mltraq.archivestore/{str(e.id_experiment)}"
         assert os.path.exists(f"mltraq.archivestore/{str(e.id_experiment)}/a/a1.x")
+
+
+@pytest.mark.parametrize("mode", ["x", "x:gz", "x:xz", "x:zst"])
+def test_archive_compression(mode):
+    """
+    Test: We can create and extract compressed archives, also with files larger than the prefetch limit.
+    """
+
+    with tmpdir_ctx(), options().ctx({"archivestore.mode": mode, "archivestore.prefetch_bytes": 100}):
+        create_test_dir()
+        create_test_file("test/large", "x" * 1000)
+
+        archive = Archive.create("test")
+        assert archive.stats.n_files == 6
+        assert archive.stats.n_bytes == 5 * len("something") + 1000
+        assert archive.stats.archive_bytes == len(archive.to_bytes())
+
+        Archive.from_bytes(archive.to_bytes()).extract("test2")
+        with open("test2/large") as f:
+            assert f.read() == "x" * 1000
+        assert os.path.isfile("test2/a/a1.x")
+
+        a = ArchiveStoreIO.create(src_dir="test")
+        assert a.stats.n_files == 6
+        assert "mltraq.archivestore/undefined/large" in set(a.getnames())
+        a.extract()
+        assert os.path.isfile("mltraq.archivestore/undefined/b/b1.z")
+
+
+@pytest.mark.parametrize("mode", ["x", "x:gz", "x:zst"])
+def test_archive_members(mode):
+    """
+    Test: We can read and extract single files, with and without the member index.
+    """
+
+    with tmpdir_ctx(), options().ctx({"archivestore.mode": mode}):
+        create_test_dir()
+        create_test_file("test/" + "l" * 200, "long name")
+
+        a = ArchiveStoreIO.create(src_dir="test")
+        assert a.index["seekable"] == (mode == "x")
+        assert a.read_member("b/d") == b"something"
+        with pytest.raises(InvalidInput):
+            a.read_member("missing")
+
+        a.extract(members=["a/a2.y", "l" * 200])
+        assert os.path.isfile("mltraq.archivestore/undefined/a/a2.y")
+        with open("mltraq.archivestore/undefined/" + "l" * 200) as f:
+            assert f.read() == "long name"
+        assert not os.path.isfile("mltraq.archivestore/undefined/a/a1.x")
+
+        # Without member index, the archive is scanned.
+        os.remove(DataStoreIO.get_pathname_from_url(a.url) + INDEX_SUFFIX)
+        a = ArchiveStoreIO(a.url)
+        assert a.read_member("b/d") == b"something"
+        assert set(a.getnames()) == set(ArchiveStoreIO.create(src_dir="test").getnames())
+        a.extract("test2", members=["b/b1.z"])
+        assert os.listdir("test2/b") == ["b1.z"]
+
+
+def test_archivestore_lazy():
+    """
+    Test: Loading an experiment does not extract its archives.
+    """
+
+    with tmpdir_ctx():
+        create_test_dir()
+        e = create_experiment()
+        e.fields.archive = ArchiveStore("test")
+        e.persist()
+
+        e = e.reload()
+        target = f"mltraq.archivestore/{str(e.id_experiment)}"
+        assert not os.path.exists(target)
+        assert set(e.fields.archive.getnames()) == {"a/a1.x", "a/a2.y", "b/b1.z", "b/c1.z", "b/d"}
+        assert e.fields.archive.read_member("a/a1.x") == b"something"
+        assert e.fields.archive.extract(members=["b/d"]) == target
+        assert os.listdir(target) == ["b"]
+
+
+def test_archive_dedup():
+    """
+    Test: Content-addressed archives store unchanged files once, and read only changed files.
+    """
+
+    with tmpdir_ctx(), options().ctx({"archivestore.dedup.disable": False, "archivestore.dedup.chunk_bytes": 4}):
+        create_test_dir()
+
+        a = ArchiveStoreIO.create(src_dir="test")
+        assert a.stats.n_files == 5
+        assert a.stats.n_read_files == 5
+        # "something" is split in chunks "some", "thin", "g", stored once.
+        assert a.stats.n_new_bytes == len("something")
+
+        create_test_file("test/b/d", "something else")
+        b = ArchiveStoreIO.create(src_dir="test")
+        assert b.stats.n_read_files == 1
+        assert b.stats.n_new_bytes == len("g el") + len("se")
+
+        assert set(b.getnames()) == set(a.getnames())
+        assert a.read_member("b/d") == b"something"
+        assert b.read_member("b/d") == b"something else"
+        with pytest.raises(InvalidInput):
+            b.read_member("missing")
+
+        b.extract("test2", members=["b/d"])
+        assert os.listdir("test2") == ["b"]
+        b.extract("test3")
+        with open("test3/b/d") as f:
+            assert f.read() == "something else"
+        assert os.path.isfile("test3/a/a1.x")
+
+
+def test_archivestore_dedup():
+    """
+    Test: Content-addressed archives can be used in experiments, and are shared across experiments.
+    """
+
+    with tmpdir_ctx(), options().ctx({"archivestore.dedup.disable": False}):
+        create_test_dir()
+        for _ in range(2):
+            e = create_experiment()
+            e.fields.archive = ArchiveStore("test")
+            e.persist()
+
+            e = e.reload()
+            assert e.fields.archive.read_member("a/a1.x") == b"something"
+            assert os.path.isfile(e.fields.archive.get_target() + "/b/b1.z")
+
+        # A single blob, shared by all files and experiments.
+        assert len(os.listdir("mltraq.archivestore.blobs")) == 1
+
+
+@pytest.mark.parametrize("mode", ["x", "x:zst"])
+def test_archive_streaming(mode):
+    """
+    Test: Streaming archives are created upon serialization, consistently with in-memory archives,
+    and can be extracted from memory-mapped DataStore objects without copies.
+    """
+
+    with tmpdir_ctx(), options().ctx({"archivestore.mode": mode}):
+        create_test_dir()
+
+        archive = Archive.create_streaming("test")
+        assert archive.data is None
+
+        data = DataPakSerializer.serialize(archive)
+        assert archive.data is None
+        assert archive.stats.n_files == 5
+        assert data == DataPakSerializer.serialize(Archive.from_bytes(archive.to_bytes()))
+
+        DataPakSerializer.deserialize(data).extract("test2")
+        assert os.path.isfile("test2/a/a1.x")
+
+        with options().ctx({"datastore.out_of_band_threshold_bytes": 1024}):
+            url = DataStore(archive=archive).to_url()
+        loaded = DataStore.from_url(url, mmap=True)
+        assert isinstance(loaded.archive.data, memoryview)
+        loaded.archive.extract("test3")
+        assert os.path.isfile("test3/b/b1.z")
+
+
+@pytest.mark.parametrize("mode", ["x", "x:gz"])
+@pytest.mark.parametrize("n_jobs", [1, 4])
+def test_archive_extract_parallel(mode, n_jobs):
+    """
+    Test: We can extract archives in parallel, with the same results and throughput stats.
+    """
+
+    with tmpdir_ctx(), options().ctx({"archivestore.mode": mode, "archivestore.n_jobs": n_jobs}):
+        create_test_dir()
+        create_test_file("test/large", "x" * 100_000)
+        os.chmod("test/a/a1.x", 0o775)  # noqa: S103
+
+        a = ArchiveStoreIO.create(src_dir="test").extract("test2")
+        assert a.extract_stats.n_files == 6
+        assert a.extract_stats.n_bytes == 5 * len("something") + 100_000
+        assert a.extract_stats.files_per_second > 0
+        with open("test2/large") as f:
+            assert f.read() == "x" * 100_000
+        assert os.stat("test2/a/a1.x").st_mtime == int(os.stat("test/a/a1.x").st_mtime)
+
+        # Group and other write permissions are removed by the data filter.
+        assert os.stat("test2/a/a1.x").st_mode & 0o777 == 0o755
+
+        a.extract("test3", members=["b/d"])
+        assert os.listdir("test3") == ["b"]
+        assert a.extract_stats.n_files == 1
+
+
+@pytest.mark.parametrize("n_jobs", [1, 4])
+def test_archive_extract_unsafe(n_jobs):
+    """
+    Test: Members extracted outside of the target directory are rejected, also in parallel.
+    """
+
+    with tmpdir_ctx(), options().ctx({"archivestore.n_jobs": n_jobs}):
+        pathname, url = DataStoreIO.get_next_pathname_url()
+        with tarfile.open(pathname, "w") as archive:
+            info = tarfile.TarInfo("../evil")
+            info.size = 4
+            archive.addfile(info, BytesIO(b"evil"))
+
+        with pytest.raises(tarfile.FilterError):
+            ArchiveStoreIO(url).extract("test2")
+        assert not os.path.exists("evil")
+
+
+@pytest.mark.parametrize("mode", ["x", "x:zst"])
+def test_archive_symlink(mode):
+    """
+    Test: Symbolic links are archived as links, without contents, preserving the other files.
+    """
+
+    with tmpdir_ctx(), options().ctx({"archivestore.mode": mode}):
+        os.makedirs("test")
+        create_test_file("test/a.txt", "a" * 20)
+        create_test_file("test/b.txt", "b")
+        os.symlink("a.txt", "test/link.txt")
+
+        a = ArchiveStoreIO.create(src_dir="test")
+        assert a.stats.n_files == 3
+        assert a.stats.n_bytes == 21
+        assert set(a.get_member_names()) == {"a.txt", "b.txt", "link.txt"}
+        if mode == "x":
+            assert set(a.index["members"]) == {"a.txt", "b.txt"}
+            with a.open() as archive:
+                assert archive.getmember("link.txt").issym()
+                assert archive.getmember("link.txt").size == 0
+
+        a.extract("test3", members=["link.txt", "a.txt"])
+        assert os.path.islink("test3/link.txt")
+
+        a.extract("test2")
+        assert os.path.islink("test2/link.txt")
+        with open("test2/link.txt") as f:
+            assert f.read() == "a" * 20
+        assert a.read_member("b.txt") == b"b"
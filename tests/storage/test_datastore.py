@@ -1,8 +1,13 @@
 import os
 
+import numpy as np
+import pandas as pd
+import pytest
+
 import mltraq
 from mltraq import options
-from mltraq.storage.datastore import DataStore, DataStoreIO
+from mltraq.storage.datastore import DataStore, DataStoreIO, DataStoreWriter, datastore_cache
+from mltraq.utils.exceptions import InvalidInput
 from mltraq.utils.fs import tmpdir_ctx
 
 
@@ -57,3 +62,170 @@ def test_delete():
 
         # Verify that directory doesn't exist anymore
         assert not os.path.exists(pathdir)
+
+
+def test_datastore_mmap():
+    """
+    Test: Objects stored with out-of-band buffers can be memory-mapped on read,
+    and objects stored with the default format are still readable with `mmap=True`.
+    """
+    with tmpdir_ctx():
+        data = DataStore(
+            array=np.arange(100_000, dtype=np.float32).reshape(1000, 100),
+            df=pd.DataFrame({"a": np.arange(10_000), "b": ["x"] * 10_000}),
+            small=np.arange(3),
+        )
+
+        with options().ctx({"datastore.out_of_band_threshold_bytes": 1024}):
+            url = data.to_url()
+
+        # Large arrays are views on the read-only mapping
+        loaded = DataStore.from_url(url, mmap=True)
+        assert (loaded.array == data.array).all()
+        assert not loaded.array.flags.writeable
+        assert loaded.df.equals(data.df)
+        assert (loaded.small == data.small).all()
+
+        # Without mmap, we get writable copies
+        loaded = DataStore.from_url(url)
+        assert (loaded.array == data.array).all()
+        assert loaded.array.flags.writeable
+
+        # Default format, readable with mmap=True
+        url = data.to_url()
+        loaded = DataStore.from_url(url, mmap=True)
+        assert (loaded.array == data.array).all()
+        assert loaded.df.equals(data.df)
+
+
+@pytest.mark.parametrize("fsync", ["none", "file", "dir"])
+def test_datastore_writer(fsync):
+    """
+    Test: DataStore files are written in parallel by DataStoreWriter on persist,
+    with all durability policies, and can be reloaded.
+    """
+
+    with tmpdir_ctx(), options().ctx({"datastore.writer.fsync": fsync, "serialization.n_jobs": 2}):
+        session = mltraq.create_session()
+        experiment = session.create_experiment("test")
+        for i in range(50):
+            with experiment.run() as run:
+                run.fields.ds = DataStore(i=i, array=np.arange(i))
+
+        experiment.persist()
+
+        experiment = session.load_experiment("test")
+        for i, run in enumerate(experiment.runs.values()):
+            assert run.fields.ds.i == i
+            assert (run.fields.ds.array == np.arange(i)).all()
+
+        # Writes outside persist, reporting statistics
+        with DataStoreWriter(n_jobs=4) as writer:
+            urls = [DataStoreIO.write(b"abc").url for _ in range(10)]
+        assert [DataStoreIO(url).read() for url in urls] == [b"abc"] * 10
+        assert writer.stats.n_files == 10
+        assert writer.stats.n_bytes == 30
+
+        # Invalid policy
+        with pytest.raises(InvalidInput):
+            DataStoreWriter(fsync="always")
+
+
+def test_datastore_sharded():
+    """
+    Test: With the sharded layout, objects are fanned out in subdirectories,
+    and objects stored with the flat layout are still readable.
+    """
+
+    with tmpdir_ctx():
+        url_flat = DataStore(a=1).to_url()
+
+        with options().ctx({"datastore.layout": "sharded", "datastore.relative_path_prefix": "abc"}):
+            url_sharded = DataStore(a=2).to_url()
+            assert DataStore.from_url(url_flat).a == 1
+            assert DataStore.from_url(url_sharded).a == 2
+
+        # URL in the shape of "file:///abc/xy/zw/<uuid>"
+        assert len(url_sharded[len("file:///") :].split(os.sep)) == 4
+        assert DataStore.from_url(url_sharded).a == 2
+
+        with options().ctx({"datastore.layout": "nested"}), pytest.raises(InvalidInput):
+            DataStore(a=3).to_url()
+
+
+def test_datastore_write_behind():
+    """
+    Test: With persist(wait=False), DataStore files are written in the background, and the returned
+    future is resolved with the experiment once they are written. Queued bytes are bounded.
+    """
+
+    with tmpdir_ctx():
+        session = mltraq.create_session()
+        experiment = session.create_experiment("test")
+        for i in range(20):
+            with experiment.run() as run:
+                run.fields.ds = DataStore(array=np.arange(1000) + i)
+
+        future = experiment.persist(wait=False)
+        assert future.result() is experiment
+
+        experiment = session.load_experiment("test")
+        for i, run in enumerate(experiment.runs.values()):
+            assert (run.fields.ds.array == np.arange(1000) + i).all()
+
+        # Persisting again waits for pending writes, before replacing the files.
+        experiment.persist(if_exists="replace", wait=False)
+        experiment.persist(if_exists="replace")
+        assert experiment.writes is None
+
+        # The queue is bounded, larger writes are accepted once it is empty.
+        with DataStoreWriter(max_pending_bytes=10) as writer:
+            urls = [DataStoreIO.write(b"x" * size).url for size in [4, 4, 4, 20]]
+        assert [len(DataStoreIO(url).read()) for url in urls] == [4, 4, 4, 20]
+        assert writer.pending_bytes == 0
+        assert writer.future.result().n_bytes == 32
+
+        # Errors are reported by the future.
+        with open("file", "w") as f:
+            f.write("not a directory")
+        with options().ctx({"datastore.url": "file:///file"}), DataStoreWriter(wait=False) as writer:
+            DataStoreIO.write(b"abc")
+        assert isinstance(writer.future.exception(), OSError)
+
+
+def test_datastore_cache():
+    """
+    Test: Decoded DataStore objects are cached by URL, with LRU eviction bounded by size.
+    """
+
+    with tmpdir_ctx(), options().ctx({"datastore.cache.max_bytes": 2000}):
+        datastore_cache.clear()
+        urls = [DataStore(array=np.arange(100) + i).to_url() for i in range(3)]
+
+        # Miss, then hit: the underlying file is not read again.
+        assert (DataStore.from_url(urls[0]).array == np.arange(100)).all()
+        os.remove(DataStoreIO.get_pathname_from_url(urls[0]))
+        assert (DataStore.from_url(urls[0]).array == np.arange(100)).all()
+        assert datastore_cache.stats.hits == 1
+        assert datastore_cache.stats.misses == 1
+
+        # Each object is about 900 bytes: loading two more objects evicts the least recently used one.
+        DataStore.from_url(urls[1])
+        DataStore.from_url(urls[2])
+        assert datastore_cache.stats.evictions == 1
+        assert datastore_cache.size_bytes <= 2000
+        with pytest.raises(FileNotFoundError):
+            DataStore.from_url(urls[0])
+
+        # Objects of deleted directories are evicted.
+        DataStoreIO.delete(options().get("datastore.relative_path_prefix"))
+        assert datastore_cache.size_bytes == 0
+
+    # Disabled by default.
+    with tmpdir_ctx():
+        datastore_cache.clear()
+        url = DataStore(a=1).to_url()
+        DataStore.from_url(url)
+        DataStore.from_url(url)
+        assert datastore_cache.size_bytes == 0
+        assert datastore_cache.stats.hits == 0
@@ -0,0 +1,170 @@
+import os
+import uuid
+
+import numpy as np
+import pytest
+
+import mltraq
+from mltraq import options
+from mltraq.storage.archivestore import ArchiveStore, ArchiveStoreIO, get_blob_pathname
+from mltraq.storage.database import Database
+from mltraq.storage.datastore import DataStore, DataStoreIO
+from mltraq.storage.serialization import blob_digest
+from mltraq.utils.exceptions import InvalidInput
+from mltraq.utils.fs import tmpdir_ctx
+
+
+def test_gc():
+    """
+    Test: Orphaned experiment directories and unreferenced objects are deleted,
+    while referenced objects (also nested) and directories not managed by experiments are retained.
+    """
+
+    with tmpdir_ctx():
+        session = mltraq.create_session("sqlite:///mltraq.db")
+        experiment = session.create_experiment("test")
+        with experiment.run() as run:
+            run.fields.ds = DataStore(a=1, nested=DataStore(b=2))
+        experiment.persist()
+
+        datastore_dir = DataStoreIO.get_filepath(options().get("datastore.url"))
+
+        # Orphaned directory, left by an experiment not in the database anymore.
+        orphan = DataStoreIO.write(b"abc", relative_path_prefix=str(uuid.uuid4())).url
+
+        # Unreferenced object, in the directory of an existing experiment.
+        unreferenced = DataStoreIO.write(b"abc", relative_path_prefix=str(experiment.id_experiment)).url
+
+        # Object not managed by experiments.
+        unmanaged = DataStoreIO.write(b"abc", relative_path_prefix="abc").url
+
+        # By default, recent files are ignored.
+        result = session.gc()
+        assert result.paths == []
+
+        # Dry run, nothing is deleted.
+        result = session.gc(dry_run=True, min_age_seconds=0)
+        assert result.stats.n_dirs == 1
+        assert result.stats.n_files == 2
+        assert result.stats.n_bytes == 6
+        assert os.path.exists(DataStoreIO.get_pathname_from_url(orphan))
+
+        result = session.gc(min_age_seconds=0)
+        assert sorted(result.paths) == sorted(
+            [
+                os.path.dirname(DataStoreIO.get_pathname_from_url(orphan)),
+                DataStoreIO.get_pathname_from_url(unreferenced),
+            ]
+        )
+        assert not os.path.exists(DataStoreIO.get_pathname_from_url(orphan))
+        assert not os.path.exists(DataStoreIO.get_pathname_from_url(unreferenced))
+        assert os.path.exists(DataStoreIO.get_pathname_from_url(unmanaged))
+        assert len(os.listdir(datastore_dir + os.sep + str(experiment.id_experiment))) == 2
+
+        # The experiment is still complete.
+        experiment = session.load_experiment("test")
+        assert experiment.runs.first().fields.ds.nested.b == 2
+
+        # Nothing else to collect.
+        assert session.gc(min_age_seconds=0).paths == []
+
+
+def test_gc_database():
+    """
+    Test: Garbage collection is refused on in-memory databases, whose experiments cannot be the ones
+    persisted in the stores, and on databases without experiments table.
+    """
+
+    with tmpdir_ctx():
+        session = mltraq.create_session()
+        with pytest.raises(InvalidInput, match="in-memory"):
+            session.gc(dry_run=True)
+
+        session = mltraq.create_session(db=Database("sqlite:///mltraq.db"))
+        with pytest.raises(InvalidInput, match="without table"):
+            session.gc(dry_run=True)
+
+
+def test_gc_blobs():
+    """
+    Test: Content-addressed blobs not referenced anymore by any experiment are deleted,
+    also with the Parquet runs backend, while DataStore objects referenced by blobs are retained.
+    """
+
+    with tmpdir_ctx():
+        session = mltraq.create_session("sqlite:///mltraq.db")
+
+        with options().ctx({"serialization.dedup.disable": False, "serialization.dedup.threshold_bytes": 1000}):
+            for name, value in [("a", np.zeros(1000)), ("b", np.ones(1000))]:
+                experiment = session.create_experiment(name)
+                with experiment.run() as run:
+                    run.fields.array = value
+                    run.fields.shared = np.arange(1000)
+                experiment.persist()
+
+            experiment = session.create_experiment("c")
+            with experiment.run() as run:
+                run.fields.ds = [DataStore(a=1), np.full(1000, 2)]
+            with options().ctx({"database.runs_backend": "parquet"}):
+                experiment.persist()
+
+        def count_blobs():
+            return session.db.query("SELECT COUNT(*) AS n FROM blobs").n.iloc[0]
+
+        assert count_blobs() == 4
+        assert session.gc(min_age_seconds=0).stats.n_blobs == 0
+
+        session.load_experiment("a").delete()
+        result = session.gc(dry_run=True, min_age_seconds=0)
+        assert result.stats.n_blobs == 1
+        assert count_blobs() == 4
+
+        result = session.gc(min_age_seconds=0)
+        assert result.stats.n_blobs == 1
+        assert count_blobs() == 3
+
+        # Shared blob and blobs of the Parquet runs are retained, with the DataStore objects they reference.
+        assert np.array_equal(session.load_experiment("b").runs.first().fields.shared, np.arange(1000))
+        assert session.load_experiment("c").runs.first().fields.ds[0].a == 1
+
+
+def test_gc_archive_pool():
+    """
+    Test: Blobs of content-addressed archives not listed by the manifests of retained archives are deleted,
+    also considering archives not managed by experiments.
+    """
+
+    def create_test_dir(content):
+        os.makedirs("test", exist_ok=True)
+        with open("test/a", "w") as f:
+            f.write(content)
+
+    with tmpdir_ctx(), options().ctx({"archivestore.dedup.disable": False, "archivestore.dedup.chunk_bytes": 4}):
+        session = mltraq.create_session("sqlite:///mltraq.db")
+        pool_dir = DataStoreIO.get_filepath(options().get("archivestore.dedup.url"))
+
+        for name, content in [("a", "aaaa0000"), ("b", "bbbb0000")]:
+            experiment = session.create_experiment(name)
+            experiment.fields.archive = ArchiveStore("test")
+            create_test_dir(content)
+            experiment.persist()
+
+        # Archive not managed by experiments.
+        create_test_dir("cccc")
+        unmanaged = ArchiveStoreIO.create(src_dir="test")
+
+        def count_blobs():
+            return sum(len(names) for _, _, names in os.walk(pool_dir))
+
+        assert count_blobs() == 4
+        assert session.gc().paths == []
+
+        session.load_experiment("a").delete()
+        result = session.gc(dry_run=True, min_age_seconds=0)
+        assert result.paths == [get_blob_pathname(pool_dir, blob_digest(b"aaaa"))]
+        assert count_blobs() == 4
+
+        session.gc(min_age_seconds=0)
+        assert count_blobs() == 3
+        assert session.load_experiment("b").fields.archive.read_member("a") == b"bbbb0000"
+        assert unmanaged.read_member("a") == b"cccc"
@@ -0,0 +1,128 @@
+import datetime
+import os
+
+import numpy as np
+import pyarrow.dataset as ds
+import pytest
+
+from mltraq import create_session, options
+from mltraq.storage.parquetstore import DatasetAlreadyExists, ParquetStore
+from mltraq.utils.exceptions import InvalidInput
+from mltraq.utils.fs import tmpdir_ctx
+
+
+def create_experiment_parquet(session):
+    """
+    Create and persist an experiment whose runs are stored as Parquet dataset.
+    """
+
+    experiment = session.create_experiment("a")
+    for idx in range(5):
+        with experiment.run() as run:
+            run.fields.idx = idx
+            run.fields.score = None if idx == 0 else idx / 10
+            run.fields.name = f"run{idx}"
+            run.fields.array = np.arange(idx)
+
+    with options().ctx({"database.runs_backend": "parquet", "database.query_write_chunk_size": 2}):
+        experiment.persist()
+
+    return experiment
+
+
+def test_parquetstore():
+    """
+    Test: We can persist and load runs using the Parquet runs backend.
+    """
+
+    with tmpdir_ctx():
+        session = create_session()
+        experiment = create_experiment_parquet(session)
+
+        # No table of runs in the database, but a Parquet dataset with a row group for each chunk.
+        assert not session.db.has_table(experiment.get_tablename())
+        pathname = ParquetStore.get_pathdir(str(experiment.id_experiment)) + os.sep + "part-0.parquet"
+        assert ds.dataset(pathname, format="parquet").count_rows() == 5
+
+        experiment = session.load_experiment("a")
+        runs = list(experiment.runs.values())
+        assert [run.fields.idx for run in runs] == list(range(5))
+        assert [run.fields.score for run in runs] == [None, 0.1, 0.2, 0.3, 0.4]
+        assert [run.fields.name for run in runs] == [f"run{idx}" for idx in range(5)]
+        for run in runs:
+            assert np.array_equal(run.fields.array, np.arange(run.fields.idx))
+
+        # Deleting the experiment drops the dataset.
+        experiment.delete()
+        assert not os.path.exists(ParquetStore.get_pathdir(str(experiment.id_experiment)))
+
+
+def test_parquetstore_pushdown():
+    """
+    Test: Column selection and filters are pushed down to the Parquet reader.
+    """
+
+    with tmpdir_ctx():
+        session = create_session()
+        create_experiment_parquet(session)
+
+        experiment = session.load_experiment("a", columns=["idx", "array"], filter=ds.field("score") > 0.25)
+        runs = list(experiment.runs.values())
+        assert [run.fields.idx for run in runs] == [3, 4]
+        assert list(runs[0].fields.keys()) == ["array", "idx"]
+        assert np.array_equal(runs[1].fields.array, np.arange(4))
+
+        # Column selection is supported also by the SQL runs backend, filters are not.
+        experiment = session.create_experiment("b")
+        experiment.add_runs(idx=range(3))
+        experiment.execute(lambda run: run.fields.update(idx=run.params.idx, other=0))
+        experiment.persist()
+        experiment = session.load_experiment("b", columns=["idx"])
+        assert sorted(run.fields.idx for run in experiment.runs.values()) == [0, 1, 2]
+        assert list(experiment.runs.first().fields.keys()) == ["idx"]
+        with pytest.raises(InvalidInput):
+            session.load_experiment("b", filter=ds.field("idx") > 0)
+
+
+def test_parquetstore_schema():
+    """
+    Test: The types of columns are inferred from all chunks, also if the values in the first chunks are missing.
+    """
+
+    with tmpdir_ctx():
+        session = create_session()
+        experiment = session.create_experiment("a")
+        for idx in range(5):
+            with experiment.run() as run:
+                run.fields.idx = idx
+                run.fields.timestamp = None if idx < 2 else datetime.datetime(2024, 1, idx)
+
+        with options().ctx({"database.runs_backend": "parquet", "database.query_write_chunk_size": 2}):
+            experiment.persist()
+
+        experiment = session.load_experiment("a")
+        runs = list(experiment.runs.values())
+        assert [run.fields.timestamp for run in runs[:2]] == [None, None]
+        assert [run.fields.timestamp.day for run in runs[2:]] == [2, 3, 4]
+
+
+def test_parquetstore_if_exists():
+    """
+    Test: Writing an existing dataset fails, unless it is replaced.
+    """
+
+    with tmpdir_ctx():
+        session = create_session()
+        experiment = create_experiment_parquet(session)
+        meta = experiment.get_metadata()
+        df = experiment.runs.df()[["id_run", "idx"]].assign(id_experiment=experiment.id_experiment)
+        meta.runs.columns.serialized = []
+        meta.runs.columns.non_serialized = ["idx"]
+        relative_path = str(experiment.id_experiment)
+
+        with pytest.raises(DatasetAlreadyExists):
+            ParquetStore.write(relative_path, [df], meta)
+        assert len(ParquetStore.read(relative_path, meta)) == 5
+
+        assert ParquetStore.write(relative_path, [df.head(2)], meta, if_exists="replace") == 2
+        assert ParquetStore.read(relative_path, meta).idx.tolist() == [0, 1]
@@ -1,9 +1,17 @@
 import datetime
+import os
 
-from mltraq import create_experiment, options
-from mltraq.storage.serialization import deserialize, serialize
+import numpy as np
+import pytest
+
+from mltraq import create_experiment, create_session, options
+from mltraq.run import Run
+from mltraq.storage.datastore import DataStore, DataStoreIO
+from mltraq.storage.serialization import SerializedValue, deserialize, get_raw_field, is_offloaded, serialize
 from mltraq.storage.serializers.datapak import DataPakSerializer
 from mltraq.storage.serializers.pickle import PickleSerializer
+from mltraq.utils.fs import tmpdir_ctx
+from mltraq.utils.sequence import Sequence
 
 
 def test_serialization_dict():
@@ -59,3 +67,400 @@ def test_db_storage_datetime():
     assert run.fields.var_type_time == var_type_time
     assert run.fields.var_type_datetime == var_type_datetime
     assert run.fields.var_type_date == var_type_date
+
+
+def test_dedup_blobs():
+    """
+    Test: Large serialized values are stored once as content-addressed blobs, across runs and experiments.
+    """
+
+    session = create_session()
+    values = np.arange(10000)
+
+    # The blobs table is created only once deduplication is used.
+    experiment = session.create_experiment("c")
+    with experiment.run() as run:
+        run.fields.array = values
+    experiment.persist()
+    assert "blobs" not in session.db.get_table_names()
+
+    with options().ctx({"serialization.dedup.disable": False, "serialization.dedup.threshold_bytes": 1000}):
+        for name in ["a", "b"]:
+            experiment = session.create_experiment(name)
+            for _ in range(3):
+                with experiment.run() as run:
+                    run.fields.array = values
+                    run.fields.small = [1, 2, 3]
+            experiment.persist()
+
+    assert session.db.query("SELECT COUNT(*) AS n FROM blobs").n.iloc[0] == 1
+
+    experiment = session.load_experiment("b")
+    assert len(experiment.runs) == 3
+    for run in experiment.runs.values():
+        assert np.array_equal(run.fields.array, values)
+        assert run.fields.small == [1, 2, 3]
+
+
+def test_serialize_memo():
+    """
+    Test: Objects shared across runs are serialized only once.
+    """
+
+    with tmpdir_ctx():
+        experiment = create_experiment()
+        shared = DataStore(a=np.arange(10))
+
+        for _ in range(3):
+            with experiment.run() as run:
+                run.fields.shared = shared
+
+        experiment.persist()
+
+        # The shared DataStore object has been written only once.
+        pathdir = DataStoreIO.get_filepath(options().get("datastore.url")) + os.sep + str(experiment.id_experiment)
+        assert len(os.listdir(pathdir)) == 1
+
+        experiment = experiment.reload()
+        for run in experiment.runs.values():
+            assert np.array_equal(run.fields.shared.a, np.arange(10))
+
+
+def test_parallel_serialization():
+    """
+    Test: Fields are serialized in parallel, in chunks, preserving the order of runs.
+    """
+
+    session = create_session()
+    experiment = session.create_experiment("a")
+
+    for idx in range(7):
+        with experiment.run() as run:
+            run.fields.idx = idx
+            run.fields.array = np.arange(idx)
+
+    with options().ctx({"serialization.n_jobs": 4, "database.query_write_chunk_size": 2}):
+        experiment.persist()
+
+    experiment = session.load_experiment("a")
+    assert [run.fields.idx for run in experiment.runs.values()] == list(range(7))
+    for run in experiment.runs.values():
+        assert np.array_equal(run.fields.array, np.arange(run.fields.idx))
+
+
+def test_serialize_fields():
+    """
+    Test: Fields are serialized by workers, deserialized lazily and persisted as they are.
+    """
+
+    def step(run: Run):
+        run.fields.idx = run.params.idx
+        run.fields.array = np.arange(run.params.idx)
+        run.fields.ds = DataStore(a=run.params.idx)
+
+    with tmpdir_ctx():
+        session = create_session()
+        experiment = session.create_experiment("a")
+        experiment.add_runs(idx=range(4))
+
+        with options().ctx({"execution.serialize_fields": True}):
+            experiment.execute(step, n_jobs=2)
+
+        for run in experiment.runs.values():
+            assert get_raw_field(run.fields, "idx") == run.fields.idx
+            assert isinstance(get_raw_field(run.fields, "array"), SerializedValue)
+            assert isinstance(get_raw_field(run.fields, "ds"), DataStore)
+
+        # Accessing a field deserializes it.
+        run = experiment.runs.first()
+        assert np.array_equal(run.fields.array, np.arange(run.fields.idx))
+        assert not isinstance(get_raw_field(run.fields, "array"), SerializedValue)
+
+        experiment.persist()
+        experiment = session.load_experiment("a")
+        for run in experiment.runs.values():
+            assert np.array_equal(run.fields.array, np.arange(run.fields.idx))
+            assert run.fields.ds.a == run.fields.idx
+
+
+def test_meta_runs_all_runs():
+    """
+    Test: Column types are inferred from all runs, promoting numeric types and handling missing values.
+    """
+
+    session = create_session()
+    experiment = session.create_experiment("a")
+
+    for idx in range(3):
+        with experiment.run() as run:
+            run.fields.metric = None if idx == 0 else idx / 2
+            run.fields.count = None if idx == 1 else idx
+            run.fields.mixed = "a" if idx == 0 else idx
+            if idx == 2:
+                run.fields.extra = True
+
+    meta = experiment.get_metadata().runs.columns
+    assert meta.types == {"metric": "float", "count": "int", "mixed": "int|str", "extra": "bool"}
+    assert meta.non_serialized == ["metric", "count", "extra"]
+    assert meta.serialized == ["mixed"]
+    assert meta.nullable == ["metric", "count", "extra"]
+
+    experiment.persist()
+
+    # Numeric columns are queryable without deserialization.
+    df = session.db.query(f"SELECT AVG(metric) AS a, SUM(count) AS b FROM {experiment.get_tablename()}")  # noqa: S608
+    assert df.a.iloc[0] == 0.75
+    assert df.b.iloc[0] == 2
+
+    experiment = session.load_experiment("a")
+    runs = list(experiment.runs.values())
+    assert [run.fields.metric for run in runs] == [None, 0.5, 1.0]
+    assert [run.fields["count"] for run in runs] == [0, None, 2]
+    assert isinstance(runs[2].fields["count"], int)
+    assert [run.fields.mixed for run in runs] == ["a", 1, 2]
+    assert [run.fields.extra for run in runs] == [None, None, True]
+
+
+@pytest.mark.parametrize("runs_backend", ["sql", "parquet"])
+def test_meta_runs_nullable_large_ints(runs_backend):
+    """
+    Test: Nullable integer columns are reloaded exactly, also if not representable as float64.
+    """
+
+    with tmpdir_ctx(), options().ctx({"database.runs_backend": runs_backend}):
+        session = create_session()
+        experiment = session.create_experiment("a")
+        for idx in range(2):
+            with experiment.run() as run:
+                run.fields.count = None if idx == 0 else 2**62 + 1
+
+        experiment.persist()
+        experiment = session.load_experiment("a")
+        assert [run.fields["count"] for run in experiment.runs.values()] == [None, 2**62 + 1]
+
+
+def test_sequence_tables():
+    """
+    Test: Sequence fields are stored in separate tables, and they can be queried with SQL.
+    """
+
+    session = create_session()
+    experiment = session.create_experiment("a")
+
+    for idx in range(3):
+        with experiment.run() as run:
+            run.fields.idx = idx
+            run.fields.loss = Sequence()
+            for step in range(idx + 2):
+                run.fields.loss.append(value=idx * 10 + step)
+
+    with options().ctx({"database.sequence_tables": True}):
+        experiment.persist()
+
+    table_name = experiment.get_sequence_tablename("loss")
+    assert table_name == "experiment_a__loss"
+    assert session.db.query(f"SELECT COUNT(*) AS n FROM {table_name}").n.iloc[0] == 2 + 3 + 4  # noqa: S608
+
+    # Last value of loss for each run.
+    df = session.db.query(
+        f"SELECT t.value FROM {table_name} t JOIN (SELECT id_run, MAX(idx) AS idx FROM {table_name} GROUP BY id_run) m "  # noqa: S608
+        "ON t.id_run = m.id_run AND t.idx = m.idx ORDER BY t.value"
+    )
+    assert df.value.tolist() == [1, 12, 23]
+
+    experiment = session.load_experiment("a")
+    for run in experiment.runs.values():
+        assert isinstance(run.fields.loss, Sequence)
+        assert run.fields.loss.df().idx.tolist() == list(range(run.fields.idx + 2))
+        assert run.fields.loss.df().value.tolist() == [run.fields.idx * 10 + step for step in range(run.fields.idx + 2)]
+
+    # Deleting the experiment drops the tables of sequences.
+    experiment.delete()
+    assert not session.db.has_table(table_name)
+
+
+def test_sequence_tables_collisions():
+    """
+    Test: Sequence fields whose names collide once sanitized are stored in distinct tables.
+    """
+
+    session = create_session()
+    experiment = session.create_experiment("a")
+    names = ["loss", "Loss", "a_b", "a-b"]
+
+    with experiment.run() as run:
+        for pos, name in enumerate(names):
+            run.fields[name] = Sequence()
+            run.fields[name].append(value=pos)
+
+    with options().ctx({"database.sequence_tables": True}):
+        experiment.persist()
+
+    table_names = [experiment.get_sequence_tablename(name) for name in names]
+    assert len(set(table_names)) == len(names)
+    assert table_names[0] == "experiment_a__loss"
+    assert table_names[2] == "experiment_a__a_b"
+
+    run = session.load_experiment("a").runs.first()
+    for pos, name in enumerate(names):
+        assert run.fields[name].df().value.tolist() == [pos]
+
+    session.load_experiment("a").delete()
+    assert not any(table_name.startswith("experiment_a") for table_name in session.db.get_table_names())
+
+
+def test_serialization_policy():
+    """
+    Test: The encoding of serialized columns is chosen by type and size, and recorded in the metadata.
+    """
+
+    session = create_session()
+    experiment = session.create_experiment("a")
+
+    for idx in range(3):
+        with experiment.run() as run:
+            run.fields.idx = idx
+            run.fields.small = np.uint8(idx)
+            run.fields.array = np.zeros(1000 * (idx + 1))
+            run.fields.config = {"a": idx}
+
+    with options().ctx({"serialization.policy.disable": False, "serialization.policy.compress_threshold_bytes": 20000}):
+        experiment.persist()
+        meta = experiment.get_metadata().runs.columns
+
+    assert meta.encodings == {"idx": "native", "small": "numpy-scalar", "array": "datapak-zlib", "config": "datapak"}
+    assert meta.types["small"] == "uint8"
+
+    # NumPy scalars are stored natively, arrays are compressed.
+    df = session.db.query("SELECT small, array FROM experiment_a")
+    assert df.small.tolist() == [0, 1, 2]
+    assert all(value.startswith(b"C01") for value in df.array)
+
+    experiment = session.load_experiment("a")
+    for run in experiment.runs.values():
+        assert run.fields.small == run.fields.idx
+        assert isinstance(run.fields.small, np.uint8)
+        assert np.array_equal(run.fields.array, np.zeros(1000 * (run.fields.idx + 1)))
+        assert run.fields.config == {"a": run.fields.idx}
+
+
+def test_serialization_policy_fallbacks():
+    """
+    Test: NumPy scalars that cannot be stored exactly as native database types are serialized,
+    objects shared across columns are compressed as required by each column, and values serialized
+    by workers are compressed if required.
+    """
+
+    shared = np.zeros(10)
+
+    def step(run: Run):
+        run.fields.idx = run.params.idx
+        run.fields.uint64 = np.uint64(2**64 - 1)
+        run.fields.complex = np.complex128(1 + 2j)
+        run.fields.small = shared
+        run.fields.large = shared if run.params.idx == 0 else np.zeros(10000)
+        run.fields.array = np.zeros(10000)
+
+    session = create_session()
+    experiment = session.create_experiment("a")
+    experiment.add_runs(idx=range(2))
+
+    with options().ctx({"serialization.policy.disable": False, "serialization.policy.compress_threshold_bytes": 20000}):
+        experiment.execute(step)
+        experiment.persist()
+        meta = experiment.get_metadata().runs.columns
+        assert meta.encodings["uint64"] == "datapak"
+        assert meta.encodings["complex"] == "datapak"
+        assert meta.encodings["small"] == "datapak"
+        assert meta.encodings["large"] == "datapak-zlib"
+
+        with options().ctx({"execution.serialize_fields": True}):
+            experiment = session.create_experiment("b")
+            experiment.add_runs(idx=range(2))
+            experiment.execute(step, n_jobs=2)
+            experiment.persist()
+            assert experiment.get_metadata().runs.columns.encodings["array"] == "datapak-zlib"
+
+    df = session.db.query("SELECT small, large FROM experiment_a")
+    assert not any(value.startswith(b"C01") for value in df.small)
+    assert all(value.startswith(b"C01") for value in df.large)
+    assert all(value.startswith(b"C01") for value in session.db.query("SELECT array FROM experiment_b").array)
+
+    for name in ["a", "b"]:
+        experiment = session.load_experiment(name)
+        for run in experiment.runs.values():
+            assert run.fields.uint64 == np.uint64(2**64 - 1)
+            assert run.fields.complex == np.complex128(1 + 2j)
+            assert np.array_equal(run.fields.large, np.zeros(10 if run.fields.idx == 0 else 10000))
+            assert np.array_equal(run.fields.array, np.zeros(10000))
+
+
+def test_serialization_numpy_scalars():
+    """
+    Test: With default options, NumPy scalars are persisted and reloaded as Python scalars,
+    also if serialized by workers.
+    """
+
+    def step(run: Run):
+        run.fields.uint8 = np.uint8(3)
+        run.fields.float16 = np.float16(1.5)
+        run.fields.uint64 = np.uint64(9223372036854775813)
+
+    session = create_session()
+    experiment = session.create_experiment("a")
+    with experiment.run() as run:
+        step(run)
+    experiment.persist()
+
+    experiment = session.load_experiment("a")
+    assert experiment.runs.first().fields == {"uint8": 3, "float16": 1.5, "uint64": 9223372036854775813}
+
+    experiment = session.create_experiment("b")
+    experiment.add_runs(idx=range(2))
+    with options().ctx({"execution.serialize_fields": True}):
+        experiment.execute(step, n_jobs=2)
+    experiment.persist()
+
+    experiment = session.load_experiment("b")
+    for run in experiment.runs.values():
+        assert run.fields.uint64 == 9223372036854775813
+        assert isinstance(run.fields.uint8, int)
+
+
+def test_offload():
+    """
+    Test: Serialized values above threshold are offloaded to the DataStore, and loaded lazily.
+    """
+
+    with tmpdir_ctx():
+        session = create_session()
+        experiment = session.create_experiment("a")
+
+        for idx in range(3):
+            with experiment.run() as run:
+                run.fields.idx = idx
+                run.fields.array = np.arange(10000 * idx)
+                run.fields.small = [idx]
+
+        with options().ctx({"serialization.offload_threshold_bytes": 1000}):
+            experiment.persist()
+
+        # Only two arrays are offloaded, the first one is empty.
+        df = session.db.query("SELECT idx, array, small FROM experiment_a ORDER BY idx")
+        assert [is_offloaded(value) for value in df.array] == [False, True, True]
+        assert not any(is_offloaded(value) for value in df.small)
+        pathdir = DataStoreIO.get_filepath(options().get("datastore.url")) + os.sep + str(experiment.id_experiment)
+        assert len(os.listdir(pathdir)) == 2
+
+        experiment = session.load_experiment("a")
+        run = [run for run in experiment.runs.values() if run.fields.idx == 2][0]
+        assert isinstance(get_raw_field(run.fields, "array"), SerializedValue)
+        assert np.array_equal(run.fields.array, np.arange(20000))
+        assert not isinstance(get_raw_field(run.fields, "array"), SerializedValue)
+
+        # Persisting again the experiment preserves the offloaded values not accessed yet.
+        experiment.persist(if_exists="replace")
+        experiment = session.load_experiment("a")
+        for run in experiment.runs.values():
+            assert np.array_equal(run.fields.array, np.arange(10000 * run.fields.idx))
+            assert run.fields.small == [run.fields.idx]
@@ -1,4 +1,9 @@
+import pytest
+
+import mltraq
 from mltraq.cli import main
+from mltraq.utils.exceptions import InvalidInput
+from mltraq.utils.fs import tmpdir_ctx
 from mltraq.version import __version__ as mltraq_version
 
 
@@ -11,3 +16,34 @@ def test_cli_version(capsys):
 
     out = capsys.readouterr().out
     assert out == f"MLtraq v{mltraq_version}\n"
+
+
+def test_cli_gc(capsys):
+    """
+    Test: We can execute "mltraq gc --dry-run" to report orphaned and unreferenced objects.
+    """
+
+    with tmpdir_ctx():
+        mltraq.create_session("sqlite:///mltraq.db")
+        main(["gc", "--db", "sqlite:///mltraq.db", "--dry-run", "--min-age-seconds", "0"])
+
+    out = capsys.readouterr().out
+    assert "n_files" in out
+    assert "bytes_per_second" in out
+
+
+def test_cli_gc_database():
+    """
+    Test: "mltraq gc" requires an explicit database URL, and refuses in-memory databases
+    and databases without experiments table.
+    """
+
+    with tmpdir_ctx():
+        with pytest.raises(SystemExit):
+            main(["gc", "--dry-run"])
+
+        with pytest.raises(InvalidInput, match="in-memory"):
+            main(["gc", "--db", "sqlite:///:memory:", "--dry-run"])
+
+        with pytest.raises(InvalidInput, match="without table"):
+            main(["gc", "--db", "sqlite:///missing.db", "--dry-run"])
@@ -58,3 +58,33 @@ def test_globs_two_excludes():
         # Match also hidden files
         names = globs("test", exclude=["**/*a1*", "**/*a2*"])
         assert set(names) == {"b/d", "b/b1.z", "b/c1.z"}
+
+
+def test_globs_hidden():
+    """
+    Test: Hidden files and directories are matched only by patterns starting with a dot.
+    """
+
+    with tmpdir_ctx():
+        create_test_dir()
+
+        assert set(globs("test", include="**/.*")) == {".h2.x"}
+        assert set(globs("test", include=".hidden/*")) == {os.path.join(".hidden", "h1.x")}
+        # Without recursion, "**" matches a single component, as "*".
+        assert set(globs("test", include="**/*.x", recursive=False)) == {os.path.join("a", "a1.x")}
+
+
+def test_globs_exclude_dirs():
+    """
+    Test: We can exclude directories, with names relative to the source directory.
+    """
+
+    with tmpdir_ctx():
+        create_test_dir()
+
+        assert set(globs("test", exclude="a/*")) == {"b/d", "b/b1.z", "b/c1.z"}
+        assert set(globs(os.path.abspath("test"), include=["**", ".hidden/**"], exclude=["b*"])) == {
+            "a/a1.x",
+            "a/a2.y",
+            ".hidden/h1.x",
+        }
@@ -0,0 +1,50 @@
+"""
+Benchmark of ArchiveStore extraction of many small files, sequential and in parallel,
+reporting the throughput in files/s and bytes/s.
+
+Usage: python utils/benchmark_archive.py [n_files]
+"""
+
+import os
+import sys
+
+from mltraq import options
+from mltraq.storage.archivestore import ArchiveStoreIO
+from mltraq.utils.fs import tmpdir_ctx
+
+
+def create_tree(n_files: int, size: int = 4096):
+    """
+    Create `n_files` files of `size` random bytes in directory "tree", 100 files per subdirectory.
+    """
+
+    for idx in range(n_files):
+        pathdir = f"tree/d{idx // 100}"
+        os.makedirs(pathdir, exist_ok=True)
+        with open(f"{pathdir}/f{idx}", "wb") as f:
+            f.write(os.urandom(size))
+
+
+def benchmark(archive: ArchiveStoreIO, n_jobs: int):
+    """
+    Report the throughput of the extraction of `archive` with `n_jobs` threads.
+    """
+
+    stats = archive.extract(f"extracted-{n_jobs}", n_jobs=n_jobs).extract_stats
+    print(
+        f"n_jobs: {n_jobs:2}  files: {stats.n_files:7}  duration: {stats.duration:7.3f} s  "
+        f"{stats.files_per_second:9.1f} files/s  {stats.bytes_per_second / 2**20:7.1f} MiB/s"
+    )
+
+
+def main():
+    n_files = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    with tmpdir_ctx(), options().ctx({"archivestore.mode": "x"}):
+        create_tree(n_files)
+        archive = ArchiveStoreIO.create(src_dir="tree")
+        for n_jobs in [1, 4, 16]:
+            benchmark(archive, n_jobs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Micro-benchmark of DATAPAK encoding/decoding on deep nested structures
+of small values, similar to codelog lists and Bunch trees.
+
+Usage: python utils/benchmark_datapak.py
+"""
+
+import timeit
+
+import numpy as np
+
+from mltraq.storage.serializers.datapak import DataPakSerializer
+from mltraq.utils.bunch import Bunch
+
+
+def nested_bunch(depth: int, width: int) -> Bunch:
+    """
+    Return a tree of Bunch objects with `depth` levels and `width` children per level,
+    whose leaves are lists of small values.
+    """
+    if depth == 0:
+        return Bunch(values=[1, 2.0, "three", None, True, (4, 5)], array=np.arange(4))
+    return Bunch({f"k{idx}": nested_bunch(depth - 1, width) for idx in range(width)})
+
+
+def codelog_lines(n: int) -> list:
+    """
+    Return a list of `n` tuples, similar to the ones produced by the codelog step.
+    """
+    return [(idx, f"line of code {idx}", {"a": idx, "b": [idx, idx + 1]}) for idx in range(n)]
+
+
+def benchmark(name: str, obj: object, number: int = 10):
+    """
+    Report the average time to encode and decode `obj`.
+    """
+    encoded = DataPakSerializer.encode(obj)
+    t_encode = timeit.timeit(lambda: DataPakSerializer.encode(obj), number=number) / number
+    t_decode = timeit.timeit(lambda: DataPakSerializer.decode(encoded), number=number) / number
+    print(f"{name:<20} encode: {t_encode * 1000:8.2f} ms  decode: {t_decode * 1000:8.2f} ms")
+
+
+def main():
+    benchmark("bunch tree (6x5)", nested_bunch(depth=6, width=5))
+    benchmark("codelog (100k)", codelog_lines(100_000))
+    benchmark("list of floats (1M)", [float(idx) for idx in range(1_000_000)])
+
+
+if __name__ == "__main__":
+    main()
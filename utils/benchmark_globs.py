@@ -0,0 +1,79 @@
+"""
+Benchmark of file enumeration with `mltraq.utils.fs.globs` on a synthetic tree of files,
+compared with the previous implementation, based on `glob.glob` and `fnmatch.fnmatch`.
+
+Usage: python utils/benchmark_globs.py [n_files]
+"""
+
+import fnmatch
+import os
+import sys
+import time
+from glob import glob
+
+from mltraq.utils.fs import chdir_ctx, globs, tmpdir_ctx
+
+
+def globs_legacy(src_dir, include, exclude):
+    """
+    Previous implementation of `globs`: a glob for each include pattern, filtered by regular files and exclude patterns.
+    """
+
+    candidates = set()
+    for pattern in include:
+        with chdir_ctx(src_dir):
+            candidates |= set(glob(pattern, recursive=True))
+    return [
+        name
+        for name in candidates
+        if os.path.isfile(src_dir + os.sep + name) and not any(fnmatch.fnmatch(name, pattern) for pattern in exclude)
+    ]
+
+
+def create_tree(n_files: int, files_per_dir: int = 100):
+    """
+    Create `n_files` empty files in directory "tree", in two levels of subdirectories,
+    with a ".git" directory holding a tenth of the files.
+    """
+
+    for idx in range(n_files):
+        subdir = ".git" if idx % 10 == 0 else f"d{idx // files_per_dir // 10}"
+        pathdir = f"tree/{subdir}/s{idx // files_per_dir}"
+        os.makedirs(pathdir, exist_ok=True)
+        with open(f"{pathdir}/f{idx}.{'py' if idx % 2 else 'txt'}", "w"):
+            pass
+
+
+def benchmark(name: str, include: list, exclude: list):
+    """
+    Report the time to enumerate the files of the tree matching `include` and not `exclude`.
+    """
+
+    t_start = time.time()
+    n_legacy = len(globs_legacy("tree", include, exclude))
+    t_legacy = time.time() - t_start
+
+    t_start = time.time()
+    n_files = len(globs("tree", include=include, exclude=exclude))
+    t_globs = time.time() - t_start
+
+    assert n_files == n_legacy
+    print(
+        f"{name:<30} files: {n_files:7}  legacy: {t_legacy:7.3f} s  globs: {t_globs:7.3f} s  "
+        f"speedup: {t_legacy / t_globs:5.1f}x"
+    )
+
+
+def main():
+    n_files = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    with tmpdir_ctx():
+        create_tree(n_files)
+        benchmark("all files", ["**"], [])
+        benchmark("python files", ["**/*.py"], [])
+        benchmark("two includes", ["**/*.py", "**/*.txt"], [])
+        benchmark("excluded .git (hidden)", ["**/.git/**", "**"], [".git/*"])
+        benchmark("excluded directories", ["**"], ["d1/*", "d2/*", "d3/*"])
+
+
+if __name__ == "__main__":
+    main()
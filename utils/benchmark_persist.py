@@ -0,0 +1,128 @@
+"""
+Benchmark of Experiment.persist on experiments whose runs share a large field,
+as set by the `init_fields` step, and on experiments with a distinct large field
+per run, serialized with a varying number of threads, or by the workers
+that executed the runs (option "execution.serialize_fields"), and on experiments
+with many DataStore fields, written with a varying number of threads and fsync policies.
+
+Usage: python utils/benchmark_persist.py
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from mltraq import create_session, options
+from mltraq.steps.init_fields import init_fields
+from mltraq.storage.datastore import DataStore
+from mltraq.utils.fs import tmpdir_ctx
+
+
+def benchmark(name: str, n_runs: int, field: object):
+    """
+    Report the time to persist an experiment with `n_runs` runs, all sharing `field`.
+    """
+
+    session = create_session()
+    experiment = session.create_experiment()
+    experiment.add_runs(i=list(range(n_runs)))
+    experiment.execute(init_fields(shared=field), n_jobs=1)
+
+    t_start = time.time()
+    experiment.persist()
+    t_persist = time.time() - t_start
+
+    print(f"{name:<30} runs: {n_runs:6}  persist: {t_persist:8.3f} s")
+
+
+def benchmark_n_jobs(n_runs: int, n_jobs: int):
+    """
+    Report the time to persist an experiment with `n_runs` runs, each with a distinct
+    array field, serialized with `n_jobs` threads.
+    """
+
+    session = create_session()
+    experiment = session.create_experiment()
+    rng = np.random.default_rng(1)
+    for _ in range(n_runs):
+        with experiment.run() as run:
+            run.fields.array = rng.random(1_000_000)
+
+    t_start = time.time()
+    with options().ctx({"serialization.n_jobs": n_jobs}):
+        experiment.persist()
+    t_persist = time.time() - t_start
+
+    print(f"{'distinct array (8 MB)':<30} runs: {n_runs:6}  n_jobs: {n_jobs:2}  persist: {t_persist:8.3f} s")
+
+
+def benchmark_serialize_fields(n_runs: int, serialize_fields: bool):
+    """
+    Report the time to execute and persist an experiment with `n_runs` runs, each producing a
+    distinct array field, serialized either by the workers or by the driver.
+    """
+
+    def step(run):
+        run.fields.array = np.random.default_rng(run.params.i).random(1_000_000)
+
+    session = create_session()
+    experiment = session.create_experiment()
+    experiment.add_runs(i=list(range(n_runs)))
+
+    with options().ctx({"execution.serialize_fields": serialize_fields}):
+        t_start = time.time()
+        experiment.execute(step)
+        t_execute = time.time() - t_start
+
+        t_start = time.time()
+        experiment.persist()
+        t_persist = time.time() - t_start
+
+    print(
+        f"{'worker-serialized array (8 MB)' if serialize_fields else 'driver-serialized array (8 MB)':<30} "
+        f"runs: {n_runs:6}  execute: {t_execute:8.3f} s  persist: {t_persist:8.3f} s"
+    )
+
+
+def benchmark_datastore(n_runs: int, n_jobs: int, fsync: str):
+    """
+    Report the time to persist an experiment with `n_runs` runs, each with a DataStore field
+    holding a small array, written with `n_jobs` threads and durability policy `fsync`.
+    """
+
+    session = create_session()
+    experiment = session.create_experiment()
+    rng = np.random.default_rng(1)
+    for _ in range(n_runs):
+        with experiment.run() as run:
+            run.fields.ds = DataStore(array=rng.random(1000))
+
+    t_start = time.time()
+    with options().ctx({"datastore.writer.n_jobs": n_jobs, "datastore.writer.fsync": fsync}):
+        experiment.persist()
+    t_persist = time.time() - t_start
+
+    print(
+        f"{'DataStore array (8 KB)':<30} runs: {n_runs:6}  n_jobs: {n_jobs:2}  fsync: {fsync:4}  "
+        f"persist: {t_persist:8.3f} s"
+    )
+
+
+def main():
+    with tmpdir_ctx(), options().ctx({"tqdm.disable": True}):
+        df = pd.DataFrame(np.random.default_rng(1).random((100_000, 10)), columns=[f"c{i}" for i in range(10)])
+        benchmark("shared DataFrame (8 MB)", 100, df)
+        benchmark("shared array (8 MB)", 100, df.to_numpy())
+        benchmark("shared dict (10k keys)", 1000, {f"k{i}": i for i in range(10_000)})
+        for n_jobs in [1, 2, 4]:
+            benchmark_n_jobs(100, n_jobs)
+        for serialize_fields in [False, True]:
+            benchmark_serialize_fields(100, serialize_fields)
+        for fsync in ["none", "file", "dir"]:
+            for n_jobs in [1, 8]:
+                benchmark_datastore(2000, n_jobs, fsync)
+
+
+if __name__ == "__main__":
+    main()